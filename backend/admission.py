@@ -0,0 +1,218 @@
+import os
+import math
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+
+from deadlines import remaining
+from metrics import GEMINI_IN_FLIGHT, GEMINI_WAITING, GEMINI_QUEUE_WAIT
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Gemini Admission Configuration ---
+# Every Gemini call goes through one admission controller per process: a concurrency cap plus
+# request and token buckets sized to the API quota (divide the quota by the number of workers).
+# Endpoints call check_capacity() before charging credits, so when the queue is already deep the
+# user gets 503 + Retry-After instead of waiting and paying for a call that is likely to be throttled.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "300"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+GEMINI_EXPECTED_OUTPUT_TOKENS = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", "1024")) # Reserved per call until usage is known
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "32")) # Calls waiting for admission before new requests are shed
+GEMINI_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("GEMINI_MAX_QUEUE_WAIT_SECONDS", "30"))
+GEMINI_OVERLOAD_RETRIES = int(os.getenv("GEMINI_OVERLOAD_RETRIES", "3")) # Retries after a 429/503 from Google
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "1"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "20"))
+QUEUE_WAIT_SAMPLES = 1024 # Recent waits kept for the percentiles on /stats/
+
+# 429 Too Many Requests / RESOURCE_EXHAUSTED and 503 Service Unavailable
+OVERLOAD_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable)
+
+
+def _busy(retry_after: float, detail: str = "The AI service is busy. Please try again shortly.") -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket refilled at per_minute / 60 per second, holding at most per_minute.
+    reserve() always succeeds and returns how long the caller must wait for its reservation to be covered.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        self.tokens -= amount
+        return self.backlog_seconds()
+
+    def adjust(self, amount: float):
+        """Takes (or, when negative, returns) tokens once the real cost of a call is known."""
+        self._refill()
+        self.tokens -= amount
+
+    def backlog_seconds(self) -> float:
+        return max(0.0, -self.tokens / self.rate) if self.rate > 0 else 0.0
+
+
+class AdmissionTicket:
+    """An admitted call; settle() replaces its estimated token cost with the usage Gemini reported."""
+
+    def __init__(self, controller: "AdmissionController", estimated_tokens: int):
+        self._controller = controller
+        self._reserved = estimated_tokens
+
+    def settle(self, usage_metadata):
+        if usage_metadata is None:
+            return
+        used = (getattr(usage_metadata, "prompt_token_count", 0) or 0) + (getattr(usage_metadata, "candidates_token_count", 0) or 0)
+        if used:
+            self._controller.tokens.adjust(used - self._reserved)
+            self._reserved = used
+
+
+class AdmissionController:
+    """Concurrency cap, RPM/TPM buckets, 429/503 backoff and load shedding for Gemini calls."""
+
+    def __init__(
+        self,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = GEMINI_TOKENS_PER_MINUTE,
+        max_queue: int = GEMINI_MAX_QUEUE,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self._waits = deque(maxlen=QUEUE_WAIT_SAMPLES)
+        self._avg_call_seconds = 5.0 # Moving average, used for Retry-After
+        self.counters = {"admitted": 0, "shed": 0, "overloaded": 0, "retries": 0}
+
+    # --- Load Shedding ---
+    def expected_wait_seconds(self) -> float:
+        """Rough wait a new call would face: bucket backlog plus the queue ahead of it."""
+        queued = self.waiting + (1 if self.in_flight >= self.max_concurrency else 0)
+        return max(self.requests.backlog_seconds(), self.tokens.backlog_seconds()) + queued / self.max_concurrency * self._avg_call_seconds
+
+    def check_capacity(self):
+        """Raises 503 with Retry-After when a new call would queue too long. Call before charging credits."""
+        expected_wait = self.expected_wait_seconds()
+        if self.waiting >= self.max_queue or expected_wait > GEMINI_MAX_QUEUE_WAIT_SECONDS:
+            self.counters["shed"] += 1
+            raise _busy(expected_wait)
+
+    # --- Admission ---
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        """Waits for the rate buckets and a concurrency slot; yields an AdmissionTicket."""
+        estimated_tokens += GEMINI_EXPECTED_OUTPUT_TOKENS
+        queued_at = time.monotonic()
+        self.waiting += 1
+        GEMINI_WAITING.inc()
+        try:
+            wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            left = remaining()
+            if left is not None and wait > left:
+                # The request's deadline would pass while waiting for quota: give the reservation back
+                self.requests.adjust(-1)
+                self.tokens.adjust(-estimated_tokens)
+                self.counters["shed"] += 1
+                raise _busy(wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with asyncio.timeout(remaining()):
+                    await self._semaphore.acquire()
+            except TimeoutError:
+                raise HTTPException(status_code=504, detail="The request ran out of time waiting for the AI service.")
+        finally:
+            self.waiting -= 1
+            GEMINI_WAITING.dec()
+        queue_wait = time.monotonic() - queued_at
+        self._waits.append(queue_wait)
+        GEMINI_QUEUE_WAIT.observe(queue_wait)
+        self.counters["admitted"] += 1
+        self.in_flight += 1
+        GEMINI_IN_FLIGHT.inc()
+        started = time.monotonic()
+        try:
+            yield AdmissionTicket(self, estimated_tokens)
+        finally:
+            self.in_flight -= 1
+            GEMINI_IN_FLIGHT.dec()
+            self._semaphore.release()
+            self._avg_call_seconds = 0.9 * self._avg_call_seconds + 0.1 * (time.monotonic() - started)
+
+    async def with_backoff(self, fn):
+        """
+        Runs fn() (a coroutine function making one Gemini request), retrying 429/503 responses with
+        exponential backoff and full jitter. The caller keeps its slot while it backs off, so retries
+        do not add to the pressure on the quota. Raises 503 + Retry-After once retries (or the
+        request's deadline) run out.
+        """
+        for attempt in range(GEMINI_OVERLOAD_RETRIES + 1):
+            try:
+                return await fn()
+            except OVERLOAD_ERRORS as e:
+                self.counters["overloaded"] += 1
+                delay = min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                if attempt == GEMINI_OVERLOAD_RETRIES:
+                    print(f"Gemini still overloaded after {attempt} retries: {e}")
+                    raise _busy(delay, "The AI service is over capacity. Please try again shortly.")
+                self.counters["retries"] += 1
+                backoff = random.uniform(0, delay)
+                left = remaining()
+                if left is not None and backoff >= left:
+                    raise _busy(delay, "The AI service is over capacity. Please try again shortly.")
+                await asyncio.sleep(backoff)
+                wait = self.requests.reserve(1) # The retry is another request against the quota
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+    async def call(self, fn, estimated_tokens: int):
+        """Admits one non-streaming Gemini request and returns its response, with usage settled."""
+        async with self.slot(estimated_tokens) as ticket:
+            response = await self.with_backoff(fn)
+            ticket.settle(getattr(response, "usage_metadata", None))
+            return response
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(p: float):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else None
+
+        return {
+            **self.counters,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queue_wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+            "request_backlog_seconds": round(self.requests.backlog_seconds(), 2),
+            "token_backlog_seconds": round(self.tokens.backlog_seconds(), 2),
+            "expected_wait_seconds": round(self.expected_wait_seconds(), 2),
+        }
+
+
+# Shared controller for every Gemini call site in this process
+gemini_admission = AdmissionController()
@@ -0,0 +1,172 @@
+import re
+from collections import Counter
+
+import fitz # PyMuPDF
+
+# --- ATS Rule Set ---
+# A deterministic ATS pre-score built from the PDF's layout (PyMuPDF get_text("dict") blocks and
+# spans, images and vector drawings) and its text. It runs in milliseconds and costs nothing, so it
+# backs the free "fast" mode of /check-resume-ats/ and is handed to Gemini as grounding in the LLM
+# mode. Bump the version whenever a rule or penalty changes; it is part of the ATS prompt's cache
+# input, so grounded LLM results are regenerated with the new findings.
+ATS_RULES_VERSION = "ats-rules-v1"
+
+MIN_TEXT_CHARS = 200 # Below this the PDF is most likely a scanned image
+COLUMN_MIN_ROWS = 5 # Side-by-side rows of text needed to call a page multi-column
+COLUMN_MIN_TEXT_SHARE = 0.2 # Share of the page's text each column must hold, so tabbed-in dates are not a column
+NONSTANDARD_FONT_SHARE = 0.2 # Share of characters in uncommon fonts that triggers the font rule
+MIN_ACTION_VERBS = 5
+MIN_QUANTIFIED_LINES = 2
+MAX_PAGES = 2
+
+# Font families every ATS parser (and every machine the resume is opened on) handles well.
+# Matched as prefixes of the normalized font name, so "TimesNewRomanPS-BoldMT" is "timesnewroman".
+STANDARD_FONTS = (
+    "arial", "helvetica", "times", "calibri", "cambria", "garamond", "georgia", "verdana", "tahoma",
+    "trebuchet", "roboto", "opensans", "lato", "liberation", "dejavu", "segoe", "bookantiqua",
+    "palatino", "courier", "carlito", "caladea", "noto", "sourcesans", "cmr", "lmroman", "symbol",
+)
+
+SECTION_HEADINGS = {
+    "experience": re.compile(r"^(work |professional |relevant |employment )?(experience|employment( history)?|work history|career history)$"),
+    "education": re.compile(r"^(education|academic background|education and training|qualifications)$"),
+    "skills": re.compile(r"^(technical |core |key )?(skills|competencies|skills and abilities|technologies)$"),
+}
+
+ACTION_VERBS = frozenset((
+    "achieved", "analyzed", "architected", "automated", "built", "created", "delivered", "designed",
+    "developed", "drove", "established", "implemented", "improved", "increased", "launched", "led",
+    "managed", "mentored", "migrated", "optimized", "owned", "reduced", "resolved", "shipped",
+    "streamlined", "supported", "trained", "wrote",
+))
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"(?:\+?\d{1,3}[\s.-]?)?(?:\(\d{2,4}\)|\d{2,4})[\s.-]?\d{3,4}[\s.-]?\d{3,4}")
+_QUANTIFIED = re.compile(r"\d+(?:\.\d+)?\s*%|[$€£]\s*\d|\b\d+[kKmM+]?\s+(?:users|customers|clients|people|engineers|projects|hours|days|requests)\b")
+_FONT_SUBSET = re.compile(r"^[A-Z]{6}\+")
+
+
+# --- Layout Features (runs in the extraction executor) ---
+def _font_family(font_name: str) -> str:
+    name = _FONT_SUBSET.sub("", font_name)
+    return re.split(r"[-,]", name, maxsplit=1)[0].replace(" ", "").lower()
+
+
+def _has_vertical_edges(page) -> bool:
+    """Cheap pre-check for find_tables: ruled tables need vertical lines or boxes, section rules do not."""
+    width, height = page.rect.width, page.rect.height
+    edges = 0
+    for drawing in page.get_cdrawings():
+        for item in drawing.get("items", ()):
+            if item[0] == "l" and abs(item[1][0] - item[2][0]) < 1 and abs(item[1][1] - item[2][1]) > 5:
+                edges += 1
+            elif item[0] == "re":
+                rect_width, rect_height = item[1][2] - item[1][0], item[1][3] - item[1][1]
+                # Skip page backgrounds and hairline rules
+                if 5 < rect_height < height * 0.9 and 5 < rect_width < width * 0.9:
+                    edges += 2
+        if edges >= 2:
+            return True
+    return False
+
+
+def _is_multi_column(lines: list, width: float) -> bool:
+    """True if both halves of the page hold a good share of its text, in rows that sit side by side."""
+    left = [line for line in lines if line[2] < width * 0.55]
+    right = [line for line in lines if line[0] > width * 0.45]
+    if len(left) < COLUMN_MIN_ROWS or len(right) < COLUMN_MIN_ROWS:
+        return False
+    total_chars = sum(len(line[4]) for line in lines)
+    for column in (left, right):
+        if sum(len(line[4]) for line in column) < total_chars * COLUMN_MIN_TEXT_SHARE:
+            return False
+    side_by_side = sum(1 for line in right if any(abs(line[1] - other[1]) < 3 for other in left))
+    return side_by_side >= COLUMN_MIN_ROWS
+
+
+def collect_layout_features(doc: fitz.Document) -> dict:
+    """Layout and text features of an open PDF, as consumed by score_layout."""
+    font_chars = Counter()
+    image_count = table_count = multi_column_pages = 0
+    page_texts = []
+    # Image blocks would carry the image bytes; they are counted with get_image_info instead
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    for page in doc:
+        lines = []
+        for block in page.get_text("dict", flags=flags)["blocks"]:
+            for line in block.get("lines", ()):
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                if not text:
+                    continue
+                for span in line["spans"]:
+                    font_chars[_font_family(span["font"])] += len(span["text"].strip())
+                x0, y0, x1, y1 = line["bbox"]
+                lines.append((x0, y0, x1, y1, text))
+        if _is_multi_column(lines, page.rect.width):
+            multi_column_pages += 1
+        image_count += len(page.get_image_info())
+        if _has_vertical_edges(page):
+            table_count += len(page.find_tables().tables)
+        page_texts.append("\n".join(line[4] for line in lines))
+
+    return {
+        "page_count": doc.page_count,
+        "text": "\f".join(page_texts),
+        "font_chars": dict(font_chars),
+        "image_count": image_count,
+        "table_count": table_count,
+        "multi_column_pages": multi_column_pages,
+    }
+
+
+# --- Scoring ---
+def score_layout(features: dict) -> dict:
+    """
+    Applies the rule set to collect_layout_features output. Returns an ATS check result: ats_score
+    (100 minus the penalties of the failed rules), suggestions for the failed rules, and every check.
+    """
+    text = features["text"]
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    headings = {line.lower().rstrip(":").strip() for line in lines if len(line) <= 40}
+    words = re.findall(r"[a-z]+", text.lower())
+    total_font_chars = sum(features["font_chars"].values())
+    nonstandard_chars = sum(
+        count for family, count in features["font_chars"].items() if not family.startswith(STANDARD_FONTS)
+    )
+    action_verbs = sum(1 for word in words if word in ACTION_VERBS)
+    quantified_lines = sum(1 for line in lines if _QUANTIFIED.search(line))
+
+    checks = []
+
+    def check(rule_id: str, passed: bool, penalty: int, suggestion: str):
+        checks.append({"id": rule_id, "passed": passed, "penalty": 0 if passed else penalty, "detail": suggestion})
+
+    check("text_layer", len(text.strip()) >= MIN_TEXT_CHARS, 60,
+          "The PDF has little or no selectable text (it may be a scanned image). Export it from a word processor so an ATS can read it.")
+    check("single_column", features["multi_column_pages"] == 0, 15,
+          "Use a single-column layout; many ATS parsers read multi-column pages across the columns and scramble the content.")
+    check("no_tables", features["table_count"] == 0, 10,
+          "Replace tables with plain text sections; ATS parsers often skip or misorder table cells.")
+    check("no_images", features["image_count"] == 0, 5,
+          "Remove images, icons and photos; an ATS ignores them, along with any text inside them.")
+    check("standard_fonts", total_font_chars == 0 or nonstandard_chars / total_font_chars <= NONSTANDARD_FONT_SHARE, 8,
+          "Use a standard font such as Arial, Calibri or Times New Roman; uncommon fonts may not be extracted correctly.")
+    for section, pattern in SECTION_HEADINGS.items():
+        check(f"{section}_heading", any(pattern.match(heading) for heading in headings), 8,
+              f"Add a clearly labelled \"{section.capitalize()}\" section heading so an ATS can find that section.")
+    check("email", bool(_EMAIL.search(text)), 10,
+          "Include an email address in the resume body (not only in a header image or link).")
+    check("phone", bool(_PHONE.search(text)), 5, "Include a phone number.")
+    check("action_verbs", action_verbs >= MIN_ACTION_VERBS, 5,
+          "Start more bullet points with strong action verbs (e.g. built, led, improved) describing your contributions.")
+    check("quantified_results", quantified_lines >= MIN_QUANTIFIED_LINES, 4,
+          "Quantify achievements with numbers, percentages or amounts where possible.")
+    check("length", features["page_count"] <= MAX_PAGES, 4, f"Keep the resume to {MAX_PAGES} pages or fewer.")
+
+    return {
+        "ats_score": max(0, 100 - sum(c["penalty"] for c in checks)),
+        "suggestions": [c["detail"] for c in checks if not c["passed"]],
+        "mode": "fast",
+        "rules_version": ATS_RULES_VERSION,
+        "checks": checks,
+    }
@@ -0,0 +1,71 @@
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Authenticated User Cache Configuration ---
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "15")) # Bounds staleness across uvicorn workers
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "2048"))
+
+# Fields the request hot path never needs; keeping them out also keeps the cache free of secrets
+USER_CONTEXT_PROJECTION = {"hashed_password": 0}
+
+
+class UserContextCache:
+    """Short-TTL, size-bounded cache of authenticated user documents, keyed by the JWT subject (email)."""
+
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict() # subject -> (monotonic expiry, user)
+        self._subjects_by_user_id: dict[str, str] = {}
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, subject: str) -> dict | None:
+        entry = self._entries.get(subject)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(subject)
+                self.counters["hits"] += 1
+                return user
+            self._drop(subject)
+        self.counters["misses"] += 1
+        return None
+
+    def set(self, subject: str, user: dict):
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[subject] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(subject)
+        self._subjects_by_user_id[str(user["_id"])] = subject
+        while len(self._entries) > self.max_entries:
+            oldest_subject = next(iter(self._entries))
+            self._drop(oldest_subject) # Evict the least recently used entry
+
+    def invalidate_user(self, user_id: str):
+        """Drops a user's cached document, e.g. after their credit balance changed."""
+        subject = self._subjects_by_user_id.get(str(user_id))
+        if subject is not None:
+            self._drop(subject)
+            self.counters["invalidations"] += 1
+
+    def _drop(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is not None:
+            self._subjects_by_user_id.pop(str(entry[1]["_id"]), None)
+
+    def clear(self):
+        self._entries.clear()
+        self._subjects_by_user_id.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), **self.counters}
+
+
+# Shared cache consulted by get_current_user
+user_cache = UserContextCache()
@@ -0,0 +1,396 @@
+import os
+import uuid
+import shutil
+import asyncio
+import hashlib
+import zipfile
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+from multipart.multipart import MultipartParser, parse_options_header # python-multipart, also used by FastAPI's File()
+
+from database import db
+from extraction import ExtractionError, PDFTooLargeError, EXTRACTION_WORKERS, EXTRACTION_MAX_BYTES
+from credits import deduct_credits, refund_credits, BATCH_ANALYSIS_COST
+from deadlines import request_deadline, ANALYSIS_DEADLINE_SECONDS
+from pipelines import new_resume_record, load_resume_text, generate_resume_analysis, save_resume_analysis
+from streaming import format_stream_event
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Batch Analysis Configuration ---
+# /batch/analyze-resumes/ takes a ZIP or a multipart set of PDFs. The upload is streamed to a staging
+# directory on disk (never held in memory), the credits for every PDF are reserved in one deduction,
+# and a fixed pool of workers takes the files through extraction (spread over the extraction
+# executor's processes) and Gemini (capped per batch, and per process by the admission controller).
+# Results stream back as each file completes; the credits of files that were not analyzed are
+# refunded when the batch ends, also if the client disconnects. Memory depends on the number of
+# workers, not on the size of the batch.
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(512 * 1024 * 1024))) # 512 MB, staged on disk
+BATCH_EXTRACTION_CONCURRENCY = int(os.getenv("BATCH_EXTRACTION_CONCURRENCY", str(EXTRACTION_WORKERS))) # Shared by all batches
+BATCH_GEMINI_CONCURRENCY = int(os.getenv("BATCH_GEMINI_CONCURRENCY", "4")) # Per batch
+BATCH_CHUNK_SIZE = 1024 * 1024 # 1 MB
+ZIP_MEDIA_TYPES = ("application/zip", "application/x-zip-compressed")
+
+
+def _pdf_error(filename: str, content_type: str = "") -> tuple[int, str] | None:
+    if filename.lower().endswith(".pdf") or content_type == "application/pdf":
+        return None
+    return 400, "Only PDF files are allowed."
+
+
+def _too_large() -> tuple[int, str]:
+    return 413, f"PDF is larger than the maximum of {EXTRACTION_MAX_BYTES} bytes."
+
+
+# --- Staging ---
+class _MultipartStager:
+    """python-multipart callbacks writing each file part straight to the staging directory, hashing it on the way."""
+
+    def __init__(self, staging_dir: str):
+        self.staging_dir = staging_dir
+        self.items: list[dict] = []
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._item = None
+        self._file = None
+        self._hasher = None
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"filename" not in options:
+            self._item = None # Plain form fields are ignored
+            return
+        if len(self.items) >= BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many files; a batch holds at most {BATCH_MAX_FILES}.")
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        self._item = {"index": len(self.items), "filename": filename, "size": 0}
+        self.items.append(self._item)
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1").lower()
+        error = _pdf_error(filename, content_type)
+        if error:
+            self._item["error"] = error
+            return
+        self._item["path"] = os.path.join(self.staging_dir, f"{self._item['index']}.pdf")
+        self._file = open(self._item["path"], "wb")
+        self._hasher = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is None:
+            return
+        chunk = data[start:end]
+        self._item["size"] += len(chunk)
+        if self._item["size"] > EXTRACTION_MAX_BYTES:
+            # Keep reading the request, but stop storing this part
+            self._item["error"] = _too_large()
+            self.close()
+            os.remove(self._item.pop("path"))
+            return
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+    def on_part_end(self):
+        if self._file is not None:
+            self.close()
+            self._item["content_hash"] = self._hasher.hexdigest()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _stage_multipart(request: Request, staging_dir: str, content_type: str) -> list[dict]:
+    _, params = parse_options_header(content_type)
+    if b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Missing boundary in multipart upload.")
+    stager = _MultipartStager(staging_dir)
+    parser = MultipartParser(params[b"boundary"], stager.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > BATCH_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Batch upload exceeds {BATCH_MAX_UPLOAD_BYTES} bytes.")
+            parser.write(chunk)
+        parser.finalize()
+    finally:
+        stager.close()
+    return stager.items
+
+
+async def _stage_zip(request: Request, staging_dir: str) -> tuple[list[dict], zipfile.ZipFile]:
+    zip_path = os.path.join(staging_dir, "upload.zip")
+    received = 0
+    with open(zip_path, "wb") as buffer:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > BATCH_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Batch upload exceeds {BATCH_MAX_UPLOAD_BYTES} bytes.")
+            buffer.write(chunk)
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid or corrupted ZIP file.")
+
+    items = []
+    for info in archive.infolist():
+        name = os.path.basename(info.filename)
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or not name or name.startswith("."):
+            continue
+        if len(items) >= BATCH_MAX_FILES:
+            archive.close()
+            raise HTTPException(status_code=413, detail=f"Too many files; a batch holds at most {BATCH_MAX_FILES}.")
+        item = {"index": len(items), "filename": name, "zip_info": info}
+        error = _pdf_error(name)
+        if error is None and info.file_size > EXTRACTION_MAX_BYTES:
+            error = _too_large()
+        if error:
+            item["error"] = error
+        items.append(item)
+    return items, archive
+
+
+class Batch:
+    """One batch request: its staged files, credit reservation and progress."""
+
+    def __init__(self, current_user: dict, items: list[dict], staging_dir: str, user_directory: str, bypass_cache: bool, archive=None):
+        self.id = uuid.uuid4().hex
+        self.current_user = current_user
+        self.items = items
+        self.staging_dir = staging_dir
+        self.user_directory = user_directory
+        self.bypass_cache = bypass_cache
+        self.archive = archive
+        self.reserved_files = sum(1 for item in items if "error" not in item)
+        self.charge = None
+        self.succeeded = 0
+        self.failed = 0
+        self.settled = False
+        self.gemini_slots = asyncio.Semaphore(max(1, BATCH_GEMINI_CONCURRENCY))
+
+
+# --- Processing ---
+class BatchProcessor:
+    """Stages batch uploads, reserves their credits and streams per-file analysis results."""
+
+    def __init__(self):
+        self._extraction_slots = asyncio.Semaphore(max(1, BATCH_EXTRACTION_CONCURRENCY))
+        self.active_batches = 0
+        self.files_in_flight = 0
+        self.counters = {"batches": 0, "files": 0, "succeeded": 0, "failed": 0, "refunded_credits": 0}
+
+    async def start(self, request: Request, current_user: dict, upload_directory: str, bypass_cache: bool = False) -> Batch:
+        """
+        Stages the uploaded files on disk and reserves BATCH_ANALYSIS_COST credits per PDF. Raises
+        HTTPException (before anything is streamed) for bad uploads or insufficient credits.
+        """
+        content_type = request.headers.get("content-type", "")
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        if media_type not in ZIP_MEDIA_TYPES and media_type != "multipart/form-data":
+            raise HTTPException(status_code=415, detail="Upload a ZIP file or a multipart/form-data set of PDF files.")
+
+        user_directory = os.path.join(upload_directory, str(current_user["_id"]))
+        staging_dir = os.path.join(upload_directory, ".batches", uuid.uuid4().hex)
+        os.makedirs(staging_dir)
+        os.makedirs(user_directory, exist_ok=True)
+        archive = None
+        try:
+            if media_type == "multipart/form-data":
+                items = await _stage_multipart(request, staging_dir, content_type)
+            else:
+                items, archive = await _stage_zip(request, staging_dir)
+            if not items:
+                raise HTTPException(status_code=400, detail="The batch contains no files.")
+
+            batch = Batch(current_user, items, staging_dir, user_directory, bypass_cache, archive)
+            if batch.reserved_files:
+                batch.charge = await deduct_credits(
+                    str(current_user["_id"]), batch.reserved_files * BATCH_ANALYSIS_COST, "Batch Analysis",
+                    insufficient_detail=f"Insufficient credits to analyze {batch.reserved_files} resumes."
+                )
+        except BaseException:
+            if archive is not None:
+                archive.close()
+            await asyncio.to_thread(shutil.rmtree, staging_dir, True)
+            raise
+        print(f"Batch {batch.id} staged for user {current_user['email']}: {len(items)} files, {batch.reserved_files} PDFs reserved.")
+        return batch
+
+    @staticmethod
+    def _materialize(batch: Batch, item: dict, file_path: str) -> str:
+        """Moves (multipart) or unpacks (ZIP) a staged file to its final path. Returns its SHA-256. Runs in a thread."""
+        if "path" in item:
+            os.replace(item["path"], file_path)
+            return item["content_hash"]
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            # The declared size can lie, so the limit is enforced while unpacking
+            with batch.archive.open(item["zip_info"]) as source, open(file_path, "wb") as target:
+                while chunk := source.read(BATCH_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > EXTRACTION_MAX_BYTES:
+                        raise PDFTooLargeError(_too_large()[1])
+                    hasher.update(chunk)
+                    target.write(chunk)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError) as e:
+            raise ExtractionError(f"Could not unpack {item['filename']} from the ZIP file: {e}")
+        return hasher.hexdigest()
+
+    async def _process(self, batch: Batch, item: dict) -> dict:
+        """Stores, extracts and analyzes one file. Returns its result event data; never raises."""
+        result = {"index": item["index"], "filename": item["filename"]}
+        if "error" in item:
+            status_code, detail = item["error"]
+            return {**result, "status": "error", "status_code": status_code, "detail": detail}
+
+        unique_filename = f"{uuid.uuid4()}.pdf"
+        file_path = os.path.join(batch.user_directory, unique_filename)
+        resume_id = None
+        self.files_in_flight += 1
+        try:
+            # Extraction stage: the slots are shared by every batch, so batches cannot monopolize the executor
+            async with self._extraction_slots:
+                with request_deadline(ANALYSIS_DEADLINE_SECONDS):
+                    content_hash = await asyncio.to_thread(self._materialize, batch, item, file_path)
+                    resume_metadata = {
+                        "_id": ObjectId(),
+                        **new_resume_record(batch.current_user, item["filename"], unique_filename, file_path, content_hash),
+                        "batch_id": batch.id,
+                    }
+                    _, text = await load_resume_text(
+                        batch.current_user, str(resume_metadata["_id"]), purpose="batch analysis", resume_metadata=resume_metadata
+                    )
+                    # Only readable PDFs become resumes
+                    resume_id = await db.resumes.create(resume_metadata)
+
+            # Gemini stage
+            async with batch.gemini_slots:
+                with request_deadline(ANALYSIS_DEADLINE_SECONDS):
+                    resume_data = await generate_resume_analysis(text, bypass_cache=batch.bypass_cache)
+                    await save_resume_analysis(resume_id, resume_data)
+        except Exception as e:
+            if isinstance(e, (HTTPException, ExtractionError)):
+                status_code, detail = e.status_code, e.detail
+            elif isinstance(e, PyMongoError):
+                print(f"Database error during batch {batch.id} for {item['filename']}: {e}")
+                status_code, detail = 500, "Database error while storing the resume."
+            else:
+                print(f"An unexpected error occurred during batch {batch.id} for {item['filename']}: {e}")
+                status_code, detail = 500, f"An unexpected error occurred during analysis: {e}"
+            if resume_id is None and os.path.exists(file_path):
+                os.remove(file_path)
+            return {**result, "status": "error", "status_code": status_code, "detail": detail, "resume_id": resume_id}
+        finally:
+            self.files_in_flight -= 1
+
+        # raw_text is stored with the resume; leaving it out keeps the result lines small
+        analysis = {key: value for key, value in resume_data.items() if key != "raw_text"}
+        return {**result, "status": "ok", "resume_id": resume_id, "analysis": analysis}
+
+    async def _settle(self, batch: Batch) -> int:
+        """Refunds the reserved credits of files that were not analyzed. Returns the credits refunded."""
+        if batch.settled:
+            return 0
+        batch.settled = True
+        unused = batch.reserved_files - batch.succeeded
+        if batch.charge is None or unused <= 0:
+            return 0
+        refund = unused * BATCH_ANALYSIS_COST
+        await refund_credits(batch.charge, f"Batch {batch.id}: {unused} of {batch.reserved_files} resumes not analyzed", amount=refund)
+        self.counters["refunded_credits"] += refund
+        return refund
+
+    async def run(self, batch: Batch, media_type: str):
+        """Processes a started batch, yielding a "batch" event, one "result" event per file and a "summary" event."""
+        self.active_batches += 1
+        self.counters["batches"] += 1
+        results = asyncio.Queue(maxsize=BATCH_EXTRACTION_CONCURRENCY + BATCH_GEMINI_CONCURRENCY)
+        pending = iter(batch.items)
+
+        async def worker():
+            # Workers share one iterator, so each file is taken by exactly one of them
+            for item in pending:
+                await results.put(await self._process(batch, item))
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(len(batch.items), BATCH_EXTRACTION_CONCURRENCY + BATCH_GEMINI_CONCURRENCY))
+        ]
+        try:
+            yield format_stream_event(media_type, "batch", {
+                "batch_id": batch.id,
+                "files": len(batch.items),
+                "reserved_credits": batch.reserved_files * BATCH_ANALYSIS_COST,
+            })
+            for _ in batch.items:
+                result = await results.get()
+                if result["status"] == "ok":
+                    batch.succeeded += 1
+                else:
+                    batch.failed += 1
+                self.counters["files"] += 1
+                self.counters["succeeded" if result["status"] == "ok" else "failed"] += 1
+                yield format_stream_event(media_type, "result", result)
+
+            refunded = await self._settle(batch)
+            yield format_stream_event(media_type, "summary", {
+                "batch_id": batch.id,
+                "succeeded": batch.succeeded,
+                "failed": batch.failed,
+                "charged_credits": batch.succeeded * BATCH_ANALYSIS_COST,
+                "refunded_credits": refunded,
+            })
+        finally:
+            # Also reached when the client disconnects: stop the remaining files and refund them
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self._settle(batch)
+            if batch.archive is not None:
+                batch.archive.close()
+            await asyncio.to_thread(shutil.rmtree, batch.staging_dir, True)
+            self.active_batches -= 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "active_batches": self.active_batches,
+            "files_in_flight": self.files_in_flight,
+            "extraction_concurrency": BATCH_EXTRACTION_CONCURRENCY,
+            "gemini_concurrency_per_batch": BATCH_GEMINI_CONCURRENCY,
+        }
+
+
+# Shared processor for every batch in this process
+batch_processor = BatchProcessor()
@@ -0,0 +1,47 @@
+"""
+Runs the deterministic ATS rule set on resume PDFs and times it.
+
+Run from the backend directory:
+    python benchmarks/ats_prescore.py resume1.pdf [resume2.pdf ...] [--iterations 20] [--checks]
+
+For every file it prints the pre-score, the rules that failed and the median time to collect the
+layout features and score them (what the fast mode of /check-resume-ats/ spends per request,
+excluding the executor hop). With --checks it also prints every rule with its detail, which is the
+quickest way to review the rule set against a folder of known-good and known-bad resumes.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import _extract_layout_worker, EXTRACTION_MAX_PAGES # noqa: E402
+from ats_rules import score_layout, ATS_RULES_VERSION # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--checks", action="store_true", help="print every rule, not only the failed ones")
+    args = parser.parse_args()
+
+    print(f"Rule set {ATS_RULES_VERSION}")
+    print(f"{'file':<32}{'score':>7}{'median ms':>11}  failed")
+    for path in args.files:
+        timings = []
+        for _ in range(max(1, args.iterations)):
+            started = time.perf_counter()
+            result = score_layout(_extract_layout_worker(path, EXTRACTION_MAX_PAGES))
+            timings.append((time.perf_counter() - started) * 1000)
+        failed = [check["id"] for check in result["checks"] if not check["passed"]]
+        print(f"{os.path.basename(path)[:31]:<32}{result['ats_score']:>7}{statistics.median(timings):>11.1f}  {', '.join(failed) or '-'}")
+        if args.checks:
+            for check in result["checks"]:
+                print(f"    {'pass' if check['passed'] else 'FAIL'} {check['id']:<20} {check['detail']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Offline stand-in for google.generativeai.GenerativeModel, for load tests and local runs without quota.
+
+Used by benchmarks/load_bench.py, or on its own to serve the API against it (run from the backend
+directory, with MONGO_URI etc. set as usual; MONGO_URI=mongomock://local needs no MongoDB at all, but
+needs the development requirements, pip install -r requirements-dev.txt):
+    python benchmarks/fake_gemini.py [--port 8000] [--latency lognormal:800,0.5] [--rate-limit-ratio 0.02]
+
+The fake recognizes the analysis, ATS, combined and roadmap prompts and answers with canned JSON
+(sized like real responses, deterministic per prompt), honours JSON mode, streams in chunks and
+reports usage metadata. Latency is drawn from a configurable distribution:
+    fixed:MS | uniform:LO_MS,HI_MS | lognormal:MEDIAN_MS,SIGMA
+plus FAKE_GEMINI_CHUNK_MS per output chunk. A share of calls can fail with 429 (ResourceExhausted)
+or 503 (ServiceUnavailable), and calls slower than request_options["timeout"] raise DeadlineExceeded,
+so the admission controller, circuit breaker and deadlines see what they would see in production.
+Every setting has a FAKE_GEMINI_* environment variable.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+STAGE_SAMPLES = 100_000 # Call latencies kept for the stage percentiles
+
+
+def parse_latency(spec: str):
+    """Returns a function drawing one latency in seconds from a fixed:/uniform:/lognormal: spec (milliseconds)."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(max(values[0], 1e-3))
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Invalid latency spec '{spec}', expected fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+
+
+class FakeGeminiConfig:
+    def __init__(self):
+        self.configure(
+            latency=os.getenv("FAKE_GEMINI_LATENCY", "lognormal:800,0.5"),
+            chunk_ms=float(os.getenv("FAKE_GEMINI_CHUNK_MS", "15")),
+            chunk_chars=int(os.getenv("FAKE_GEMINI_CHUNK_CHARS", "96")),
+            rate_limit_ratio=float(os.getenv("FAKE_GEMINI_RATE_LIMIT_RATIO", "0")),
+            unavailable_ratio=float(os.getenv("FAKE_GEMINI_UNAVAILABLE_RATIO", "0")),
+            seed=int(os.getenv("FAKE_GEMINI_SEED", "0")),
+        )
+
+    def configure(self, latency: str | None = None, seed: int | None = None, **settings):
+        if latency is not None:
+            self.latency_spec = latency
+            self.latency = parse_latency(latency)
+        if seed is not None:
+            self.rng = random.Random(seed)
+        for name, value in settings.items():
+            setattr(self, name, value)
+
+
+config = FakeGeminiConfig()
+
+
+class FakeGeminiStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = {"calls": 0, "streamed": 0, "rate_limited": 0, "unavailable": 0, "timed_out": 0, "count_tokens": 0}
+        self.latencies = deque(maxlen=STAGE_SAMPLES) # Seconds from request to full response
+
+    def snapshot(self) -> dict:
+        return dict(self.counters)
+
+
+stats = FakeGeminiStats()
+
+
+# --- Canned Responses ---
+def _rng_for(prompt: str) -> random.Random:
+    # Same prompt, same answer, so response-cache behaviour matches a real (deterministic-ish) model
+    return random.Random(hashlib.sha256(prompt.encode()).digest())
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    vocabulary = (
+        "built", "led", "improved", "scalable", "services", "team", "customers", "data", "pipeline", "latency",
+        "reduced", "platform", "delivered", "features", "quality", "automated", "testing", "design", "cloud", "api",
+    )
+    return " ".join(rng.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+
+def _analysis(rng: random.Random) -> dict:
+    return {
+        "name": "Jordan Example",
+        "contact": {"email": "jordan@example.com", "phone": "+1 555 0100", "linkedin": "", "github": "", "website": ""},
+        "summary": _sentence(rng, 30),
+        "experience": [
+            {"title": f"Engineer {i}", "company": f"Company {i}", "dates": f"{2015 + i} - {2017 + i}", "description": _sentence(rng, 40)}
+            for i in range(rng.randint(2, 5))
+        ],
+        "education": [{"degree": "BSc Computer Science", "institution": "Example University", "dates": "2011 - 2015"}],
+        "skills": [f"Skill {i}" for i in range(rng.randint(8, 20))],
+        "projects": [{"name": f"Project {i}", "description": _sentence(rng, 20), "link": ""} for i in range(rng.randint(1, 3))],
+        "certifications": [],
+        "awards": [],
+        "suggestions_for_improvement": [_sentence(rng) for _ in range(rng.randint(3, 6))],
+    }
+
+
+def _ats(rng: random.Random) -> dict:
+    return {"ats_score": rng.randint(45, 95), "suggestions": [_sentence(rng) for _ in range(rng.randint(3, 7))]}
+
+
+def _roadmap(rng: random.Random) -> dict:
+    steps = rng.randint(8, 20)
+    nodes = [{"id": "start", "type": "start", "data": {"label": "Current role"}}]
+    edges = []
+    previous = "start"
+    for i in range(steps):
+        node_id = f"step-{i}"
+        nodes.append({"id": node_id, "type": rng.choice(("step", "skill", "project", "milestone")),
+                      "data": {"label": _sentence(rng, 6)}})
+        edges.append({"id": f"edge-{previous}-{node_id}", "source": previous, "target": node_id, "type": "smoothstep", "animated": False, "label": ""})
+        previous = node_id
+    nodes.append({"id": "end", "type": "end", "data": {"label": "Target role"}})
+    edges.append({"id": f"edge-{previous}-end", "source": previous, "target": "end", "type": "smoothstep", "animated": False, "label": ""})
+    return {"nodes": nodes, "edges": edges}
+
+
+def canned_response(prompt: str) -> tuple[str, dict]:
+    """(kind, data) of the canned answer for a prompt built from one of the prompts.py templates."""
+    rng = _rng_for(prompt)
+    if "career roadmap" in prompt:
+        return "roadmap", _roadmap(rng)
+    if '"analysis": {' in prompt:
+        return "combined", {"analysis": _analysis(rng), "ats": _ats(rng)}
+    if "Applicant Tracking System" in prompt:
+        return "ats", _ats(rng)
+    return "analysis", _analysis(rng)
+
+
+# --- Fake Model ---
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StreamedResponse:
+    """Async-iterable like the SDK's streamed response; usage_metadata is set once the stream is read."""
+
+    def __init__(self, chunks: list[str], delays: list[float], usage, started: float):
+        self._chunks = chunks
+        self._delays = delays
+        self._usage = usage
+        self._started = started
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        for chunk, delay in zip(self._chunks, self._delays):
+            await asyncio.sleep(delay)
+            yield _Chunk(chunk)
+        self.usage_metadata = self._usage
+        stats.latencies.append(time.perf_counter() - self._started)
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel covering what the backend calls."""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self._generation_config = generation_config or {}
+
+    def _render(self, prompt: str) -> str:
+        _, data = canned_response(prompt)
+        text = json.dumps(data, indent=2)
+        if self._generation_config.get("response_mime_type") != "application/json":
+            text = f"```json\n{text}\n```" # Without JSON mode the model tends to fence its output
+        return text
+
+    @staticmethod
+    def _usage(prompt: str, text: str):
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens, total_token_count=prompt_tokens + output_tokens)
+
+    async def generate_content_async(self, contents, stream: bool = False, request_options=None, **kwargs):
+        prompt = str(contents)
+        started = time.perf_counter()
+        stats.counters["calls"] += 1
+        first = config.latency(config.rng)
+        roll = config.rng.random()
+        if roll < config.rate_limit_ratio:
+            stats.counters["rate_limited"] += 1
+            await asyncio.sleep(min(first, 0.05))
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (fake quota).")
+        if roll < config.rate_limit_ratio + config.unavailable_ratio:
+            stats.counters["unavailable"] += 1
+            await asyncio.sleep(min(first, 0.05))
+            raise google_exceptions.ServiceUnavailable("The service is currently unavailable (fake).")
+
+        text = self._render(prompt)
+        chunks = [text[i:i + config.chunk_chars] for i in range(0, len(text), config.chunk_chars)]
+        delays = [first] + [config.chunk_ms / 1000] * (len(chunks) - 1)
+        timeout = (request_options or {}).get("timeout")
+        total = first if stream else sum(delays) # A streamed call returns at the first chunk
+        if timeout is not None and total > timeout:
+            stats.counters["timed_out"] += 1
+            await asyncio.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded("Deadline exceeded (fake).")
+
+        usage = self._usage(prompt, text)
+        if stream:
+            stats.counters["streamed"] += 1
+            await asyncio.sleep(first)
+            return _StreamedResponse(chunks, [0.0] + delays[1:], usage, started)
+        await asyncio.sleep(total)
+        stats.latencies.append(time.perf_counter() - started)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def count_tokens_async(self, contents, **kwargs):
+        stats.counters["count_tokens"] += 1
+        return SimpleNamespace(total_tokens=len(str(contents)) // 4)
+
+    def count_tokens(self, contents, **kwargs):
+        stats.counters["count_tokens"] += 1
+        return SimpleNamespace(total_tokens=len(str(contents)) // 4)
+
+
+def install(**settings):
+    """Replaces genai.GenerativeModel with the fake (call before the first model is built) and applies settings."""
+    import google.generativeai as genai
+
+    config.configure(**settings)
+    genai.GenerativeModel = FakeGenerativeModel
+    os.environ.setdefault("GEMINI_API_KEY", "offline-fake") # The endpoints refuse to run without a key
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The fake's settings as command line options (shared with load_bench.py)."""
+    parser.add_argument("--latency", default=config.latency_spec, help="fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--chunk-ms", type=float, default=config.chunk_ms, help="delay per output chunk")
+    parser.add_argument("--rate-limit-ratio", type=float, default=config.rate_limit_ratio, help="share of calls failing with 429")
+    parser.add_argument("--unavailable-ratio", type=float, default=config.unavailable_ratio, help="share of calls failing with 503")
+
+
+def settings_from(args) -> dict:
+    return {
+        "latency": args.latency,
+        "chunk_ms": args.chunk_ms,
+        "rate_limit_ratio": args.rate_limit_ratio,
+        "unavailable_ratio": args.unavailable_ratio,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    install(**settings_from(args))
+    from main import app
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures what constructing a Gemini model per request costs compared with the shared registry.
+
+Run from the backend directory:
+    python benchmarks/gemini_models_bench.py [--iterations 2000] [--live]
+
+Offline it times, for each prompt template's generation config, building the request the way the
+endpoints used to (a new GenerativeModel plus a per-call generation_config, whose response schema
+is converted every time) against a model_registry lookup with the config applied once. With --live
+(GEMINI_API_KEY must be set) it also times the first count_tokens call on a cold client against
+a second call on the warmed one.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai # noqa: E402
+
+from gemini_models import ModelRegistry, GEMINI_MODEL_NAME # noqa: E402
+from llm_output import generation_config_for # noqa: E402
+from prompts import RESPONSE_SCHEMAS, ANALYSIS_PROMPT_VERSION, ATS_PROMPT_VERSION, ROADMAP_PROMPT_VERSION # noqa: E402
+
+
+def per_call_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def offline(iterations: int):
+    registry = ModelRegistry()
+    print(f"{'template':<14}{'per-request us':>16}{'registry us':>14}{'speedup':>10}")
+    for version in (ANALYSIS_PROMPT_VERSION, ATS_PROMPT_VERSION, ROADMAP_PROMPT_VERSION):
+        config = generation_config_for(RESPONSE_SCHEMAS.get(version))
+        # _prepare_request is the SDK's request builder; it is what generate_content_async runs first
+        fresh = per_call_us(
+            lambda: genai.GenerativeModel(GEMINI_MODEL_NAME)._prepare_request(
+                contents="x", generation_config=config, tools=None, tool_config=None
+            ),
+            iterations,
+        )
+        shared = per_call_us(
+            lambda: registry.get(GEMINI_MODEL_NAME, config)._prepare_request(contents="x", tools=None, tool_config=None),
+            iterations,
+        )
+        print(f"{version:<14}{fresh:>16.1f}{shared:>14.1f}{fresh / shared:>9.1f}x")
+
+
+async def live():
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    model = ModelRegistry().get(GEMINI_MODEL_NAME)
+    for label in ("cold", "warm"):
+        started = time.perf_counter()
+        await model.count_tokens_async("warmup")
+        print(f"{label} count_tokens: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+    offline(args.iterations)
+    if args.live:
+        if not os.getenv("GEMINI_API_KEY"):
+            sys.exit("GEMINI_API_KEY is not set.")
+        asyncio.run(live())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark for the roadmap layout engine (layout.py).
+
+Run from the backend directory:
+    python benchmarks/layout_bench.py [--sizes 50,500,2000,5000] [--repeat 3]
+
+For each size it lays out a roadmap-shaped DAG (a backbone of steps with skill/project branches
+and some skip edges), a random sparse DAG, and a random graph with cycles, and reports the best
+wall time plus the number of layers and edge crossings between adjacent layers.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layout import compute_layout, assign_layers # noqa: E402
+
+
+def roadmap_like(n: int, rng: np.random.Generator):
+    backbone = max(2, n // 5)
+    src = list(range(backbone - 1))
+    tgt = list(range(1, backbone))
+    for node in range(backbone, n): # Each branch node hangs off a backbone step and may feed a later one
+        parent = int(rng.integers(0, backbone - 1))
+        src.append(parent)
+        tgt.append(node)
+        if rng.random() < 0.5:
+            src.append(node)
+            tgt.append(min(backbone - 1, parent + int(rng.integers(1, 4))))
+    return np.array(src), np.array(tgt)
+
+
+def random_dag(n: int, rng: np.random.Generator):
+    a, b = rng.integers(0, n, 2 * n), rng.integers(0, n, 2 * n)
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def random_cyclic(n: int, rng: np.random.Generator):
+    return rng.integers(0, n, 2 * n), rng.integers(0, n, 2 * n)
+
+
+def count_crossings(src: np.ndarray, tgt: np.ndarray, x: np.ndarray, y: np.ndarray) -> int:
+    """Crossings between edges joining the same pair of adjacent layers (skipped for very dense layer pairs)."""
+    keep = y[tgt] > y[src]
+    src, tgt = src[keep], tgt[keep]
+    crossings = 0
+    for layer_y in np.unique(y[src]):
+        in_pair = y[src] == layer_y
+        if in_pair.sum() > 3000:
+            continue
+        a, b = x[src[in_pair]], x[tgt[in_pair]]
+        crossings += int(np.sum(np.triu((a[:, None] - a[None, :]) * (b[:, None] - b[None, :]) < 0, k=1)))
+    return crossings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,500,2000,5000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    print(f"{'graph':<14}{'nodes':>7}{'edges':>8}{'layers':>8}{'best ms':>10}{'crossings':>11}{'unordered':>11}")
+    for n in (int(size) for size in args.sizes.split(",")):
+        for name, make in (("roadmap-like", roadmap_like), ("random DAG", random_dag), ("cyclic", random_cyclic)):
+            src, tgt = make(n, rng)
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                x, y = compute_layout(n, src, tgt)
+                timings.append((time.perf_counter() - started) * 1000)
+            unordered_x, unordered_y = compute_layout(n, src, tgt, sweeps=0) # Same layering, no crossing reduction
+            layers = int(assign_layers(n, src[src != tgt], tgt[src != tgt]).max()) + 1
+            print(
+                f"{name:<14}{n:>7}{len(src):>8}{layers:>8}{min(timings):>10.1f}"
+                f"{count_crossings(src, tgt, x, y):>11}{count_crossings(src, tgt, unordered_x, unordered_y):>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
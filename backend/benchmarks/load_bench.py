@@ -0,0 +1,369 @@
+"""
+End-to-end load benchmark for the API that needs neither Gemini quota nor a MongoDB server.
+
+Run from the backend directory, with the development requirements installed:
+    pip install -r requirements-dev.txt
+    python benchmarks/load_bench.py [--users 20] [--duration 30] [--mix default] [--save-baseline]
+
+The app runs in-process under uvicorn on a free port with Gemini replaced by benchmarks/fake_gemini.py
+(latency, streaming and 429/503 injection are set with the same options as the fake) and MongoDB by
+the in-memory stand-in (mongomock-motor), unless --mongo-uri points at a local mongod. Virtual users
+drive it over HTTP: each registers, logs in, tops up its credits, uploads a generated resume (unique
+per user, so extraction is exercised) and then loops over the endpoint mix until the time is up;
+--bypass-ratio of the Gemini requests ask for a fresh call, the rest may be served from the caches.
+
+It reports throughput and p50/p95/p99 per endpoint and per stage (text extraction, ATS layout
+scoring, MongoDB operations, Gemini requests, JSON parsing), writes them to --output as JSON, and
+compares them with the stored baseline for the mix (benchmarks/baselines/load-<mix>.json, written by
+--save-baseline). It exits with status 1 when a p95/p99 is more than --tolerance slower (plus
+--slack-ms, so tiny numbers do not flap), throughput dropped by more than --tolerance, or an
+endpoint's error rate went up by more than a percentage point. Baselines are machine-specific; save
+them on the machine that runs the comparison.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz # noqa: E402 # PyMuPDF
+import httpx # noqa: E402
+
+import fake_gemini # noqa: E402
+
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+MIN_SAMPLES = 20 # Endpoints and stages with fewer samples are reported but never compared
+
+# Relative weights of the actions each virtual user picks from after its setup requests
+MIXES = {
+    "default": {
+        "analyze": 25, "analyze_stream": 5, "ats": 25, "ats_fast": 10,
+        "roadmap": 10, "list_roadmaps": 15, "get_roadmap": 10,
+    },
+    "gemini": {"analyze": 40, "ats": 30, "roadmap": 30},
+    "read": {"ats_fast": 30, "list_roadmaps": 40, "get_roadmap": 30},
+}
+ROADMAP_REQUEST = {
+    "current_role": "Support Engineer", "target_role": "Backend Engineer", "years_of_experience": "3",
+    "timeframe": "12 months", "current_skills": "Python, SQL", "areas_of_interest": "APIs, databases",
+    "preferred_learning_style": "Hands-on projects",
+}
+
+
+# --- Measurements ---
+class Recorder:
+    """Latency samples per endpoint and per stage; samples taken during the warm-up are dropped."""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.endpoints: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[str, int]] = {}
+        self.stages: dict[str, list[float]] = {}
+
+    def endpoint(self, name: str, seconds: float, status: int):
+        if time.monotonic() < self.warmup_until:
+            return
+        self.endpoints.setdefault(name, []).append(seconds)
+        counts = self.statuses.setdefault(name, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def stage(self, name: str, seconds: float):
+        if time.monotonic() >= self.warmup_until:
+            self.stages.setdefault(name, []).append(seconds)
+
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    summary = {"count": len(ordered)}
+    if ordered:
+        summary.update(p50_ms=percentile(0.50), p95_ms=percentile(0.95), p99_ms=percentile(0.99), max_ms=round(ordered[-1] * 1000, 2))
+    if elapsed:
+        summary["rps"] = round(len(ordered) / elapsed, 2)
+    return summary
+
+
+def instrument(recorder: Recorder):
+    """Times the pipeline stages by wrapping the seams they already go through."""
+    import pipelines
+    from database import Repository
+    from extraction import extraction_executor
+
+    def timed_async(stage: str, fn):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                recorder.stage(stage, time.perf_counter() - started)
+        return wrapper
+
+    def timed_sync(stage: str, fn):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.stage(stage, time.perf_counter() - started)
+        return wrapper
+
+    extraction_executor.extract_text = timed_async("extract_text", extraction_executor.extract_text)
+    extraction_executor.extract_layout = timed_async("ats_layout", extraction_executor.extract_layout)
+    pipelines.request_gemini = timed_async("gemini_request", pipelines.request_gemini) # Streams: until the first chunk
+    pipelines.parse_and_validate = timed_sync("json_parse", pipelines.parse_and_validate)
+
+    # Every repository operation runs inside _deadline(), so timing that block times the MongoDB call
+    original_deadline = Repository._deadline
+
+    @contextlib.contextmanager
+    def timed_deadline(self, timeout=None):
+        started = time.perf_counter()
+        with original_deadline(self, timeout):
+            try:
+                yield
+            finally:
+                recorder.stage("mongo", time.perf_counter() - started)
+
+    Repository._deadline = timed_deadline
+
+
+# --- Load ---
+def resume_pdf(index: int, rng: random.Random) -> bytes:
+    """A one-page resume with unique content, so every user's upload misses the extracted-text cache."""
+    skills = ", ".join(rng.sample(["Python", "SQL", "Go", "Kubernetes", "React", "AWS", "Terraform", "Kafka", "Redis", "Django"], 5))
+    lines = [f"Candidate {index}", f"candidate{index}@example.com  |  +1 555 {1000 + index:04d}", "", "SUMMARY",
+             f"Engineer with {rng.randint(2, 12)} years of experience building services.", "", "EXPERIENCE"]
+    for job in range(rng.randint(2, 4)):
+        lines += [f"Software Engineer, Company {job}, {2015 + job} - {2017 + job}",
+                  f"- Built and improved APIs serving {rng.randint(1, 900)}k requests per day",
+                  f"- Reduced latency by {rng.randint(5, 60)}% through caching and query tuning",
+                  "- Led code reviews and mentored new engineers"]
+    lines += ["", "EDUCATION", "BSc Computer Science, Example University, 2011 - 2015", "", "SKILLS", skills]
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 560, 800), "\n".join(lines), fontsize=10, fontname="helv")
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+async def timed_request(client: httpx.AsyncClient, recorder: Recorder, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    if name == "analyze_stream":
+        # Time the whole stream, as the user waits for the "complete" event
+        async with client.stream(method, url, **kwargs) as response:
+            await response.aread()
+    else:
+        response = await client.request(method, url, **kwargs)
+    recorder.endpoint(name, time.perf_counter() - started, response.status_code)
+    return response
+
+
+async def virtual_user(index: int, client: httpx.AsyncClient, recorder: Recorder, args, stop_at: float, run_id: str):
+    rng = random.Random(args.seed * 100_003 + index)
+    mix = MIXES[args.mix]
+    actions, weights = list(mix), list(mix.values())
+    email = f"bench-{run_id}-{index}@example.com"
+
+    await timed_request(client, recorder, "register", "POST", "/register", json={"username": f"bench{index}", "email": email, "password": "bench-password"})
+    response = await timed_request(client, recorder, "login", "POST", "/login", json={"email": email, "password": "bench-password"})
+    if response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    await timed_request(client, recorder, "buy_credits", "POST", "/buy-credits/", json={"amount": 1_000_000, "transaction_details": "load bench"}, headers=headers)
+    files = {"file": (f"resume-{index}.pdf", resume_pdf(index, rng), "application/pdf")}
+    response = await timed_request(client, recorder, "upload", "POST", "/upload-resume/", files=files, headers=headers)
+    if response.status_code != 200:
+        return
+    resume_id = response.json()["resume_id"]
+    roadmap_ids = []
+
+    while time.monotonic() < stop_at:
+        action = rng.choices(actions, weights)[0]
+        if action == "get_roadmap" and not roadmap_ids:
+            action = "list_roadmaps"
+        params = {"bypass_cache": "true"} if rng.random() < args.bypass_ratio else {}
+        if action == "analyze":
+            await timed_request(client, recorder, action, "GET", f"/analyze-resume/{resume_id}", params=params, headers=headers)
+        elif action == "analyze_stream":
+            await timed_request(client, recorder, action, "GET", f"/analyze-resume/{resume_id}/stream", params=params, headers=headers)
+        elif action == "ats":
+            await timed_request(client, recorder, action, "GET", f"/check-resume-ats/{resume_id}", params=params, headers=headers)
+        elif action == "ats_fast":
+            await timed_request(client, recorder, action, "GET", f"/check-resume-ats/{resume_id}", params={"mode": "fast"}, headers=headers)
+        elif action == "roadmap":
+            response = await timed_request(client, recorder, action, "POST", "/generate-roadmap/", params=params, json=ROADMAP_REQUEST, headers=headers)
+            if response.status_code == 200:
+                roadmap_ids.append(response.json()["roadmap_id"])
+        elif action == "list_roadmaps":
+            await timed_request(client, recorder, action, "GET", "/list-roadmaps/", headers=headers)
+        elif action == "get_roadmap":
+            await timed_request(client, recorder, action, "GET", f"/get-roadmap/{rng.choice(roadmap_ids)}", headers=headers)
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args) -> dict:
+    import uvicorn
+    from main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result() # Surfaces the startup error
+        await asyncio.sleep(0.05)
+
+    started = time.monotonic()
+    recorder = Recorder(warmup_until=started + args.warmup)
+    instrument(recorder)
+    fake_gemini.stats.reset()
+    stop_at = started + args.warmup + args.duration
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+            await asyncio.gather(*(virtual_user(i, client, recorder, args, stop_at, run_id) for i in range(args.users)))
+            server_stats = (await client.get("/stats/")).json()
+    finally:
+        server.should_exit = True
+        await serving
+    elapsed = max(1e-9, time.monotonic() - max(started + args.warmup, started))
+
+    endpoints = {}
+    for name, samples in sorted(recorder.endpoints.items()):
+        statuses = recorder.statuses[name]
+        errors = sum(count for status, count in statuses.items() if int(status) >= 400)
+        endpoints[name] = {**summarize(samples, elapsed), "error_rate": round(errors / len(samples), 4), "statuses": statuses}
+    return {
+        "meta": {
+            "mix": args.mix, "users": args.users, "duration_s": args.duration, "warmup_s": args.warmup,
+            "bypass_ratio": args.bypass_ratio, "seed": args.seed, "mongo": os.environ["MONGO_URI"].split("://", 1)[0],
+            "fake_gemini": {**fake_gemini.settings_from(args)}, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "throughput_rps": round(sum(len(samples) for samples in recorder.endpoints.values()) / elapsed, 2),
+        "endpoints": endpoints,
+        "stages": {name: summarize(samples) for name, samples in sorted(recorder.stages.items())},
+        "fake_gemini_calls": fake_gemini.stats.snapshot(),
+        "server": {key: server_stats.get(key) for key in ("gemini_admission", "gemini_breaker", "llm_response_cache")},
+    }
+
+
+# --- Reporting and Baselines ---
+def print_report(results: dict):
+    out = sys.stderr
+    header = f"{'':<16}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    print(f"\nThroughput: {results['throughput_rps']} requests/s", file=out)
+    print("\nEndpoints\n" + header, file=out)
+    for name, row in results["endpoints"].items():
+        print(f"{name:<16}{row['count']:>8}{row.get('rps', 0):>9}{row.get('p50_ms', 0):>10}{row.get('p95_ms', 0):>10}"
+              f"{row.get('p99_ms', 0):>10}{row['error_rate'] * 100:>8.1f}%", file=out)
+    print(f"\nStages\n{'':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=out)
+    for name, row in results["stages"].items():
+        print(f"{name:<16}{row['count']:>8}{row.get('p50_ms', 0):>10}{row.get('p95_ms', 0):>10}{row.get('p99_ms', 0):>10}", file=out)
+    print(f"\nFake Gemini: {results['fake_gemini_calls']}", file=out)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    """Regressions of results against baseline, as human-readable lines."""
+    regressions = []
+
+    def slower(kind: str, name: str, current: dict, base: dict):
+        if base.get("count", 0) < MIN_SAMPLES or current.get("count", 0) < MIN_SAMPLES:
+            return
+        for key in ("p95_ms", "p99_ms"):
+            limit = base[key] * (1 + tolerance) + slack_ms
+            if current[key] > limit:
+                regressions.append(f"{kind} {name}: {key} {current[key]} > {round(limit, 2)} (baseline {base[key]})")
+
+    for name, base in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(name)
+        if current is None:
+            continue
+        slower("endpoint", name, current, base)
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"endpoint {name}: error rate {current['error_rate']:.2%} (baseline {base['error_rate']:.2%})")
+    for name, base in baseline.get("stages", {}).items():
+        if name in results["stages"]:
+            slower("stage", name, results["stages"][name], base)
+    if results["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {results['throughput_rps']} requests/s < {baseline['throughput_rps']} * {1 - tolerance:g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds, after the warm-up")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring starts")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--bypass-ratio", type=float, default=0.3, help="share of Gemini requests sent with bypass_cache")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's requests")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", default="mongomock://load-bench", help="e.g. mongodb://localhost:27017 for a local mongod")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--baseline", help="baseline to compare with (default: benchmarks/baselines/load-<mix>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before failing")
+    parser.add_argument("--slack-ms", type=float, default=5, help="absolute slack added to every latency limit")
+    parser.add_argument("--app-log", default=os.devnull, help="where the app's own output goes")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time, so set it up before main is imported
+    upload_directory = tempfile.mkdtemp(prefix="load-bench-")
+    os.environ.update(
+        MONGO_URI=args.mongo_uri,
+        DATABASE_NAME=f"load_bench_{uuid.uuid4().hex[:8]}",
+        SECRET_KEY=os.getenv("SECRET_KEY", "load-bench-secret"),
+        UPLOAD_DIRECTORY=upload_directory,
+    )
+    fake_gemini.install(seed=args.seed, **fake_gemini.settings_from(args))
+
+    with open(args.app_log, "a") as app_log, contextlib.redirect_stdout(app_log):
+        results = asyncio.run(run(args))
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIRECTORY, f"load-{args.mix}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}", file=sys.stderr)
+        return
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one.", file=sys.stderr)
+        return
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), args.tolerance, args.slack_ms)
+    if regressions:
+        print("\nRegressions against " + baseline_path + ":\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions against {baseline_path}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the token cost of prompt template versions on real resumes.
+
+Run from the backend directory (GEMINI_API_KEY must be set for the count_tokens API):
+    python benchmarks/prompt_tokens.py resume1.pdf [resume2.txt ...] [--versions analysis-v1,analysis-v2] [--normalize]
+
+For every file it prints the input tokens of each template version, as counted by the Gemini
+count_tokens API, plus the output tokens a raw_text echo would cost (the tokens of the
+JSON-escaped resume text), which versions without the echo no longer spend. With --normalize the
+resume text first goes through text_normalize.normalize_resume_text, as it does in the API, and
+the characters it removed are printed per file.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai # noqa: E402
+
+from extraction import _extract_text_worker, EXTRACTION_MAX_PAGES # noqa: E402
+from gemini_models import GEMINI_MODEL_NAME # noqa: E402
+from prompts import build_prompt, count_prompt_tokens # noqa: E402
+from text_normalize import normalize_resume_text # noqa: E402
+
+
+def read_text(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        return _extract_text_worker(path, EXTRACTION_MAX_PAGES)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--versions", default="analysis-v1,analysis-v2")
+    parser.add_argument("--model", default=GEMINI_MODEL_NAME)
+    parser.add_argument("--normalize", action="store_true", help="normalize the resume text before building prompts")
+    args = parser.parse_args()
+    if not os.getenv("GEMINI_API_KEY"):
+        sys.exit("GEMINI_API_KEY is not set.")
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    versions = args.versions.split(",")
+
+    totals = {version: 0 for version in versions}
+    echo_total = 0
+    print(f"{'file':<32}" + "".join(f"{version:>16}" for version in versions) + f"{'echo output':>14}")
+    for path in args.files:
+        text = read_text(path)
+        if args.normalize:
+            text, report = normalize_resume_text(text)
+            print(f"  {os.path.basename(path)}: normalized {report['chars_before']} -> {report['chars_after']} chars")
+        counts = [await count_prompt_tokens(args.model, build_prompt(version, text)) for version in versions]
+        echo = await count_prompt_tokens(args.model, json.dumps(text))
+        for version, count in zip(versions, counts):
+            totals[version] += count
+        echo_total += echo
+        print(f"{os.path.basename(path)[:31]:<32}" + "".join(f"{count:>16}" for count in counts) + f"{echo:>14}")
+
+    print(f"{'total':<32}" + "".join(f"{totals[version]:>16}" for version in versions) + f"{echo_total:>14}")
+    baseline = totals[versions[0]]
+    for version in versions[1:]:
+        if baseline:
+            print(f"{version}: {100 * (baseline - totals[version]) / baseline:.1f}% fewer input tokens than {versions[0]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
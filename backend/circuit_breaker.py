@@ -0,0 +1,102 @@
+import os
+import math
+import time
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Circuit Breaker Configuration ---
+# After GEMINI_BREAKER_FAILURES consecutive upstream failures (timeouts, 5xx, 429s, connection
+# errors) Gemini calls fail fast with 503 for GEMINI_BREAKER_COOLDOWN_SECONDS; then a single probe
+# call is let through and its outcome closes or re-opens the breaker.
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe after the cool-down -> closed."""
+
+    def __init__(self, name: str, failure_threshold: int = GEMINI_BREAKER_FAILURES, cooldown: float = GEMINI_BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self.counters = {"trips": 0, "rejected": 0}
+
+    def _retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def _probe_due(self, now: float) -> bool:
+        # One probe at a time; a probe that never reported back is replaced after a cool-down
+        if self.state == "open" and self._retry_after() > 0:
+            return False
+        return self._probe_started is None or now - self._probe_started > self.cooldown
+
+    def _reject(self):
+        self.counters["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="The AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(self._retry_after())))},
+        )
+
+    def allow(self):
+        """
+        Raises 503 + Retry-After while the breaker would reject a call. Read-only, so endpoints can
+        call it before charging credits without taking the half-open probe slot from their own call.
+        """
+        if self.state != "closed" and not self._probe_due(time.monotonic()):
+            self._reject()
+
+    def acquire(self) -> float | None:
+        """
+        Raises 503 + Retry-After while the breaker is open. Call right before every upstream request.
+        When half-open, the caller becomes the probe: it gets a token that must be passed to release()
+        if the call ends without record_success() or record_failure().
+        """
+        if self.state == "closed":
+            return None
+        now = time.monotonic()
+        if not self._probe_due(now):
+            self._reject()
+        self.state = "half_open"
+        self._probe_started = now
+        return now
+
+    def release(self, probe: float | None):
+        """Frees the probe slot taken by acquire() for a call whose outcome says nothing about the upstream."""
+        if probe is not None and self._probe_started == probe:
+            self._probe_started = None
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.counters["trips"] += 1
+                print(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} consecutive failures.")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self._retry_after(), 1) if self.state == "open" else 0,
+            **self.counters,
+        }
+
+
+# Shared breaker for every Gemini call site in this process
+gemini_breaker = CircuitBreaker("gemini")
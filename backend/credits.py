@@ -0,0 +1,207 @@
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError, DuplicateKeyError
+from bson import ObjectId
+
+from database import db
+from auth_cache import user_cache
+from ledger import ledger_writer
+from deadlines import outside_deadline
+
+# Credit Costs
+DEFAULT_STARTING_CREDITS = 10
+RESUME_CHECKER_COST = 2 # Example cost
+ROADMAP_GENERATOR_COST = 3 # Example cost
+BATCH_ANALYSIS_COST = 1 # Per resume analyzed through /batch/analyze-resumes/
+
+# --- Credit Management Functions ---
+# By default ledger entries for deductions and purchases go through the write-behind ledger writer
+# (batched, spilled to disk while Mongo is unavailable) and only the balance update is on the request
+# path. With LEDGER_WRITE_BEHIND=false the balance change and its ledger entry are written in one
+# transaction when MongoDB runs as a replica set; on a standalone server the balance update comes
+# first (it is the source of truth) and a failed ledger write is only logged. Refunds always write
+# their ledger entry directly, since its unique refund_of is what keeps a charge from being refunded twice.
+
+async def _apply_balance_change(apply):
+    if ledger_writer.is_running:
+        return await apply(None) # A single-document update needs no transaction
+    return await db.run_transaction(apply)
+
+
+async def _record_transaction(transaction_doc: dict, session):
+    if session is None and ledger_writer.is_running:
+        ledger_writer.enqueue(transaction_doc)
+        return
+    try:
+        await db.credit_transactions.create(transaction_doc, session=session)
+    except DuplicateKeyError:
+        raise
+    except PyMongoError as e:
+        if session is not None:
+            raise # Aborts the transaction, undoing the balance change
+        print(f"Error recording credit transaction {transaction_doc['_id']} for user {transaction_doc['user_id']}: {e}")
+
+
+async def deduct_credits(user_id: str, amount: int, feature_name: str, insufficient_detail: str = "Insufficient credits.") -> dict:
+    """
+    Deducts credits from a user's balance and records the transaction.
+    The balance check and the deduction are a single conditional update, so concurrent requests
+    can never take the balance below zero. Returns the ledger entry (with the new balance), which
+    refund_credits() accepts if the paid work fails afterwards.
+    """
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+
+    transaction_doc = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "type": "deduction",
+        "feature": feature_name,
+        "amount": -amount, # Store as negative for deduction
+        "timestamp": datetime.now(timezone.utc),
+        # You could add more details like resume_id or roadmap_id here
+    }
+
+    async def apply(session):
+        balance = await db.users.debit_credits(user_id, amount, session=session)
+        if balance is None:
+            # Either the balance is too low or the user is gone; only this failure path pays for a second read
+            if await db.users.find_by_id(user_id, projection={"_id": 1}) is None:
+                raise HTTPException(status_code=404, detail="User not found.")
+            raise HTTPException(status_code=400, detail=insufficient_detail)
+        transaction_doc["balance_after"] = balance
+        await _record_transaction(transaction_doc, session)
+
+    try:
+        await _apply_balance_change(apply)
+    except HTTPException:
+         # Re-raise the insufficient credits error
+         raise
+    except PyMongoError as e:
+        print(f"Database error during credit deduction for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Database error during credit deduction.")
+    except Exception as e:
+        print(f"An unexpected error occurred during credit deduction for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during credit deduction.")
+    finally:
+        user_cache.invalidate_user(user_id) # The cached balance may be stale now
+
+    return transaction_doc
+
+
+async def refund_credits(charge: dict, reason: str, amount: int | None = None):
+    """
+    Returns the credits taken by a deduct_credits() charge (or, with amount, the unused part of a
+    reservation), at most once per charge: the refund's ledger entry carries refund_of, which has a
+    unique index. Never raises, so it is safe to call while handling the error that made the refund
+    necessary. Runs outside the request's deadline, so a request that ran out of time is still refunded.
+    """
+    await outside_deadline(_refund_credits(charge, reason, amount))
+
+
+async def _refund_credits(charge: dict, reason: str, amount: int | None = None):
+    if charge.get("refunded"):
+        return
+    user_id = charge["user_id"]
+    amount = -charge["amount"] if amount is None else min(amount, -charge["amount"])
+    if amount <= 0:
+        return
+    refund_doc = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "type": "refund",
+        "feature": charge.get("feature"),
+        "amount": amount,
+        "refund_of": charge["_id"],
+        "timestamp": datetime.now(timezone.utc),
+        "details": reason,
+    }
+
+    async def apply(session):
+        # Ledger first: a duplicate refund_of stops a second refund before the balance changes
+        await db.credit_transactions.create(refund_doc, session=session)
+        refund_doc["balance_after"] = await db.users.increment_credits(user_id, amount, session=session)
+
+    try:
+        if db.supports_transactions:
+            await db.run_transaction(apply)
+        else:
+            amount = await _refund_without_transaction(refund_doc)
+        charge["refunded"] = True
+        if amount:
+            print(f"Refunded {amount} credits to user {user_id} for charge {charge['_id']}: {reason}")
+    except DuplicateKeyError:
+        charge["refunded"] = True # Already refunded elsewhere
+    except Exception as e:
+        print(f"Error refunding charge {charge['_id']} for user {user_id}: {e}")
+    finally:
+        user_cache.invalidate_user(user_id)
+
+
+async def _refund_without_transaction(refund_doc: dict) -> int:
+    """
+    Refunds on a standalone server, where the ledger entry and the balance cannot change together.
+    The entry still claims the refund first (unique refund_of), but as "pending"; only the attempt that
+    moves it to "applying" changes the balance, and it is "applied" once that succeeded. A failed balance
+    update puts it back to "pending", so the next refund attempt for the charge finishes it. Returns
+    the amount refunded by this call (0 if the charge was already refunded).
+    """
+    entry = {**refund_doc, "status": "pending"}
+    try:
+        await db.credit_transactions.create(entry)
+    except DuplicateKeyError:
+        entry = await db.credit_transactions.find_refund(refund_doc["refund_of"])
+        if entry is None or entry.get("status") != "pending":
+            return 0 # Refunded (or being refunded) by an earlier attempt
+    if not await db.credit_transactions.move_status(entry["_id"], "pending", "applying"):
+        return 0 # A concurrent attempt got there first
+
+    try:
+        balance = await db.users.increment_credits(entry["user_id"], entry["amount"])
+    except Exception:
+        await db.credit_transactions.move_status(entry["_id"], "applying", "pending")
+        raise
+    await db.credit_transactions.move_status(entry["_id"], "applying", "applied", {"balance_after": balance})
+    return entry["amount"]
+
+
+async def add_credits(user_id: str, amount: int, transaction_details: str) -> int:
+    """Adds credits to a user's balance and records the transaction. Returns the new balance."""
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+
+    if amount <= 0:
+         raise HTTPException(status_code=400, detail="Amount must be positive.")
+
+    transaction_doc = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "type": "purchase",
+        "amount": amount,
+        "timestamp": datetime.now(timezone.utc),
+        "details": transaction_details # e.g., "Purchased 100 credits via Stripe"
+    }
+
+    async def apply(session):
+        balance = await db.users.increment_credits(user_id, amount, session=session)
+        if balance is None:
+             print(f"Warning: Failed to add credits for user {user_id}, amount {amount}. User not found.")
+             raise HTTPException(status_code=404, detail="User not found.")
+        transaction_doc["balance_after"] = balance
+        await _record_transaction(transaction_doc, session)
+        return balance
+
+    try:
+        return await _apply_balance_change(apply)
+    except HTTPException:
+         # Re-raise the user not found error
+         raise
+    except PyMongoError as e:
+        print(f"Database error during credit addition for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Database error during credit addition.")
+    except Exception as e:
+        print(f"An unexpected error occurred during credit addition for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during credit addition.")
+    finally:
+        user_cache.invalidate_user(user_id) # The cached balance may be stale now
@@ -0,0 +1,437 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from bson import ObjectId # To work with MongoDB ObjectIds
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from metrics import mongo_event_listeners
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- MongoDB Configuration ---
+MONGO_URI = os.getenv("MONGO_URI")
+DATABASE_NAME = os.getenv("DATABASE_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_OPERATION_TIMEOUT_SECONDS = float(os.getenv("MONGO_OPERATION_TIMEOUT_SECONDS", "5")) # Default budget for a single operation
+MONGO_LIST_TIMEOUT_SECONDS = float(os.getenv("MONGO_LIST_TIMEOUT_SECONDS", "15")) # Budget for listing queries that iterate a cursor
+
+# MONGO_URI values with this scheme use an in-memory stand-in (mongomock-motor, from requirements-dev.txt)
+IN_MEMORY_URI_SCHEME = "mongomock://"
+
+
+class Repository:
+    """Base class for a repository wrapping one Motor collection."""
+
+    def __init__(self, collection, timeout: float = MONGO_OPERATION_TIMEOUT_SECONDS):
+        self.collection = collection
+        self.timeout = timeout
+
+    def _deadline(self, timeout: float | None = None):
+        """Context manager applying a client-side timeout to the operations issued inside it."""
+        return pymongo.timeout(timeout if timeout is not None else self.timeout)
+
+
+class UserRepository(Repository):
+    """Data access for the users collection."""
+
+    async def find_by_email(self, email: str, projection: dict | None = None):
+        with self._deadline():
+            return await self.collection.find_one({"email": email}, projection)
+
+    async def find_by_id(self, user_id: str, projection: dict | None = None):
+        with self._deadline():
+            return await self.collection.find_one({"_id": ObjectId(user_id)}, projection)
+
+    async def create(self, user_doc: dict) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(user_doc)
+        return str(result.inserted_id)
+
+    async def increment_credits(self, user_id: str, amount: int, session=None) -> int | None:
+        """Atomically adds amount to the user's credits. Returns the new balance, or None if the user does not exist."""
+        with self._deadline():
+            user = await self.collection.find_one_and_update(
+                {"_id": ObjectId(user_id)},
+                {"$inc": {"credits": amount}},
+                projection={"credits": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        return None if user is None else user["credits"]
+
+    async def debit_credits(self, user_id: str, amount: int, session=None) -> int | None:
+        """
+        Atomically subtracts amount if the balance covers it, in one round trip.
+        Returns the new balance, or None if the user does not exist or has too few credits.
+        """
+        with self._deadline():
+            user = await self.collection.find_one_and_update(
+                {"_id": ObjectId(user_id), "credits": {"$gte": amount}},
+                {"$inc": {"credits": -amount}},
+                projection={"credits": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        return None if user is None else user["credits"]
+
+
+class ResumeRepository(Repository):
+    """Data access for the resumes collection."""
+
+    async def create(self, resume_doc: dict) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(resume_doc)
+        return str(result.inserted_id)
+
+    async def find_owned(self, resume_id: str, uploader_id: str):
+        """Finds a resume by ID, only if it belongs to the given uploader."""
+        with self._deadline():
+            return await self.collection.find_one({
+                "_id": ObjectId(resume_id),
+                "uploader_id": uploader_id
+            })
+
+    async def set_fields(self, resume_id: str, fields: dict) -> int:
+        with self._deadline():
+            result = await self.collection.update_one(
+                {"_id": ObjectId(resume_id)},
+                {"$set": fields}
+            )
+        return result.modified_count
+
+    async def delete(self, resume_id: str) -> int:
+        with self._deadline():
+            result = await self.collection.delete_one({"_id": ObjectId(resume_id)})
+        return result.deleted_count
+
+
+class RoadmapRepository(Repository):
+    """Data access for the roadmaps collection."""
+
+    async def create(self, roadmap_doc: dict) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(roadmap_doc)
+        return str(result.inserted_id)
+
+    async def find_owned(self, roadmap_id: str, uploader_id: str, projection: dict | None = None):
+        """Finds a roadmap by ID, only if it belongs to the given uploader."""
+        with self._deadline():
+            return await self.collection.find_one({
+                "_id": ObjectId(roadmap_id),
+                "uploader_id": uploader_id
+            }, projection)
+
+    async def list_summaries(self, uploader_id: str, limit: int, before: tuple[datetime, ObjectId] | None = None) -> list:
+        """
+        Returns one page of the uploader's roadmaps, newest first, without their graphs.
+        Keyset pagination: pass the (generated_timestamp, _id) of the last summary seen as `before`.
+        """
+        match = {"uploader_id": uploader_id}
+        if before is not None:
+            before_timestamp, before_id = before
+            match["$or"] = [
+                {"generated_timestamp": {"$lt": before_timestamp}},
+                {"generated_timestamp": before_timestamp, "_id": {"$lt": before_id}},
+            ]
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"generated_timestamp": -1, "_id": -1}},
+            {"$limit": limit},
+            {"$project": {
+                "generated_timestamp": 1,
+                "request_data.current_role": 1,
+                "request_data.target_role": 1,
+                # Roadmaps stored before node_count was recorded are counted on the server
+                "node_count": {"$ifNull": ["$node_count", {"$size": {"$ifNull": ["$roadmap_data.nodes", []]}}]},
+            }},
+        ]
+        with self._deadline(MONGO_LIST_TIMEOUT_SECONDS):
+            return [doc async for doc in self.collection.aggregate(pipeline)]
+
+
+class TokenRepository(Repository):
+    """Data access for the tokens collection."""
+
+    async def create(self, token_doc: dict) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(token_doc)
+        return str(result.inserted_id)
+
+
+class CreditTransactionRepository(Repository):
+    """Data access for the credit_transactions collection."""
+
+    async def create(self, transaction_doc: dict, session=None) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(transaction_doc, session=session)
+        return str(result.inserted_id)
+
+    async def find_refund(self, charge_id: ObjectId):
+        with self._deadline():
+            return await self.collection.find_one({"refund_of": charge_id})
+
+    async def move_status(self, transaction_id: ObjectId, from_status: str, to_status: str, fields: dict | None = None) -> bool:
+        """Moves an entry from from_status to to_status. Returns False if it was not in from_status."""
+        with self._deadline():
+            result = await self.collection.update_one(
+                {"_id": transaction_id, "status": from_status}, {"$set": {"status": to_status, **(fields or {})}}
+            )
+        return result.modified_count == 1
+
+    async def insert_batch(self, transaction_docs: list):
+        """Bulk-inserts ledger entries in one round trip. Entries already stored (same _id) are skipped."""
+        try:
+            with self._deadline():
+                await self.collection.insert_many(transaction_docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean an earlier, partially failed flush already stored those entries
+            if e.details.get("writeConcernErrors") or any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+
+class ExtractedTextRepository(Repository):
+    """Data access for the extracted_texts collection, keyed by the SHA-256 of the PDF bytes."""
+
+    async def find(self, content_hash: str):
+        """The stored text for a content hash. A hit refreshes last_used, which the retention TTL counts from."""
+        with self._deadline():
+            return await self.collection.find_one_and_update(
+                {"_id": content_hash}, {"$set": {"last_used": datetime.now(timezone.utc)}}
+            )
+
+    async def save(self, content_hash: str, text: str):
+        """Stores the text for a content hash once; later saves of the same hash only refresh last_used."""
+        now = datetime.now(timezone.utc)
+        with self._deadline():
+            await self.collection.update_one(
+                {"_id": content_hash},
+                {"$setOnInsert": {"text": text, "char_count": len(text), "created_at": now}, "$set": {"last_used": now}},
+                upsert=True
+            )
+
+
+class LLMResponseRepository(Repository):
+    """Data access for the llm_responses collection (persistent tier of the Gemini response cache)."""
+
+    async def find(self, cache_key: str):
+        with self._deadline():
+            return await self.collection.find_one({"_id": cache_key})
+
+    async def save(self, cache_key: str, cache_doc: dict):
+        with self._deadline():
+            await self.collection.replace_one({"_id": cache_key}, cache_doc, upsert=True)
+
+
+class ATSResultRepository(Repository):
+    """Data access for the ats_results collection, keyed by resume content hash, ATS prompt version and model."""
+
+    async def find(self, result_keys: list[str]):
+        """The stored result for any of the given keys (one per prompt version that can produce it)."""
+        with self._deadline():
+            return await self.collection.find_one({"_id": {"$in": result_keys}})
+
+    async def save(self, result_key: str, result_doc: dict):
+        with self._deadline():
+            await self.collection.replace_one({"_id": result_key}, result_doc, upsert=True)
+
+
+class JobRepository(Repository):
+    """Data access for the jobs collection backing the asynchronous job pipeline."""
+
+    async def create(self, job_doc: dict) -> str:
+        with self._deadline():
+            result = await self.collection.insert_one(job_doc)
+        return str(result.inserted_id)
+
+    async def find(self, job_id: str):
+        with self._deadline():
+            return await self.collection.find_one({"_id": ObjectId(job_id)})
+
+    async def find_owned(self, job_id: str, user_id: str):
+        """Finds a job by ID, only if it was submitted by the given user."""
+        with self._deadline():
+            return await self.collection.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+
+    async def count_queued(self) -> int:
+        with self._deadline():
+            return await self.collection.count_documents({"status": "queued"})
+
+    async def claim_next(self, worker_id: str):
+        """Atomically moves the oldest queued job to running and returns it, or None if the queue is empty."""
+        now = datetime.now(timezone.utc)
+        with self._deadline():
+            return await self.collection.find_one_and_update(
+                {"status": "queued"},
+                {"$set": {"status": "running", "worker_id": worker_id, "started_at": now, "updated_at": now},
+                 "$inc": {"attempts": 1}},
+                sort=[("created_at", pymongo.ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+
+    async def finish(self, job_id, status: str, result=None, error=None) -> int:
+        """Records the outcome of a running job."""
+        now = datetime.now(timezone.utc)
+        with self._deadline():
+            update_result = await self.collection.update_one(
+                {"_id": ObjectId(job_id), "status": "running"},
+                {"$set": {"status": status, "result": result, "error": error, "finished_at": now, "updated_at": now}}
+            )
+        return update_result.modified_count
+
+    async def requeue(self, job_id) -> int:
+        """Puts a running job back on the queue (used when its worker shuts down mid-job)."""
+        with self._deadline():
+            update_result = await self.collection.update_one(
+                {"_id": ObjectId(job_id), "status": "running"},
+                {"$set": {"status": "queued", "worker_id": None, "updated_at": datetime.now(timezone.utc)}}
+            )
+        return update_result.modified_count
+
+    async def recover_stale(self, started_before: datetime, max_attempts: int) -> tuple[int, int]:
+        """Requeues (or fails, after max_attempts) running jobs whose worker has gone away. Returns both counts."""
+        now = datetime.now(timezone.utc)
+        stale = {"status": "running", "started_at": {"$lt": started_before}}
+        with self._deadline():
+            failed = await self.collection.update_many(
+                {**stale, "attempts": {"$gte": max_attempts}},
+                {"$set": {"status": "failed", "finished_at": now, "updated_at": now,
+                          "error": {"status_code": 500, "detail": "Job was interrupted too many times."}}}
+            )
+            requeued = await self.collection.update_many(
+                stale,
+                {"$set": {"status": "queued", "worker_id": None, "updated_at": now}}
+            )
+        return requeued.modified_count, failed.modified_count
+
+
+class LeaseRepository(Repository):
+    """Data access for the leases collection: short-lived, expiring locks shared by all app workers."""
+
+    async def acquire(self, lease_key: str, owner: str, ttl_seconds: float) -> bool:
+        """Takes the lease if it is free or expired. Returns False while another owner holds it."""
+        now = datetime.now(timezone.utc)
+        try:
+            with self._deadline():
+                await self.collection.find_one_and_update(
+                    {"_id": lease_key, "expires_at": {"$lt": now}},
+                    {"$set": {"owner": owner, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                    upsert=True
+                )
+            return True
+        except DuplicateKeyError:
+            return False # The lease document exists and has not expired
+
+    async def is_held(self, lease_key: str) -> bool:
+        with self._deadline():
+            lease = await self.collection.find_one({"_id": lease_key}, {"expires_at": 1})
+        if lease is None:
+            return False
+        expires_at = lease["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc) # BSON dates come back naive
+        return expires_at > datetime.now(timezone.utc)
+
+    async def release(self, lease_key: str, owner: str):
+        with self._deadline():
+            await self.collection.delete_one({"_id": lease_key, "owner": owner})
+
+
+class MongoDatabase:
+    """Holds the async MongoDB client and one repository per collection."""
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.users: UserRepository | None = None
+        self.resumes: ResumeRepository | None = None
+        self.tokens: TokenRepository | None = None
+        self.roadmaps: RoadmapRepository | None = None
+        self.credit_transactions: CreditTransactionRepository | None = None
+        self.extracted_texts: ExtractedTextRepository | None = None
+        self.llm_responses: LLMResponseRepository | None = None
+        self.ats_results: ATSResultRepository | None = None
+        self.jobs: JobRepository | None = None
+        self.leases: LeaseRepository | None = None
+        self.supports_transactions = False # Multi-document transactions need a replica set or sharded cluster
+
+    @property
+    def is_connected(self) -> bool:
+        return self.db is not None
+
+    def _create_client(self, uri: str):
+        if uri.startswith(IN_MEMORY_URI_SCHEME):
+            # In-memory stand-in for local runs and tests; imported lazily so production never needs it
+            from mongomock_motor import AsyncMongoMockClient
+            return AsyncMongoMockClient()
+        return AsyncIOMotorClient(
+            uri,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=mongo_event_listeners(MONGO_MAX_POOL_SIZE), # Command latency and pool usage on /metrics
+        )
+
+    async def _supports_transactions(self, client) -> bool:
+        try:
+            with pymongo.timeout(MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000):
+                hello = await client.admin.command("hello")
+        except (PyMongoError, NotImplementedError): # The in-memory stand-in does not implement hello
+            return False
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def connect(self, uri: str | None = MONGO_URI, database_name: str | None = DATABASE_NAME, client=None):
+        """Connects to MongoDB (or uses the given client) and initializes the repositories."""
+        if client is None:
+            if not uri or not database_name:
+                print("MONGO_URI or DATABASE_NAME environment variable not set.")
+                return
+            client = self._create_client(uri)
+
+        # The ping command is cheap and does not require auth.
+        with pymongo.timeout(MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000):
+            await client.admin.command("ping")
+        self.supports_transactions = await self._supports_transactions(client)
+
+        self.client = client
+        self.db = client[database_name or "zumeo"]
+        self.users = UserRepository(self.db.users)
+        self.resumes = ResumeRepository(self.db.resumes)
+        self.tokens = TokenRepository(self.db.tokens)
+        self.roadmaps = RoadmapRepository(self.db.roadmaps)
+        self.credit_transactions = CreditTransactionRepository(self.db.credit_transactions)
+        self.extracted_texts = ExtractedTextRepository(self.db.extracted_texts)
+        self.llm_responses = LLMResponseRepository(self.db.llm_responses)
+        self.ats_results = ATSResultRepository(self.db.ats_results)
+        self.jobs = JobRepository(self.db.jobs)
+        self.leases = LeaseRepository(self.db.leases)
+
+    async def run_transaction(self, callback):
+        """
+        Runs callback(session) inside a transaction when the deployment supports them (retrying
+        transient errors), or once with session=None on a standalone server.
+        """
+        if not self.supports_transactions:
+            return await callback(None)
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(callback)
+
+    def close(self):
+        """Closes the MongoDB client."""
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+        self.supports_transactions = False
+
+
+# Shared database handle used by every endpoint
+db = MongoDatabase()
@@ -0,0 +1,74 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+import pymongo
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Request Deadline Configuration ---
+# Each Gemini endpoint runs under one time budget covering extraction, the Gemini call and
+# persistence. The deadline lives in a context variable, so every stage (and the single-flight
+# tasks started from it) sees the same one and sizes its own timeout to what is left. Stages fail
+# with a regular HTTPException, so the endpoints' refund paths still run.
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "90"))
+ATS_DEADLINE_SECONDS = float(os.getenv("ATS_DEADLINE_SECONDS", "60"))
+ROADMAP_DEADLINE_SECONDS = float(os.getenv("ROADMAP_DEADLINE_SECONDS", "120"))
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "300"))
+GEMINI_CALL_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CALL_TIMEOUT_SECONDS", "60")) # Cap for a single Gemini request
+GEMINI_MIN_CALL_SECONDS = 2.0 # Not worth starting a Gemini request with less time than this left
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current request's deadline, or None outside a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def cap_timeout(timeout: float) -> float:
+    """timeout, shortened to the time left in the current request (never below zero)."""
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
+
+
+def gemini_call_timeout() -> float:
+    """Timeout for one Gemini request; raises 504 if the request has too little time left to make one."""
+    timeout = cap_timeout(GEMINI_CALL_TIMEOUT_SECONDS)
+    if timeout < GEMINI_MIN_CALL_SECONDS:
+        raise HTTPException(status_code=504, detail="The request ran out of time before the AI service could be called.")
+    return timeout
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Runs the block under a deadline seconds from now (or the enclosing one, if that is sooner).
+    MongoDB operations inside it are bounded by the same deadline through pymongo.timeout.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        with pymongo.timeout(max(0.001, deadline - time.monotonic())):
+            yield
+    finally:
+        _deadline.reset(token)
+
+
+async def outside_deadline(coro):
+    """
+    Awaits coro in a fresh context, free of the request's deadline (and its pymongo.timeout), for work
+    that must happen even when the request ran out of time, such as refunds. The work runs as its own
+    task, so it also finishes if the request is cancelled.
+    """
+    return await asyncio.shield(asyncio.create_task(coro, context=contextvars.Context()))
@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz # PyMuPDF
+from dotenv import load_dotenv
+
+from deadlines import cap_timeout
+from ats_rules import collect_layout_features
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Extraction Configuration ---
+# "process" isolates PyMuPDF in worker processes (a malformed PDF can only take down its worker),
+# "thread" keeps everything in-process and is mostly useful for local development.
+EXTRACTION_EXECUTOR = os.getenv("EXTRACTION_EXECUTOR", "process")
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "20"))
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "30"))
+EXTRACTION_MAX_BYTES = int(os.getenv("EXTRACTION_MAX_BYTES", str(10 * 1024 * 1024))) # 10 MB
+EXTRACTION_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACTION_MAX_TASKS_PER_CHILD", "100")) # Recycle workers to bound MuPDF memory growth
+
+
+class ExtractionError(Exception):
+    """Base error for PDF extraction failures, carrying the HTTP status to report."""
+    status_code = 500
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class InvalidPDFError(ExtractionError):
+    """Raised when the file is not a readable PDF (or crashed the extraction worker)."""
+    status_code = 400
+
+
+class PDFTooLargeError(ExtractionError):
+    """Raised when the PDF exceeds the configured byte or page limits."""
+    status_code = 413
+
+
+class ExtractionTimeoutError(ExtractionError):
+    """Raised when extraction does not finish within EXTRACTION_TIMEOUT_SECONDS."""
+    status_code = 504
+
+
+def _extract_text_worker(file_path: str, max_pages: int) -> str:
+    """Extracts the text of every page of a PDF. Runs inside the executor, never on the event loop."""
+    try:
+        doc = fitz.open(file_path)
+    except fitz.FileDataError:
+        raise InvalidPDFError("Invalid PDF file format or corrupted file.")
+
+    try:
+        if doc.page_count > max_pages:
+            raise PDFTooLargeError(f"PDF has {doc.page_count} pages; the maximum allowed is {max_pages}.")
+
+        # Pages are separated by a form feed so text normalization can find repeated headers/footers
+        return "\f".join(doc.load_page(page_num).get_text() for page_num in range(doc.page_count))
+    finally:
+        doc.close()
+
+
+def _extract_layout_worker(file_path: str, max_pages: int) -> dict:
+    """Collects the layout features the ATS rule set scores (see ats_rules). Runs inside the executor."""
+    try:
+        doc = fitz.open(file_path)
+    except fitz.FileDataError:
+        raise InvalidPDFError("Invalid PDF file format or corrupted file.")
+
+    try:
+        if doc.page_count > max_pages:
+            raise PDFTooLargeError(f"PDF has {doc.page_count} pages; the maximum allowed is {max_pages}.")
+        return collect_layout_features(doc)
+    finally:
+        doc.close()
+
+
+class ExtractionExecutor:
+    """Runs PDF text extraction in a process (default) or thread pool with timeouts and size guards."""
+
+    def __init__(
+        self,
+        kind: str = EXTRACTION_EXECUTOR,
+        workers: int = EXTRACTION_WORKERS,
+        timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+        max_pages: int = EXTRACTION_MAX_PAGES,
+        max_bytes: int = EXTRACTION_MAX_BYTES,
+    ):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown EXTRACTION_EXECUTOR '{kind}', expected 'process' or 'thread'.")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.pending = 0 # Jobs submitted and not finished yet, in this process
+        self._pool = None
+
+    def _create_pool(self):
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-extract")
+        # Spawned (not forked) workers so children never inherit the event loop or open DB sockets
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=EXTRACTION_MAX_TASKS_PER_CHILD,
+        )
+
+    def start(self):
+        """Creates the worker pool. Safe to call more than once."""
+        if self._pool is None:
+            self._pool = self._create_pool()
+            print(f"PDF extraction executor started ({self.kind}, {self.workers} workers).")
+
+    def _track_pending(self, delta: int):
+        # Imported here rather than at the top: spawned workers import this module to run their
+        # jobs, and must not register (multiprocess) metrics of their own
+        from metrics import EXTRACTION_QUEUE_DEPTH
+        self.pending += delta
+        EXTRACTION_QUEUE_DEPTH.set(max(0, self.pending - self.workers))
+
+    def shutdown(self):
+        """Shuts down the worker pool without waiting for in-flight jobs."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            print("PDF extraction executor stopped.")
+
+    def _restart_pool(self, broken_pool):
+        """Replaces a broken or hung process pool, unless another caller already did."""
+        if self._pool is not broken_pool:
+            return
+        print("Restarting PDF extraction process pool.")
+        if isinstance(broken_pool, ProcessPoolExecutor):
+            # A hung MuPDF call cannot be cancelled, so terminate the workers outright
+            for process in list((broken_pool._processes or {}).values()):
+                process.terminate()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._create_pool()
+
+    async def _run(self, worker, file_path: str):
+        if self._pool is None:
+            self.start()
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(pool, worker, file_path, self.max_pages)
+        timeout = cap_timeout(self.timeout) # Never wait past the request's deadline
+        self._track_pending(1)
+        # Counted down when the worker is done, even if this request stops waiting for it
+        future.add_done_callback(lambda _: self._track_pending(-1))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            if timeout < self.timeout:
+                # The request ran out of time, not the worker: leave the pool (and the extraction) alone
+                raise ExtractionTimeoutError("The request ran out of time during PDF text extraction.")
+            if self.kind == "process":
+                self._restart_pool(pool)
+            raise ExtractionTimeoutError(f"PDF text extraction timed out after {self.timeout:g} seconds.")
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            raise
+
+    async def _extract(self, worker, file_path: str, kind: str):
+        from metrics import PDF_EXTRACTION_DURATION # See _track_pending
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._extract_guarded(worker, file_path)
+            outcome = "ok"
+            return result
+        except ExtractionTimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            PDF_EXTRACTION_DURATION.labels(kind, outcome).observe(time.perf_counter() - started)
+
+    async def _extract_guarded(self, worker, file_path: str):
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError as e:
+            raise ExtractionError(f"Could not read PDF file: {e}")
+        if file_size > self.max_bytes:
+            raise PDFTooLargeError(f"PDF is {file_size} bytes; the maximum allowed is {self.max_bytes} bytes.")
+
+        try:
+            return await self._run(worker, file_path)
+        except BrokenProcessPool:
+            # The worker died, either because of this file or a neighbouring job. Retry once on
+            # the fresh pool; if it dies again the file itself is the culprit.
+            try:
+                return await self._run(worker, file_path)
+            except BrokenProcessPool:
+                print(f"PDF extraction worker crashed twice on {file_path}.")
+                raise InvalidPDFError("Invalid PDF file format or corrupted file.")
+        except ExtractionError:
+            raise
+        except Exception as e:
+            print(f"Error extracting text from PDF {file_path}: {e}")
+            raise ExtractionError("Error extracting text from PDF.")
+
+    async def extract_text(self, file_path: str) -> str:
+        """Extracts all text from the PDF at file_path without blocking the event loop."""
+        return await self._extract(_extract_text_worker, file_path, "text")
+
+    async def extract_layout(self, file_path: str) -> dict:
+        """Collects the ATS layout features of the PDF at file_path without blocking the event loop."""
+        return await self._extract(_extract_layout_worker, file_path, "layout")
+
+
+# Shared executor used by every endpoint that needs resume text
+extraction_executor = ExtractionExecutor()
@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import asyncio
+
+import google.generativeai as genai # Google Gemini API
+from dotenv import load_dotenv
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Gemini Model Configuration ---
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash") # Or 'gemini-1.5-pro'
+GEMINI_WARMUP = os.getenv("GEMINI_WARMUP", "true").lower() in ("1", "true", "yes")
+GEMINI_WARMUP_TIMEOUT_SECONDS = float(os.getenv("GEMINI_WARMUP_TIMEOUT_SECONDS", "10"))
+
+
+class ModelRegistry:
+    """
+    One configured GenerativeModel per (model name, generation config), shared by every request.
+    The generation config (including the converted response schema) is normalized once, here,
+    instead of on every call, and the models reuse the client and channel opened by warmup().
+    """
+
+    def __init__(self):
+        self._models: dict[tuple, genai.GenerativeModel] = {}
+        self.hits = 0
+        self.misses = 0
+        self.warmup_ms = None
+
+    @staticmethod
+    def _key(model_name: str, generation_config: dict | None) -> tuple:
+        return model_name, json.dumps(generation_config, sort_keys=True) if generation_config else None
+
+    def get(self, model_name: str, generation_config: dict | None = None) -> genai.GenerativeModel:
+        key = self._key(model_name, generation_config)
+        model = self._models.get(key)
+        if model is not None:
+            self.hits += 1
+            return model
+        self.misses += 1
+        model = genai.GenerativeModel(model_name, generation_config=generation_config)
+        self._models[key] = model
+        return model
+
+    async def warmup(self, generation_configs=()):
+        """
+        Builds the models for the given configs and makes one count_tokens call (free, no output
+        tokens) so the client, channel and auth are set up before the first user request.
+        Failures are logged; requests then simply pay the setup cost themselves.
+        """
+        if not GEMINI_WARMUP or not os.getenv("GEMINI_API_KEY"):
+            return
+        started = time.perf_counter()
+        try:
+            models = [self.get(GEMINI_MODEL_NAME, config) for config in generation_configs] or [self.get(GEMINI_MODEL_NAME)]
+            await asyncio.wait_for(models[0].count_tokens_async("warmup"), GEMINI_WARMUP_TIMEOUT_SECONDS)
+            self.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+            print(f"Gemini client warmed up ({GEMINI_MODEL_NAME}, {len(self._models)} model configs) in {self.warmup_ms} ms.")
+        except Exception as e:
+            print(f"Gemini warmup failed: {e}")
+
+    def clear(self):
+        self._models.clear()
+
+    def stats(self) -> dict:
+        return {
+            "model": GEMINI_MODEL_NAME,
+            "configured_models": len(self._models),
+            "hits": self.hits,
+            "misses": self.misses,
+            "warmup_ms": self.warmup_ms,
+        }
+
+
+# Shared registry used by every Gemini call site
+model_registry = ModelRegistry()
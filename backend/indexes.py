@@ -0,0 +1,155 @@
+import os
+import sys
+import asyncio
+
+import pymongo
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from database import db, MongoDatabase
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# Refuse to start if a hot query would scan a whole collection (off by default; explain() adds startup latency)
+MONGO_VERIFY_QUERY_PLANS = os.getenv("MONGO_VERIFY_QUERY_PLANS", "false").lower() in ("1", "true", "yes")
+# Extracted texts unused for this long are deleted (and extracted again from the PDF if it is ever needed)
+EXTRACTED_TEXT_RETENTION_DAYS = float(os.getenv("EXTRACTED_TEXT_RETENTION_DAYS", "30"))
+
+# --- Index Manifest ---
+# Every index the app relies on, per collection. Applied on startup; create_indexes is a no-op
+# for indexes that already exist with the same definition.
+INDEX_MANIFEST = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "resumes": [
+        IndexModel([("uploader_id", ASCENDING), ("upload_timestamp", DESCENDING)], name="uploader_uploaded"),
+    ],
+    "roadmaps": [
+        # Matches the list sort exactly, including the _id tie-breaker used by keyset pagination
+        IndexModel(
+            [("uploader_id", ASCENDING), ("generated_timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="uploader_generated_id"
+        ),
+    ],
+    "credit_transactions": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"),
+        # At most one refund per charge (see credits.refund_credits)
+        IndexModel([("refund_of", ASCENDING)], name="refund_of_unique", unique=True, sparse=True),
+    ],
+    "tokens": [
+        # MongoDB deletes each token document once its expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+    ],
+    "extracted_texts": [
+        # Changing EXTRACTED_TEXT_RETENTION_DAYS later needs a collMod (or dropping this index) to take effect
+        IndexModel(
+            [("last_used", ASCENDING)], name="last_used_ttl", expireAfterSeconds=int(EXTRACTED_TEXT_RETENTION_DAYS * 86400)
+        ),
+    ],
+    "llm_responses": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "leases": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+async def apply_index_manifest(database: MongoDatabase = db):
+    """Creates the indexes in INDEX_MANIFEST. Failures are logged and do not stop the app from starting."""
+    if not database.is_connected:
+        return
+    for collection_name, index_models in INDEX_MANIFEST.items():
+        try:
+            with pymongo.timeout(30): # Index builds on a large collection can take a while
+                await database.db[collection_name].create_indexes(index_models)
+        except PyMongoError as e:
+            # E.g. duplicate emails already stored block the unique index
+            print(f"Error creating indexes on {collection_name}: {e}")
+
+
+# --- Query Plan Verification ---
+# The queries issued on the request path, with placeholder values. Each must be served by an index.
+_PROBE_ID = ObjectId()
+HOT_QUERIES = [
+    ("users", {"email": "probe@example.com"}, None),
+    ("users", {"_id": _PROBE_ID}, None),
+    ("resumes", {"_id": _PROBE_ID, "uploader_id": str(_PROBE_ID)}, None),
+    ("roadmaps", {"_id": _PROBE_ID, "uploader_id": str(_PROBE_ID)}, None),
+    ("roadmaps", {"uploader_id": str(_PROBE_ID)}, [("generated_timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("credit_transactions", {"user_id": str(_PROBE_ID)}, [("timestamp", DESCENDING)]),
+    ("jobs", {"status": "queued"}, [("created_at", ASCENDING)]),
+    ("jobs", {"_id": _PROBE_ID, "user_id": str(_PROBE_ID)}, None),
+    ("extracted_texts", {"_id": "probe"}, None),
+    ("llm_responses", {"_id": "probe"}, None),
+    # Stored ATS results: one key per content hash, prompt version and model (see pipelines.ats_result_key),
+    # looked up for the ATS and combined prompts at once; the built-in _id index serves the $in
+    ("ats_results", {"_id": {"$in": ["probe:ats:model", "probe:combined:model"]}}, None),
+    ("leases", {"_id": "probe"}, None),
+]
+
+
+def _plan_stages(plan: dict):
+    """Yields every stage name in an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for key in ("inputStages", "shards"):
+        for child in plan.get(key) or []:
+            yield from _plan_stages(child)
+    if "winningPlan" in plan:
+        yield from _plan_stages(plan["winningPlan"])
+
+
+async def verify_query_plans(database: MongoDatabase = db) -> list[str]:
+    """Runs explain() on each hot query. Returns a description of every query whose plan contains a COLLSCAN."""
+    failures = []
+    for collection_name, query_filter, sort in HOT_QUERIES:
+        cursor = database.db[collection_name].find(query_filter).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        with pymongo.timeout(30):
+            explanation = await cursor.explain()
+        stages = set(_plan_stages(explanation.get("queryPlanner", {})))
+        if "COLLSCAN" in stages:
+            failures.append(f"{collection_name} {query_filter} sort={sort}: {sorted(stages)}")
+    return failures
+
+
+async def bootstrap_indexes(database: MongoDatabase = db):
+    """Startup hook: applies the manifest and, if MONGO_VERIFY_QUERY_PLANS is set, checks the query plans."""
+    await apply_index_manifest(database)
+    if MONGO_VERIFY_QUERY_PLANS and database.is_connected:
+        failures = await verify_query_plans(database)
+        if failures:
+            raise RuntimeError("Hot queries without a supporting index: " + "; ".join(failures))
+
+
+async def _main() -> int:
+    await db.connect()
+    if not db.is_connected:
+        return 1
+    try:
+        await apply_index_manifest()
+        failures = await verify_query_plans()
+    finally:
+        db.close()
+    for failure in failures:
+        print(f"COLLSCAN: {failure}")
+    print("All hot queries use an index." if not failures else f"{len(failures)} hot queries do a collection scan.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # python indexes.py  ->  applies the manifest and exits non-zero if any hot query does a COLLSCAN
+    sys.exit(asyncio.run(_main()))
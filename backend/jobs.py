@@ -0,0 +1,254 @@
+import os
+import json
+import socket
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+
+from database import db
+from credits import deduct_credits, refund_credits, RESUME_CHECKER_COST, ROADMAP_GENERATOR_COST
+from models import RoadmapRequest, JobStatusResponse
+from deadlines import request_deadline, JOB_DEADLINE_SECONDS
+from pipelines import (
+    find_resume,
+    load_resume_text,
+    generate_resume_analysis,
+    save_resume_analysis,
+    prescore_for_ats_check,
+    generate_ats_check,
+    load_stored_ats_result,
+    save_ats_result,
+    generate_roadmap_data,
+    save_roadmap,
+)
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Job Pipeline Configuration ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4")) # Concurrent jobs per uvicorn worker
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "500")) # Submissions are rejected with 503 beyond this
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2")) # Idle workers re-check Mongo this often
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600")) # A running job older than this lost its worker
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+
+JOB_KINDS = ("analyze-resume", "check-resume-ats", "generate-roadmap")
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def job_to_response(job: dict) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=str(job["_id"]),
+        kind=job["kind"],
+        status=job["status"],
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        finished_at=job.get("finished_at"),
+    )
+
+
+class JobManager:
+    """Runs LLM-backed jobs stored in Mongo on a bounded pool of asyncio workers."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._watchers: dict[str, set[asyncio.Event]] = {} # job_id -> events set on every status change
+        self._running: dict[str, str] = {} # worker name -> job_id it is executing
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    # --- Lifecycle ---
+    async def start(self):
+        if self._tasks or not db.is_connected:
+            return
+        await self._recover_stale_jobs()
+        self._tasks = [asyncio.create_task(self._worker(f"{self.worker_prefix}:{n}")) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        print(f"Job pipeline started with {self.workers} workers.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover_stale_jobs(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+        try:
+            requeued, failed = await db.jobs.recover_stale(cutoff, JOB_MAX_ATTEMPTS)
+        except PyMongoError as e:
+            print(f"Error recovering stale jobs: {e}")
+            return
+        if requeued or failed:
+            print(f"Recovered stale jobs: {requeued} requeued, {failed} failed.")
+            self._wakeup.set()
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(JOB_STALE_SECONDS / 4)
+            await self._recover_stale_jobs()
+
+    # --- Submission ---
+    async def submit(self, current_user: dict, kind: str, params: dict) -> str:
+        """Stores a new queued job and wakes a worker. Returns the job ID."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        if await db.jobs.count_queued() >= JOB_MAX_QUEUED:
+            raise HTTPException(status_code=503, detail="Too many queued jobs, please retry shortly.", headers={"Retry-After": "30"})
+
+        now = datetime.now(timezone.utc)
+        job_id = await db.jobs.create({
+            "user_id": str(current_user["_id"]),
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        })
+        self._wakeup.set()
+        return job_id
+
+    # --- Status change notifications ---
+    def _notify(self, job_id: str):
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        """Waits until this process changes the job, or timeout (the job may run in another process)."""
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(event)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def events(self, job: dict):
+        """Server-Sent Events stream of a job's status changes, ending with its result or error."""
+        job_id = str(job["_id"])
+        last_status = None
+        idle_seconds = 0.0
+        while True:
+            if job["status"] != last_status:
+                last_status = job["status"]
+                idle_seconds = 0.0
+                payload = job_to_response(job).model_dump_json()
+                event_name = "result" if last_status in TERMINAL_STATUSES else "status"
+                yield f"event: {event_name}\ndata: {payload}\n\n"
+                if last_status in TERMINAL_STATUSES:
+                    return
+            elif idle_seconds >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                idle_seconds = 0.0
+                yield ": keep-alive\n\n" # Stops proxies from closing an idle stream
+
+            await self.wait_for_change(job_id, timeout=JOB_POLL_INTERVAL_SECONDS)
+            idle_seconds += JOB_POLL_INTERVAL_SECONDS
+            job = await db.jobs.find(job_id)
+            if job is None:
+                return
+
+    # --- Workers ---
+    async def _worker(self, worker_id: str):
+        while True:
+            try:
+                job = await db.jobs.claim_next(worker_id)
+            except PyMongoError as e:
+                print(f"Job worker {worker_id} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id = str(job["_id"])
+            self._running[worker_id] = job_id
+            self._notify(job_id)
+            try:
+                with request_deadline(JOB_DEADLINE_SECONDS):
+                    result = await self._execute(job)
+                status, error = "completed", None
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back so the next worker to start picks it up
+                try:
+                    await db.jobs.requeue(job_id)
+                except PyMongoError:
+                    pass
+                raise
+            except HTTPException as e:
+                result, status, error = None, "failed", {"status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                print(f"Unexpected error while running job {job_id}: {e}")
+                result, status, error = None, "failed", {"status_code": 500, "detail": f"An unexpected error occurred: {e}"}
+            finally:
+                self._running.pop(worker_id, None)
+
+            try:
+                await db.jobs.finish(job_id, status, result=result, error=error)
+            except PyMongoError as e:
+                print(f"Error storing the outcome of job {job_id}: {e}")
+            self._notify(job_id)
+
+    async def _execute(self, job: dict) -> dict:
+        """Runs the extraction -> prompt -> Gemini -> parse -> persist pipeline for one job."""
+        current_user = await db.users.find_by_id(job["user_id"])
+        if current_user is None:
+            raise HTTPException(status_code=404, detail="User not found.")
+        params = job["params"]
+        bypass_cache = params.get("bypass_cache", False)
+
+        if job["kind"] == "analyze-resume":
+            _, text = await load_resume_text(current_user, params["resume_id"], purpose="analysis job")
+            resume_data = await generate_resume_analysis(text, bypass_cache=bypass_cache)
+            await save_resume_analysis(params["resume_id"], resume_data)
+            return resume_data
+
+        if job["kind"] == "check-resume-ats":
+            resume_metadata = await find_resume(current_user, params["resume_id"])
+            ats_data = None if bypass_cache else await load_stored_ats_result(resume_metadata)
+            if ats_data is None:
+                pre_score = await prescore_for_ats_check(resume_metadata, purpose="ATS check job")
+                _, text = await load_resume_text(current_user, params["resume_id"], purpose="ATS check job", resume_metadata=resume_metadata)
+                ats_data = await generate_ats_check(text, pre_score, bypass_cache=bypass_cache)
+                await save_ats_result(resume_metadata, ats_data)
+            # Credits are only charged once the job has produced its result
+            await deduct_credits(job["user_id"], RESUME_CHECKER_COST, "Resume Checker")
+            return ats_data
+
+        if job["kind"] == "generate-roadmap":
+            roadmap_request = RoadmapRequest(**params["request"])
+            roadmap_data = await generate_roadmap_data(roadmap_request, bypass_cache=bypass_cache)
+            charge = await deduct_credits(job["user_id"], ROADMAP_GENERATOR_COST, "Roadmap Generator")
+            try:
+                roadmap = await save_roadmap(current_user, roadmap_request, roadmap_data)
+            except Exception as e:
+                await refund_credits(charge, f"Roadmap job {job['_id']} failed to save: {getattr(e, 'detail', e)}")
+                raise
+            return json.loads(roadmap.model_dump_json())
+
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{job['kind']}'.")
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "running": len(self._running), "watchers": len(self._watchers)}
+
+
+# Shared job manager for this process
+job_manager = JobManager()
@@ -0,0 +1,189 @@
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Roadmap Layout Configuration ---
+# Generated roadmaps get top-to-bottom layered (Sugiyama-style) coordinates before they are stored,
+# so React Flow can render them as they are.
+LAYOUT_VERSION = 1
+LAYOUT_NODE_SPACING = float(os.getenv("LAYOUT_NODE_SPACING", "260")) # Horizontal distance between neighbours in a layer
+LAYOUT_LAYER_SPACING = float(os.getenv("LAYOUT_LAYER_SPACING", "160")) # Vertical distance between layers
+LAYOUT_SWEEPS = int(os.getenv("LAYOUT_SWEEPS", "4")) # Down+up barycenter passes for crossing reduction
+LAYOUT_THREAD_THRESHOLD = 300 # Graphs with more nodes than this are laid out off the event loop
+
+
+def _segments(keys: np.ndarray, size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Sort order of keys plus CSR offsets, so the items with key k are order[offsets[k]:offsets[k + 1]]."""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return order, offsets
+
+
+def _gather(order: np.ndarray, offsets: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Concatenation of the segments for the given keys, without a Python loop."""
+    starts, counts = offsets[keys], offsets[keys + 1] - offsets[keys]
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return order[np.arange(total) + shift]
+
+
+def assign_layers(n: int, src: np.ndarray, tgt: np.ndarray) -> np.ndarray:
+    """Longest-path layering. Cycles are broken by ignoring the remaining in-edges of one of their nodes."""
+    layer = np.zeros(n, dtype=np.int64)
+    indegree = np.bincount(tgt, minlength=n)
+    placed = np.zeros(n, dtype=bool)
+    edge_live = np.ones(len(src), dtype=bool)
+    out_order, out_offsets = _segments(src, n)
+    frontier = np.flatnonzero(indegree == 0)
+    placed_count = 0
+
+    while placed_count < n:
+        if len(frontier) == 0:
+            # Every unplaced node is on or behind a cycle: release the one with the fewest pending in-edges
+            candidates = np.flatnonzero(~placed)
+            frontier = candidates[[np.argmin(indegree[candidates])]]
+            indegree[frontier] = 0
+        placed[frontier] = True
+        placed_count += len(frontier)
+
+        edges = _gather(out_order, out_offsets, frontier)
+        edges = edges[edge_live[edges] & ~placed[tgt[edges]]]
+        edge_live[edges] = False
+        targets = tgt[edges]
+        np.maximum.at(layer, targets, layer[src[edges]] + 1)
+        np.subtract.at(indegree, targets, 1)
+        touched = np.unique(targets)
+        frontier = touched[indegree[touched] == 0]
+    return layer
+
+
+def _add_dummies(layer: np.ndarray, src: np.ndarray, tgt: np.ndarray):
+    """Splits edges spanning several layers into chains through dummy nodes, so every edge spans one layer."""
+    n = len(layer)
+    spans = layer[tgt] - layer[src]
+    short = spans == 1
+    long_src, long_tgt, long_span = src[spans > 1], tgt[spans > 1], spans[spans > 1]
+    dummies_per_edge = long_span - 1
+    total = int(dummies_per_edge.sum())
+    if total == 0:
+        return layer, src[short], tgt[short]
+
+    first = np.cumsum(dummies_per_edge) - dummies_per_edge # Offset of each edge's first dummy
+    step = np.arange(total) - np.repeat(first, dummies_per_edge) # 0, 1, ... within each chain
+    dummy_ids = n + np.arange(total)
+    dummy_layer = np.repeat(layer[long_src], dummies_per_edge) + step + 1
+    previous = np.where(step == 0, np.repeat(long_src, dummies_per_edge), dummy_ids - 1)
+    last_dummy = n + first + dummies_per_edge - 1
+
+    all_layer = np.concatenate([layer, dummy_layer])
+    all_src = np.concatenate([src[short], previous, last_dummy])
+    all_tgt = np.concatenate([tgt[short], dummy_ids, long_tgt])
+    return all_layer, all_src, all_tgt
+
+
+def _order_layers(layer: np.ndarray, src: np.ndarray, tgt: np.ndarray, sweeps: int) -> np.ndarray:
+    """Barycenter crossing reduction. Returns each node's rank within its layer."""
+    n = len(layer)
+    layer_count = int(layer.max()) + 1 if n else 0
+    members_order, members_offsets = _segments(layer, layer_count)
+    rank = np.zeros(n, dtype=np.float64)
+    local = np.zeros(n, dtype=np.int64) # Index of a node within its layer's member array
+    for l in range(layer_count):
+        members = members_order[members_offsets[l]:members_offsets[l + 1]]
+        rank[members] = np.arange(len(members))
+        local[members] = np.arange(len(members))
+    by_target = _segments(layer[tgt], layer_count)
+    by_source = _segments(layer[src], layer_count)
+
+    def reorder(l: int, edges: np.ndarray, moving: np.ndarray, fixed: np.ndarray):
+        members = members_order[members_offsets[l]:members_offsets[l + 1]]
+        if len(members) < 2 or len(edges) == 0:
+            return
+        moving_local = local[moving[edges]]
+        weight = np.bincount(moving_local, weights=rank[fixed[edges]], minlength=len(members))
+        degree = np.bincount(moving_local, minlength=len(members))
+        barycenter = np.where(degree > 0, weight / np.maximum(degree, 1), rank[members])
+        new_order = np.lexsort((rank[members], barycenter))
+        rank[members[new_order]] = np.arange(len(members))
+
+    for _ in range(sweeps):
+        for l in range(1, layer_count): # Downward: order by the parents' ranks
+            order, offsets = by_target
+            reorder(l, order[offsets[l]:offsets[l + 1]], tgt, src)
+        for l in range(layer_count - 2, -1, -1): # Upward: order by the children's ranks
+            order, offsets = by_source
+            reorder(l, order[offsets[l]:offsets[l + 1]], src, tgt)
+    return rank
+
+
+def _assign_coordinates(layer: np.ndarray, rank: np.ndarray, src: np.ndarray, tgt: np.ndarray,
+                        node_spacing: float, layer_spacing: float) -> tuple[np.ndarray, np.ndarray]:
+    """Centers each layer, then pulls nodes toward their neighbours while keeping node_spacing apart."""
+    n = len(layer)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    sizes = np.bincount(layer)
+    x = (rank - (sizes[layer] - 1) / 2) * node_spacing
+
+    # Global order by (layer, rank); a per-layer offset keeps the running maximum inside each layer
+    order = np.lexsort((rank, layer))
+    ordered_layer = layer[order]
+    layer_offset = ordered_layer * (abs(x).max() + node_spacing * (n + 1)) * 4
+    degree = np.bincount(src, minlength=n) + np.bincount(tgt, minlength=n)
+    for _ in range(2):
+        neighbour_sum = np.bincount(src, weights=x[tgt], minlength=n) + np.bincount(tgt, weights=x[src], minlength=n)
+        desired = np.where(degree > 0, neighbour_sum / np.maximum(degree, 1), x)
+        slot = rank[order] * node_spacing
+        packed = np.maximum.accumulate(desired[order] - slot + layer_offset) - layer_offset + slot
+        # Keep each layer centred on where its nodes wanted to be
+        shift = np.bincount(ordered_layer, weights=desired[order] - packed) / sizes
+        x[order] = packed + shift[ordered_layer]
+    y = layer * layer_spacing
+    return x, y
+
+
+def compute_layout(n: int, src: np.ndarray, tgt: np.ndarray, sweeps: int = LAYOUT_SWEEPS,
+                   node_spacing: float = LAYOUT_NODE_SPACING, layer_spacing: float = LAYOUT_LAYER_SPACING):
+    """Layered layout of a directed graph given as edge index arrays. Returns (x, y) arrays for the n nodes."""
+    src = np.asarray(src, dtype=np.int64)
+    tgt = np.asarray(tgt, dtype=np.int64)
+    keep = src != tgt # Self-loops do not affect the layout
+    src, tgt = src[keep], tgt[keep]
+    layer = assign_layers(n, src, tgt)
+
+    # Orient every edge downward; edges within a layer (from broken cycles) are ignored from here on
+    upper, lower = np.where(layer[src] <= layer[tgt], src, tgt), np.where(layer[src] <= layer[tgt], tgt, src)
+    keep = layer[upper] != layer[lower]
+    all_layer, all_src, all_tgt = _add_dummies(layer, upper[keep], lower[keep])
+    rank = _order_layers(all_layer, all_src, all_tgt, sweeps)
+    x, y = _assign_coordinates(all_layer, rank, all_src, all_tgt, node_spacing, layer_spacing)
+    return x[:n], y[:n]
+
+
+def layout_roadmap(roadmap_data: dict) -> dict:
+    """Returns the roadmap with every node's position replaced by its layered-layout coordinates."""
+    nodes = roadmap_data.get("nodes", [])
+    if not nodes:
+        return roadmap_data
+    index = {}
+    for i, node in enumerate(nodes):
+        index.setdefault(node.get("id"), i)
+    pairs = [
+        (index[edge["source"]], index[edge["target"]])
+        for edge in roadmap_data.get("edges", [])
+        if edge.get("source") in index and edge.get("target") in index
+    ]
+    edge_array = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    x, y = compute_layout(len(nodes), edge_array[:, 0], edge_array[:, 1])
+    laid_out = [
+        {**node, "position": {"x": round(float(x[i]), 1), "y": round(float(y[i]), 1)}}
+        for i, node in enumerate(nodes)
+    ]
+    return {**roadmap_data, "nodes": laid_out}
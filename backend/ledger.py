@@ -0,0 +1,233 @@
+import os
+import glob
+import time
+import asyncio
+
+from dotenv import load_dotenv
+from bson import json_util
+from pymongo.errors import PyMongoError
+
+from database import db
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Credit Ledger Configuration ---
+# Ledger entries are buffered and written with one insert_many per batch instead of one insert per request.
+LEDGER_WRITE_BEHIND = os.getenv("LEDGER_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "100")) # Flush as soon as this many entries are buffered
+LEDGER_FLUSH_INTERVAL_SECONDS = float(os.getenv("LEDGER_FLUSH_INTERVAL_SECONDS", "1")) # ...or after this long
+LEDGER_SPILL_PATH = os.getenv("LEDGER_SPILL_PATH", "./ledger_spill.jsonl") # Append-only fallback while Mongo is unavailable
+
+
+class LedgerWriter:
+    """Write-behind buffer for credit_transactions entries, flushed in batches with a local file as fallback."""
+
+    def __init__(
+        self,
+        enabled: bool = LEDGER_WRITE_BEHIND,
+        batch_size: int = LEDGER_BATCH_SIZE,
+        flush_interval: float = LEDGER_FLUSH_INTERVAL_SECONDS,
+        spill_path: str = LEDGER_SPILL_PATH,
+    ):
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._buffer: list[dict] = []
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.counters = {
+            "enqueued": 0, "flushed": 0, "flushes": 0, "spilled": 0, "replayed": 0, "rejected": 0,
+            "write_errors": 0, "spill_errors": 0, "flusher_errors": 0, "flusher_restarts": 0,
+        }
+        self._last_error: str | None = None
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None # Started; a flusher that died is restarted by the next enqueue()
+
+    # --- Lifecycle ---
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        await self.replay_spill()
+        self._task = asyncio.create_task(self._flusher())
+        print(f"Credit ledger writer started (batch {self.batch_size}, every {self.flush_interval}s).")
+
+    async def stop(self):
+        """Stops the background flusher and writes out everything still buffered."""
+        if self._task is not None:
+            # Let the flusher finish its current batch rather than cancelling it mid-write
+            self._stopping = True
+            self._flush_needed.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    # --- Buffering ---
+    def enqueue(self, transaction_doc: dict):
+        """Buffers a ledger entry. The entry must already carry its _id, so retried writes stay idempotent."""
+        self._buffer.append(transaction_doc)
+        self.counters["enqueued"] += 1
+        if self._task is not None and self._task.done() and not self._stopping:
+            # The flusher should never exit on its own; if it did, entries would pile up unwritten
+            self.counters["flusher_restarts"] += 1
+            print("Credit ledger flusher was not running; restarting it.")
+            self._task = asyncio.create_task(self._flusher())
+        if len(self._buffer) >= self.batch_size:
+            self._flush_needed.set()
+
+    async def _flusher(self):
+        while not self._stopping:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_needed.clear()
+                await self.flush()
+            except Exception as e:
+                # Keep flushing: the entries are still buffered and the next pass retries them
+                self.counters["flusher_errors"] += 1
+                self._last_error = f"flusher: {e}"
+                print(f"Unexpected error in the credit ledger flusher: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:len(batch)]
+                if not await self._write_batch(batch):
+                    break # The batch is back on the buffer; retry on the next flush
+
+    async def _write_batch(self, batch: list) -> bool:
+        """Writes one batch, spilling it to disk if the write fails. Returns False if it had to go back on the buffer."""
+        started = time.perf_counter()
+        try:
+            if not db.is_connected:
+                raise PyMongoError("Database not connected.")
+            await db.credit_transactions.insert_batch(batch)
+            self.counters["flushed"] += len(batch)
+            return True
+        except asyncio.CancelledError:
+            # Entries carry their _id, so writing them again later is harmless
+            self._buffer[:0] = batch
+            raise
+        except Exception as e:
+            self.counters["write_errors"] += 1
+            self._last_error = f"write: {e}"
+            print(f"Error flushing {len(batch)} credit ledger entries, spilling them to {self.spill_path}: {e}")
+            try:
+                await asyncio.to_thread(self._spill, batch)
+                return True
+            except Exception as spill_error:
+                self.counters["spill_errors"] += 1
+                self._last_error = f"spill: {spill_error}"
+                print(f"Error spilling {len(batch)} credit ledger entries to {self.spill_path}, keeping them buffered: {spill_error}")
+                self._buffer[:0] = batch
+                return False
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.counters["flushes"] += 1
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+    # --- Spill File ---
+    def _spill(self, batch: list):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for transaction_doc in batch:
+                f.write(json_util.dumps(transaction_doc) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.counters["spilled"] += len(batch)
+
+    def _take_spill(self) -> tuple[list, list[str]]:
+        """
+        Reads the spilled entries, including those of earlier replays that did not finish. Returns them
+        with the replay files they came from, which stay on disk until the entries have been written.
+        """
+        # Rename first so entries spilled while we replay go to a fresh file instead of being lost
+        try:
+            os.replace(self.spill_path, f"{self.spill_path}.replay-{time.time_ns()}")
+        except FileNotFoundError:
+            pass
+        replay_paths = sorted(glob.glob(glob.escape(self.spill_path) + ".replay-*"))
+        docs = []
+        for replay_path in replay_paths:
+            with open(replay_path, encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            valid, rejected = [], []
+            for line in lines:
+                try:
+                    docs.append(json_util.loads(line))
+                    valid.append(line)
+                except ValueError:
+                    rejected.append(line) # E.g. a last line cut short by a crash while spilling
+            if rejected:
+                self._reject(replay_path, valid, rejected)
+        return docs, replay_paths
+
+    def _reject(self, replay_path: str, valid_lines: list[str], rejected: list[str]):
+        # Set the unreadable lines aside for a manual look and drop them from the replay file, so a
+        # replay that has to be retried does not reject them again
+        with open(f"{self.spill_path}.rejected", "a", encoding="utf-8") as f:
+            f.writelines(line if line.endswith("\n") else line + "\n" for line in rejected)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(f"{replay_path}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(valid_lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{replay_path}.tmp", replay_path)
+        self.counters["rejected"] += len(rejected)
+        print(f"Skipped {len(rejected)} unreadable spilled credit ledger entries; they were moved to {self.spill_path}.rejected.")
+
+    async def replay_spill(self):
+        """
+        Puts entries spilled by an earlier run back on the buffer and writes them. Their files are only
+        deleted once every entry was written (or spilled again); otherwise the next start replays them.
+        """
+        try:
+            docs, replay_paths = await asyncio.to_thread(self._take_spill)
+        except OSError as e:
+            print(f"Error reading spilled credit ledger entries from {self.spill_path}: {e}")
+            return
+        if docs:
+            print(f"Replaying {len(docs)} spilled credit ledger entries.")
+            self._buffer[:0] = docs
+            self.counters["replayed"] += len(docs)
+            await self.flush()
+        replayed = {id(doc) for doc in docs}
+        if any(id(doc) in replayed for doc in self._buffer):
+            return # Still buffered; entries carry their _id, so replaying them again later is harmless
+        try:
+            for replay_path in replay_paths:
+                os.remove(replay_path)
+        except OSError as e:
+            print(f"Error removing replayed credit ledger spill files: {e}")
+
+    def stats(self) -> dict:
+        flushes = self.counters["flushes"]
+        return {
+            "enabled": self.enabled,
+            "flusher_alive": self._task is not None and not self._task.done(),
+            "last_error": self._last_error,
+            "queue_depth": len(self._buffer),
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / flushes, 2) if flushes else 0.0,
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            **self.counters,
+        }
+
+
+# Shared ledger writer used by the credit functions
+ledger_writer = LedgerWriter()
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo.errors import PyMongoError
+
+from database import db
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Gemini Response Cache Configuration ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))) # 7 days
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")) # In-process LRU tier
+
+
+def normalize_text(text: str) -> str:
+    """Collapses all runs of whitespace so formatting-only differences share a cache entry."""
+    return " ".join(text.split())
+
+
+def normalize_cache_input(value) -> str:
+    """Turns a prompt input (text, or a dict of fields) into a canonical string for hashing."""
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return json.dumps({k: normalize_cache_input(v) for k, v in value.items()}, sort_keys=True)
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class ResponseCache:
+    """Two-tier cache of Gemini response texts: an in-process LRU in front of a TTL'd Mongo collection."""
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_ENABLED,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict() # key -> (monotonic expiry, text)
+        self.counters = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "errors": 0}
+
+    @staticmethod
+    def make_key(model_name: str, template_version: str, prompt_input) -> str:
+        """Builds the cache key from the model, the prompt template version and the normalized input."""
+        input_hash = hashlib.sha256(normalize_cache_input(prompt_input).encode("utf-8")).hexdigest()
+        return f"{model_name}:{template_version}:{input_hash}"
+
+    def _remember(self, cache_key: str, response_text: str, ttl_seconds: float):
+        self._entries[cache_key] = (time.monotonic() + ttl_seconds, response_text)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False) # Evict the least recently used entry
+
+    async def get(self, cache_key: str, bypass: bool = False) -> str | None:
+        """Returns the cached response text, or None on a miss (or when the cache is bypassed)."""
+        if not self.enabled or bypass:
+            self.counters["bypassed"] += 1
+            return None
+
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            expires_at, response_text = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self.counters["memory_hits"] += 1
+                return response_text
+            del self._entries[cache_key]
+
+        try:
+            cache_doc = await db.llm_responses.find(cache_key)
+        except PyMongoError as e:
+            print(f"Error reading Gemini response cache: {e}")
+            self.counters["errors"] += 1
+            cache_doc = None
+
+        if cache_doc is not None:
+            # The TTL monitor only runs periodically, so check the expiry ourselves as well
+            expires_at = cache_doc["expires_at"]
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc) # BSON dates come back naive
+            remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+            if remaining > 0:
+                self._remember(cache_key, cache_doc["response_text"], remaining)
+                self.counters["mongo_hits"] += 1
+                return cache_doc["response_text"]
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, cache_key: str, response_text: str):
+        """Stores a successfully parsed response text in both tiers."""
+        if not self.enabled:
+            return
+        self._remember(cache_key, response_text, self.ttl_seconds)
+        self.counters["stores"] += 1
+        model_name, template_version, _ = cache_key.split(":", 2)
+        now = datetime.now(timezone.utc)
+        try:
+            await db.llm_responses.save(cache_key, {
+                "model": model_name,
+                "template_version": template_version,
+                "response_text": response_text,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds),
+            })
+        except PyMongoError as e:
+            print(f"Error writing Gemini response cache: {e}")
+            self.counters["errors"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.counters["memory_hits"] + self.counters["mongo_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["mongo_hits"]
+        return {
+            "enabled": self.enabled,
+            "entries_in_memory": len(self._entries),
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            **self.counters,
+        }
+
+
+# Shared cache in front of every Gemini call site
+response_cache = ResponseCache()
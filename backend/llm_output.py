@@ -0,0 +1,178 @@
+import os
+import re
+import json
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from metrics import GEMINI_JSON_PARSE
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Gemini Output Configuration ---
+# Gemini is asked for JSON (response_mime_type) constrained by a schema derived from the Pydantic
+# models, and its output goes through a tolerant parser. Output that still cannot be used is
+# regenerated at most GEMINI_PARSE_RETRIES times per request.
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "true").lower() in ("1", "true", "yes")
+GEMINI_RESPONSE_SCHEMA = os.getenv("GEMINI_RESPONSE_SCHEMA", "true").lower() in ("1", "true", "yes")
+GEMINI_PARSE_RETRIES = int(os.getenv("GEMINI_PARSE_RETRIES", "1"))
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_JSON_TYPES = {"string": "string", "integer": "integer", "number": "number", "boolean": "boolean"}
+
+
+# --- Response Schemas ---
+def response_schema_for(model: type[BaseModel], overrides: dict | None = None) -> dict:
+    """
+    Converts a Pydantic model to the OpenAPI-subset schema Gemini accepts for response_schema.
+    Free-form dict fields have no schema of their own; overrides supplies one, keyed by model
+    name and field name, e.g. {"RoadmapNode": {"data": {...}}}.
+    """
+    root = model.model_json_schema()
+    defs = root.get("$defs", {})
+    overrides = overrides or {}
+
+    def convert(schema: dict, model_name: str | None = None, field: str | None = None) -> dict:
+        if model_name in overrides and field in overrides[model_name]:
+            return overrides[model_name][field]
+        if "$ref" in schema:
+            name = schema["$ref"].rsplit("/", 1)[-1]
+            return convert(defs[name])
+        if "anyOf" in schema: # Optional[X] -> X, nullable
+            options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+            if len(options) != 1:
+                raise ValueError(f"Cannot express {schema} as a Gemini response schema")
+            return {**convert(options[0], model_name, field), "nullable": True}
+
+        kind = schema.get("type")
+        if kind in _JSON_TYPES:
+            return {"type": _JSON_TYPES[kind]}
+        if kind == "array":
+            return {"type": "array", "items": convert(schema.get("items", {}))}
+        if kind == "object" and schema.get("properties"):
+            name = schema.get("title")
+            properties = {key: convert(value, name, key) for key, value in schema["properties"].items()}
+            return {"type": "object", "properties": properties, "required": list(schema.get("required", []))}
+        raise ValueError(f"Field {model_name}.{field} needs a schema override ({schema})")
+
+    return convert(root)
+
+
+def generation_config_for(response_schema: dict | None) -> dict | None:
+    """The generation_config for a Gemini call, or None to leave the model defaults alone."""
+    if not GEMINI_JSON_MODE:
+        return None
+    config = {"response_mime_type": "application/json"}
+    if GEMINI_RESPONSE_SCHEMA and response_schema is not None:
+        config["response_schema"] = response_schema
+    return config
+
+
+# --- Tolerant Parsing ---
+def _close_truncated(text: str) -> str | None:
+    """
+    Turns JSON cut off mid-output back into a valid document: drops the incomplete trailing element
+    and closes every open array/object. Objects inside arrays are kept whole or not at all, so a
+    repaired roadmap never contains a half-written node. Returns None if nothing can be salvaged.
+    """
+    def can_cut(stack: list) -> bool:
+        return "}" not in stack[stack.index("]"):] if "]" in stack else True
+
+    stack = []
+    in_string = escape = False
+    cut, cut_stack = None, None # Last position the document can be closed at, and the open containers there
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            at = i + 1
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[:i + 1] # Complete after all
+            at = i + 1
+        elif ch == ",":
+            at = i
+        else:
+            continue
+        if can_cut(stack):
+            cut, cut_stack = at, list(stack)
+    if cut is None:
+        return None
+    return text[:cut] + "".join(reversed(cut_stack))
+
+
+def extract_json(text: str):
+    """
+    Parses model output that should be a single JSON document. Tolerates markdown fences, prose
+    before or after the document, and output truncated mid-document (the incomplete tail is dropped).
+    Returns (data, how) where how is "clean", "extracted" or "repaired"; raises json.JSONDecodeError.
+    """
+    text = text.strip()
+    try:
+        return json.loads(text), "clean"
+    except json.JSONDecodeError as e:
+        error = e
+
+    fenced = _FENCE.search(text)
+    candidate = fenced.group(1).strip() if fenced else text
+    starts = [i for i in (candidate.find("{"), candidate.find("[")) if i >= 0]
+    if not starts:
+        raise error
+    candidate = candidate[min(starts):]
+
+    try:
+        data, _ = json.JSONDecoder().raw_decode(candidate) # Ignores anything after the document
+        return data, "extracted"
+    except json.JSONDecodeError:
+        pass
+    repaired = _close_truncated(candidate)
+    if repaired is None:
+        raise error
+    try:
+        return json.loads(repaired), "repaired"
+    except json.JSONDecodeError:
+        raise error
+
+
+class ParseStats:
+    """How Gemini output parsed, per prompt template, reported on /stats/."""
+
+    def __init__(self):
+        self._counts: dict[str, dict] = {}
+
+    def _for(self, template_version: str) -> dict:
+        return self._counts.setdefault(
+            template_version, {"clean": 0, "extracted": 0, "repaired": 0, "failed": 0, "retries": 0}
+        )
+
+    def record(self, template_version: str, outcome: str):
+        """outcome is a how from extract_json, "failed" or "retries"."""
+        self._for(template_version)[outcome] += 1
+        GEMINI_JSON_PARSE.labels(template_version, outcome).inc()
+
+    def stats(self) -> dict:
+        result = {}
+        for version, counts in self._counts.items():
+            attempts = counts["clean"] + counts["extracted"] + counts["repaired"] + counts["failed"]
+            result[version] = {
+                **counts,
+                "success_rate": round((attempts - counts["failed"]) / attempts, 4) if attempts else None,
+            }
+        return result
+
+
+# Shared parse counters, reported on /stats/
+parse_stats = ParseStats()
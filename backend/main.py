@@ -1,31 +1,96 @@
 import os
-import io
 import json
+import time
+import asyncio
 import uuid # To generate unique filenames
-import shutil # To save uploaded file
+import hashlib # To content-address uploaded files
 from datetime import datetime, timedelta, timezone # For JWT expiration and timestamps
-from typing import List, Optional # For Pydantic models
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, status
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, EmailStr, Field # Import Field for default values
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.errors import ConnectionFailure, OperationFailure, DuplicateKeyError
 from passlib.context import CryptContext
 from jose import JWTError, jwt # For JWT handling
-import fitz # PyMuPDF
 import google.generativeai as genai # Google Gemini API
 from bson import ObjectId # To work with MongoDB ObjectIds
 from fastapi.middleware.cors import CORSMiddleware # Import CORSMiddleware
 
+from database import db # Async MongoDB repositories
+from extraction import extraction_executor # PDF text extraction off the event loop
+from llm_cache import response_cache # Gemini response cache
+from auth_cache import user_cache, USER_CONTEXT_PROJECTION # Short-lived cache of authenticated users
+from indexes import bootstrap_indexes # Index manifest applied on startup
+import singleflight # Coalescing of concurrent identical extraction / Gemini calls
+from credits import (
+    deduct_credits,
+    refund_credits,
+    add_credits,
+    DEFAULT_STARTING_CREDITS,
+    RESUME_CHECKER_COST,
+    ROADMAP_GENERATOR_COST,
+)
+from models import (
+    UserCreate,
+    UserLogin,
+    Token,
+    ResumeUploadResponse,
+    ATSCheckResult,
+    RoadmapRequest,
+    RoadmapResponse,
+    RoadmapSummary,
+    RoadmapListResponse,
+    CreditPurchaseRequest,
+    CreditBalanceResponse,
+    JobSubmitResponse,
+    JobStatusResponse,
+)
+from pipelines import (
+    new_resume_record,
+    find_resume,
+    load_resume_text,
+    generate_resume_analysis,
+    stream_resume_analysis,
+    save_resume_analysis,
+    prescore_resume,
+    prescore_for_ats_check,
+    generate_ats_check,
+    generate_combined_check,
+    load_stored_ats_result,
+    save_ats_result,
+    generate_roadmap_data,
+    stream_roadmap_data,
+    save_roadmap,
+    ensure_gemini_available,
+)
+from prompts import ( # Gemini token counts and response schemas per prompt template
+    token_usage,
+    RESPONSE_SCHEMAS,
+    ANALYSIS_PROMPT_VERSION,
+    ATS_PROMPT_VERSION,
+    ROADMAP_PROMPT_VERSION,
+    COMBINED_PROMPT_VERSION,
+)
+from gemini_models import model_registry # Shared, pre-configured Gemini models
+from admission import gemini_admission # Concurrency cap, rate buckets and load shedding for Gemini calls
+from circuit_breaker import gemini_breaker # Fails Gemini calls fast while the upstream is down
+from deadlines import request_deadline, ANALYSIS_DEADLINE_SECONDS, ATS_DEADLINE_SECONDS, ROADMAP_DEADLINE_SECONDS
+from text_normalize import normalization_stats # Savings of the resume text normalization stage
+from llm_output import parse_stats, generation_config_for # Gemini JSON output: parse outcomes and generation config
+from storage_codec import load_roadmap_graph # Decodes compressed roadmap graphs
+from streaming import stream_media_type, format_stream_event # NDJSON / SSE output for streamed Gemini responses
+from ledger import ledger_writer # Write-behind batching of credit_transactions entries
+from jobs import job_manager, job_to_response # Background job pipeline for the Gemini endpoints
+from batch import batch_processor # Batch uploads with bounded parallelism and streamed results
+from metrics import MetricsMiddleware, render_metrics, mark_process_dead, METRICS_CONTENT_TYPE # Prometheus metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Configuration ---
-MONGO_URI = os.getenv("MONGO_URI")
-DATABASE_NAME = os.getenv("DATABASE_NAME")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # JWT Configuration
@@ -35,44 +100,25 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Token expires in 30 minutes
 
 # File Upload Configuration
 UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIRECTORY", "./uploaded_resumes")
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # Read uploads in 1 MB chunks while hashing
 
-# Credit Costs
-DEFAULT_STARTING_CREDITS = 10
-RESUME_CHECKER_COST = 2 # Example cost
-ROADMAP_GENERATOR_COST = 3 # Example cost
+# Roadmap Listing Configuration
+ROADMAP_PAGE_SIZE = 20
+ROADMAP_MAX_PAGE_SIZE = 100
+ROADMAP_GRAPH_FIELDS = ("nodes", "edges") # Selectable with /get-roadmap/{id}?fields=
 
 # Ensure base upload directory exists
 os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 
 # --- MongoDB Connection ---
-client: MongoClient = None
-db = None
-users_collection = None
-resumes_collection = None
-tokens_collection = None # Collection for storing tokens
-roadmaps_collection = None # Collection for storing roadmaps
-credit_transactions_collection = None # New collection for credit transactions
+# Collections are accessed through the async repositories on `db` (see database.py)
 
 async def connect_to_mongo():
-    """Connects to MongoDB and initializes collections."""
-    global client, db, users_collection, resumes_collection, tokens_collection, roadmaps_collection, credit_transactions_collection
+    """Connects to MongoDB and initializes the repositories."""
     try:
-        # Check if MONGO_URI and DATABASE_NAME are set
-        if not MONGO_URI or not DATABASE_NAME:
-             print("MONGO_URI or DATABASE_NAME environment variable not set.")
-             # Depending on your needs, you might want to raise an exception here
-             return
-
-        client = MongoClient(MONGO_URI)
-        # The ismaster command is cheap and does not require auth.
-        client.admin.command('ismaster')
-        db = client[DATABASE_NAME]
-        users_collection = db.users
-        resumes_collection = db.resumes
-        tokens_collection = db.tokens # Initialize the tokens collection
-        roadmaps_collection = db.roadmaps # Initialize the roadmaps collection
-        credit_transactions_collection = db.credit_transactions # Initialize the transactions collection
-        print("MongoDB connection successful!")
+        await db.connect()
+        if db.is_connected:
+            print("MongoDB connection successful!")
     except ConnectionFailure as e:
         print(f"MongoDB connection failed: {e}")
         # Raise an exception to prevent the app from starting without a DB connection
@@ -84,9 +130,8 @@ async def connect_to_mongo():
 
 async def close_mongo_connection():
     """Closes the MongoDB connection."""
-    global client
-    if client:
-        client.close()
+    if db.is_connected:
+        db.close()
         print("MongoDB connection closed.")
 
 # --- Password Hashing Configuration ---
@@ -124,7 +169,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="JWT Secret Key not configured on the server."
         )
-    if users_collection is None:
+    if not db.is_connected:
          raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database not connected."
@@ -145,17 +190,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
         # Optional: Check if the token exists in the database and is not marked as revoked
         # For simplicity, we are not implementing token revocation here,
-        # but you would query the tokens_collection here.
-        # token_doc = tokens_collection.find_one({"token": token, "revoked": False})
+        # but you would query the tokens collection here.
+        # token_doc = await db.tokens.collection.find_one({"token": token, "revoked": False})
         # if not token_doc:
         #     raise credentials_exception
 
 
-        # Check if the user exists in the database by email
-        user = users_collection.find_one({"email": email})
+        # Serve the user from the short-lived cache; only a miss goes to MongoDB
+        user = user_cache.get(email)
         if user is None:
-            raise credentials_exception
-        return user # Return the user document from MongoDB
+            user = await db.users.find_by_email(email, projection=USER_CONTEXT_PROJECTION)
+            if user is None:
+                raise credentials_exception
+            user_cache.set(email, user)
+        return user # Return the user document (without the password hash)
     except JWTError:
         raise credentials_exception
     except OperationFailure:
@@ -166,175 +214,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except Exception:
          raise credentials_exception # Catch any other unexpected errors during token validation
 
-# --- Credit Management Functions ---
-async def deduct_credits(user_id: str, amount: int, feature_name: str):
-    """Deducts credits from a user's balance and records the transaction."""
-    if users_collection is None or credit_transactions_collection is None:
-         raise HTTPException(status_code=500, detail="Database not connected.")
-
-    try:
-        # Atomically update the user's credit balance
-        result = users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"credits": -amount}} # Decrement credits
-        )
-
-        if result.modified_count == 0:
-             # This could happen if user_id is invalid or credits were already too low
-             # We should ideally check balance before calling this function, but adding a check here too
-             user_doc = users_collection.find_one({"_id": ObjectId(user_id)})
-             if user_doc and user_doc.get("credits", 0) < amount:
-                  raise HTTPException(status_code=400, detail="Insufficient credits.")
-             else:
-                  # Unexpected case, maybe user_id was wrong or update failed silently
-                  print(f"Warning: Failed to deduct credits for user {user_id}, amount {amount}, feature {feature_name}. Modified count was 0.")
-                  raise HTTPException(status_code=500, detail="Failed to update credit balance.")
-
-
-        # Record the transaction
-        transaction_doc = {
-            "user_id": user_id,
-            "type": "deduction",
-            "feature": feature_name,
-            "amount": -amount, # Store as negative for deduction
-            "timestamp": datetime.now(timezone.utc),
-            # You could add more details like resume_id or roadmap_id here
-        }
-        credit_transactions_collection.insert_one(transaction_doc)
-
-    except OperationFailure as e:
-        print(f"Database error during credit deduction for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="Database error during credit deduction.")
-    except HTTPException:
-         # Re-raise the insufficient credits error
-         raise
-    except Exception as e:
-        print(f"An unexpected error occurred during credit deduction for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred during credit deduction.")
-
-
-async def add_credits(user_id: str, amount: int, transaction_details: str):
-    """Adds credits to a user's balance and records the transaction."""
-    if users_collection is None or credit_transactions_collection is None:
-         raise HTTPException(status_code=500, detail="Database not connected.")
-
-    if amount <= 0:
-         raise HTTPException(status_code=400, detail="Amount must be positive.")
-
-    try:
-        # Atomically update the user's credit balance
-        result = users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"credits": amount}} # Increment credits
-        )
-
-        if result.modified_count == 0:
-             # This could happen if user_id is invalid
-             print(f"Warning: Failed to add credits for user {user_id}, amount {amount}. Modified count was 0.")
-             raise HTTPException(status_code=404, detail="User not found.")
-
-        # Record the transaction
-        transaction_doc = {
-            "user_id": user_id,
-            "type": "purchase",
-            "amount": amount,
-            "timestamp": datetime.now(timezone.utc),
-            "details": transaction_details # e.g., "Purchased 100 credits via Stripe"
-        }
-        credit_transactions_collection.insert_one(transaction_doc)
-
-    except OperationFailure as e:
-        print(f"Database error during credit addition for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="Database error during credit addition.")
-    except HTTPException:
-         # Re-raise the user not found error
-         raise
-    except Exception as e:
-        print(f"An unexpected error occurred during credit addition for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred during credit addition.")
-
-
 # --- Gemini API Configuration ---
 if not GEMINI_API_KEY:
     print("GEMINI_API_KEY not found in environment variables. AI features will not work.")
 else:
     genai.configure(api_key=GEMINI_API_KEY)
-    # Optional: Choose a model
-    # model = genai.GenerativeModel('gemini-1.5-flash')
-    # print("Gemini API configured.")
-
-# --- Pydantic Models ---
-class UserCreate(BaseModel):
-    """Model for user registration requests."""
-    username: str
-    email: EmailStr
-    password: str
-    # Credits will be added by the backend with a default value
-
-class UserLogin(BaseModel):
-    """Model for user login requests (using email)."""
-    email: str
-    password: str
-
-class Token(BaseModel):
-    """Model for the JWT token response."""
-    access_token: str
-    token_type: str
-    expires_at: datetime # Include expiration time in the response
-
-class ResumeUploadResponse(BaseModel):
-    """Model for the resume upload response."""
-    message: str
-    resume_id: str
-    filename: str
-
-class ATSCheckResponse(BaseModel):
-    """Model for the ATS check response."""
-    ats_score: int # Assuming a score out of 100
-    suggestions: list[str]
-    # You could add more fields here based on Gemini's output structure
-
-class RoadmapRequest(BaseModel):
-    """Model for the roadmap generation request."""
-    current_role: str
-    target_role: str
-    years_of_experience: str # e.g., "0-1 years", "1-3 years"
-    timeframe: str # e.g., "6 months", "1 year", "2 years"
-    current_skills: str # comma separated string
-    areas_of_interest: str # comma separated string
-    preferred_learning_style: str # e.g., "visual", "auditory", "kinesthetic", "reading/writing"
-
-class RoadmapNode(BaseModel):
-    """Model for a node in the React Flow roadmap."""
-    id: str
-    type: str # e.g., "start", "step", "milestone", "skill", "project", "end"
-    data: dict # Custom data for the node, e.g., {"label": "Learn Python"}
-    position: dict # {"x": 0, "y": 0} - Initial position, might need frontend layout
-
-class RoadmapEdge(BaseModel):
-    """Model for an edge in the React Flow roadmap."""
-    id: str
-    source: str # Source node ID
-    target: str # Target node ID
-    type: Optional[str] = "smoothstep" # e.g., "smoothstep", "straight"
-    animated: Optional[bool] = False
-    label: Optional[str] = None
-
-class RoadmapResponse(BaseModel):
-    """Model for the roadmap generation response, formatted for React Flow."""
-    roadmap_id: str
-    nodes: List[RoadmapNode]
-    edges: List[RoadmapEdge]
-    generated_timestamp: datetime
-
-class CreditPurchaseRequest(BaseModel):
-    """Model for a credit purchase request."""
-    amount: int
-    transaction_details: str # e.g., "Stripe transaction ID xyz"
-
-class CreditBalanceResponse(BaseModel):
-    """Model for returning the user's credit balance."""
-    credits: int
+    # The model is chosen with GEMINI_MODEL_NAME; see gemini_models.py
 
 # --- FastAPI Application ---
 app = FastAPI()
@@ -357,12 +242,23 @@ app.add_middleware(
     allow_methods=["*"], # Allow all HTTP methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
     allow_headers=["*"], # Allow all headers, including Authorization
 )
+# Added last so it is the outermost middleware and times everything below it
+app.add_middleware(MetricsMiddleware)
 
 
 # Lifespan events to connect and close MongoDB
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    await bootstrap_indexes()
+    extraction_executor.start()
+    await ledger_writer.start()
+    # Build the shared Gemini models and open the client before requests (or queued jobs) need them
+    await model_registry.warmup(
+        generation_config_for(RESPONSE_SCHEMAS.get(version))
+        for version in (ANALYSIS_PROMPT_VERSION, ATS_PROMPT_VERSION, ROADMAP_PROMPT_VERSION)
+    )
+    await job_manager.start()
     # Also check for SECRET_KEY on startup
     if not SECRET_KEY:
          print("FATAL ERROR: JWT SECRET_KEY environment variable not set!")
@@ -372,24 +268,67 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await job_manager.stop() # Requeues in-flight jobs, so it must run before the DB closes
+    await ledger_writer.stop() # Flushes buffered credit transactions (or spills them to disk)
     await close_mongo_connection()
+    extraction_executor.shutdown()
+    mark_process_dead() # Drops this worker's gauges from the multiprocess aggregate
 
 @app.get("/")
 async def read_root():
     """Basic root endpoint."""
     return {"message": "Welcome to the Zuleo backend server!"}
 
+@app.get("/health")
+async def health():
+    """Liveness plus the state of the dependencies: 503 without a database, "degraded" while the Gemini breaker is open."""
+    gemini = gemini_breaker.stats()
+    body = {
+        "status": "ok" if gemini["state"] == "closed" else "degraded",
+        "database": "connected" if db.is_connected else "disconnected",
+        "gemini": gemini,
+    }
+    if not db.is_connected:
+        return JSONResponse(status_code=503, content={**body, "status": "unavailable"})
+    return body
+
+@app.get("/stats/")
+async def get_stats():
+    """Operational counters for the caches and executors."""
+    return {
+        "llm_response_cache": response_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "gemini_models": model_registry.stats(),
+        "gemini_tokens": token_usage.stats(),
+        "gemini_admission": gemini_admission.stats(),
+        "gemini_breaker": gemini_breaker.stats(),
+        "text_normalization": normalization_stats.stats(),
+        "gemini_json": parse_stats.stats(),
+        "credit_ledger": ledger_writer.stats(),
+        "jobs": job_manager.stats(),
+        "batches": batch_processor.stats(),
+        "singleflight": {
+            "extraction": singleflight.extraction_flights.stats(),
+            "gemini": singleflight.gemini_flights.stats(),
+        },
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics of every worker: request and stage latencies, Gemini, extraction and MongoDB pool gauges."""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/register")
 async def register_user(user: UserCreate):
     """Endpoint to register a new user."""
-    if users_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     # Check if user already exists by email
-    if users_collection.find_one({"email": user.email}):
+    if await db.users.find_by_email(user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     # Optional: Check if username exists if you want usernames to be unique too
-    # if users_collection.find_one({"username": user.username}):
+    # if await db.users.collection.find_one({"username": user.username}):
     #     raise HTTPException(status_code=400, detail="Username already registered")
 
 
@@ -406,9 +345,12 @@ async def register_user(user: UserCreate):
 
     # Insert user into database
     try:
-        insert_result = users_collection.insert_one(user_doc)
+        user_id = await db.users.create(user_doc)
         # Return the user ID as a string
-        return {"message": "User registered successfully", "user_id": str(insert_result.inserted_id)}
+        return {"message": "User registered successfully", "user_id": user_id}
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration; the unique email index rejected the insert
+        raise HTTPException(status_code=400, detail="Email already registered")
     except OperationFailure as e:
         print(f"Error inserting user into DB: {e}")
         raise HTTPException(status_code=500, detail="Internal server error during registration")
@@ -417,11 +359,11 @@ async def register_user(user: UserCreate):
 @app.post("/login", response_model=Token)
 async def login_user(user: UserLogin):
     """Endpoint to log in a user and return a JWT token (using email)."""
-    if users_collection is None or tokens_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     # Find the user by email
-    db_user = users_collection.find_one({"email": user.email})
+    db_user = await db.users.find_by_email(user.email)
 
     # Check if user exists and verify password
     if not db_user or not verify_password(user.password, db_user["hashed_password"]):
@@ -449,7 +391,7 @@ async def login_user(user: UserLogin):
     }
 
     try:
-        tokens_collection.insert_one(token_doc)
+        await db.tokens.create(token_doc)
     except OperationFailure as e:
         print(f"Database error storing token for user {db_user['email']}: {e}")
         # Log the error but still return the token, as the token itself is valid
@@ -468,7 +410,7 @@ async def upload_resume(
     and store metadata in the database.
     Requires JWT authentication.
     """
-    if resumes_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     if file.content_type != "application/pdf":
@@ -486,22 +428,17 @@ async def upload_resume(
     file_path = os.path.join(user_upload_directory, unique_filename)
 
     try:
-        # Save the file to the server
+        # Save the file to the server, hashing it as it streams so extracted text can be cached by content
+        hasher = hashlib.sha256()
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                buffer.write(chunk)
 
         # Store resume metadata in the database
-        resume_metadata = {
-            "filename": file.filename, # Original filename
-            "saved_filename": unique_filename, # Unique filename on server
-            "filepath": file_path, # Store the full path including user ID
-            "uploader_id": str(current_user["_id"]), # Store the uploader's user ID (as string)
-            "upload_timestamp": datetime.now(timezone.utc),
-            "analysis_data": None # Field to store analysis results later
-        }
-
-        insert_result = resumes_collection.insert_one(resume_metadata)
-        resume_id = str(insert_result.inserted_id)
+        resume_metadata = new_resume_record(current_user, file.filename, unique_filename, file_path, hasher.hexdigest())
+
+        resume_id = await db.resumes.create(resume_metadata)
 
         return ResumeUploadResponse(
             message="Resume uploaded successfully",
@@ -527,6 +464,7 @@ async def upload_resume(
 @app.get("/analyze-resume/{resume_id}")
 async def analyze_resume(
     resume_id: str,
+    bypass_cache: bool = False, # Force a fresh Gemini call instead of a cached response
     current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
 ):
     """
@@ -536,173 +474,74 @@ async def analyze_resume(
     """
     if not GEMINI_API_KEY:
          raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
-    if resumes_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
+    ensure_gemini_available() # Fail fast (503 + Retry-After) before any work is done or credits are charged
 
-    try:
-        # Validate resume_id format
-        if not ObjectId.is_valid(resume_id):
-             raise HTTPException(status_code=400, detail="Invalid resume ID format.")
-
-        # Find the resume metadata in the database
-        # Ensure the resume belongs to the current user for security
-        resume_metadata = resumes_collection.find_one({
-            "_id": ObjectId(resume_id),
-            "uploader_id": str(current_user["_id"])
-        })
+    with request_deadline(ANALYSIS_DEADLINE_SECONDS): # One budget for extraction, Gemini and persistence
+        try:
+            _, text = await load_resume_text(current_user, resume_id, purpose="analysis")
 
-        if not resume_metadata:
-            raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to access it.")
+            # --- Send text to Gemini API ---
+            resume_data = await generate_resume_analysis(text, bypass_cache=bypass_cache)
 
-        file_path = resume_metadata["filepath"]
+            # Optional: Store the analysis data back in the database
+            await save_resume_analysis(resume_id, resume_data)
 
-        # Check if the file exists on the server
-        if not os.path.exists(file_path):
-             # If file is missing but metadata exists, log a warning
-             print(f"Warning: File not found for resume_id {resume_id} at path {file_path} during analysis attempt.")
-             raise HTTPException(status_code=500, detail="Resume file not found on the server.")
+            return resume_data
 
-        # Use PyMuPDF to extract text from the saved file
-        try:
-            doc = fitz.open(file_path)
-            text = ""
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            doc.close()
-        except fitz.FileDataError:
-             raise HTTPException(status_code=400, detail="Invalid PDF file format or corrupted file.")
+        except HTTPException:
+             raise
+        except OperationFailure:
+             raise HTTPException(status_code=500, detail="Database error while retrieving resume metadata.")
         except Exception as e:
-             print(f"Error extracting text from PDF {file_path}: {e}")
-             raise HTTPException(status_code=500, detail="Error extracting text from PDF.")
-
-
-        if not text:
-             raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
+            print(f"An unexpected error occurred during resume analysis: {e}")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred during analysis: {e}")
 
-        # --- Send text to Gemini API ---
-        # Ensure the model name is correct and available
-        model_name = 'gemini-1.5-flash' # Or 'gemini-1.5-pro'
-        try:
-            model = genai.GenerativeModel(model_name)
-        except Exception as e:
-             print(f"Error loading Gemini model {model_name}: {e}")
-             raise HTTPException(status_code=500, detail=f"Error loading Gemini model {model_name}.")
-
-
-        # Define the prompt for Gemini
-        # Added instructions to ensure JSON format
-        prompt = f"""
-        Analyze the following resume text and extract key details.
-        Also, provide constructive suggestions for improvement.
-        Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
-        The JSON object should have the following structure:
-        {{
-            "name": "Extracted Name",
-            "contact": {{
-                "email": "Extracted Email",
-                "phone": "Extracted Phone",
-                "linkedin": "Extracted LinkedIn URL (if available)",
-                "github": "Extracted GitHub URL (if available)",
-                "website": "Extracted Personal Website URL (if available)"
-            }},
-            "summary": "Extracted Summary/Objective (if available)",
-            "experience": [
-                {{
-                    "title": "Job Title",
-                    "company": "Company Name",
-                    "dates": "Start Date - End Date",
-                    "description": "Job Description/Responsibilities"
-                }}
-                // ... more experience entries
-            ],
-            "education": [
-                {{
-                    "degree": "Degree Name",
-                    "institution": "Institution Name",
-                    "dates": "Start Date - End Date or Graduation Year"
-                }}
-                // ... more education entries
-            ],
-            "skills": [
-                "Skill 1", "Skill 2", // ... list of skills
-            ],
-            "projects": [
-                 {{
-                    "name": "Project Name",
-                    "description": "Project Description",
-                    "link": "Project Link (if available)"
-                 }}
-                 // ... more project entries
-            ],
-            "certifications": [
-                 "Certification 1", "Certification 2", // ... list of certifications
-            ],
-            "awards": [
-                 "Award 1", "Award 2", // ... list of awards
-            ],
-            "suggestions_for_improvement": [
-                "Suggestion 1",
-                "Suggestion 2",
-                // ... list of suggestions
-            ],
-            "raw_text": {json.dumps(text)} # Include raw text for debugging/reference, properly escaped
-        }}
-
-        Resume Text:
-        {text}
-        """
-
-        # Generate content using Gemini
-        try:
-            response = model.generate_content(prompt)
-        except Exception as e:
-             print(f"Error calling Gemini API: {e}")
-             raise HTTPException(status_code=500, detail=f"Error calling Gemini API: {e}")
 
+@app.get("/analyze-resume/{resume_id}/stream")
+async def stream_analyze_resume(
+    resume_id: str,
+    request: Request,
+    bypass_cache: bool = False, # Force a fresh Gemini call instead of a cached response
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Streaming variant of /analyze-resume: emits a "section" event for each top-level field
+    (experience, skills, suggestions_for_improvement, ...) as soon as Gemini has produced it,
+    then a "complete" event with the full analysis. NDJSON by default, SSE for Accept: text/event-stream.
+    Requires JWT authentication.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    ensure_gemini_available() # Fail fast (503 + Retry-After) before any work is done or credits are charged
 
-        # Check if the response contains text and attempt to parse it as JSON
-        if not response.text:
-             print("Gemini API returned an empty response text.")
-             raise HTTPException(status_code=500, detail="Gemini API returned an empty response.")
+    # Resolve the text before streaming starts, so lookup errors still get a proper HTTP status
+    started = time.monotonic()
+    with request_deadline(ANALYSIS_DEADLINE_SECONDS):
+        _, text = await load_resume_text(current_user, resume_id, purpose="analysis")
+    media_type = stream_media_type(request.headers.get("accept"))
 
-        # Attempt to parse the response text as JSON directly
+    async def event_stream():
         try:
-            # Clean up potential markdown code block wrappers if Gemini still includes them
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                 json_string = response_text[len("```json"):].rstrip("```").strip()
-            else:
-                 json_string = response_text # Assume the entire response is JSON
-
-            resume_data = json.loads(json_string)
-
-            # Optional: Store the analysis data back in the database
-            resumes_collection.update_one(
-                {"_id": ObjectId(resume_id)},
-                {"$set": {"analysis_data": resume_data}}
-            )
-
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from Gemini response: {e}")
-            print(f"Gemini raw response text: {response.text}")
-            # If JSON decoding fails, return the raw text for debugging
-            raise HTTPException(status_code=500, detail=f"Could not parse Gemini response as JSON. Raw response: {response.text}")
-        except OperationFailure as e:
-             print(f"Database error while updating analysis data for resume_id {resume_id}: {e}")
-             # Continue and return the data even if DB update fails
-             pass # Or raise HTTPException if storing analysis is critical
+            # The stream gets whatever is left of the endpoint's budget
+            with request_deadline(ANALYSIS_DEADLINE_SECONDS - (time.monotonic() - started)):
+                async for kind, key, value in stream_resume_analysis(text, bypass_cache=bypass_cache):
+                    if kind == "field":
+                        yield format_stream_event(media_type, "section", {"name": key, "value": value})
+                    elif kind == "done":
+                        # Persist exactly what the non-streaming endpoint stores
+                        await save_resume_analysis(resume_id, value)
+                        yield format_stream_event(media_type, "complete", value)
+        except HTTPException as e:
+            yield format_stream_event(media_type, "error", {"status_code": e.status_code, "detail": e.detail})
         except Exception as e:
-             print(f"Unexpected error processing Gemini response or updating DB: {e}")
-             raise HTTPException(status_code=500, detail=f"Unexpected error processing Gemini response: {e}")
-
-        return resume_data
+            print(f"An unexpected error occurred during streamed resume analysis: {e}")
+            yield format_stream_event(media_type, "error", {"status_code": 500, "detail": f"An unexpected error occurred during analysis: {e}"})
 
-    except OperationFailure:
-         raise HTTPException(status_code=500, detail="Database error while retrieving resume metadata.")
-    except Exception as e:
-        print(f"An unexpected error occurred during resume analysis: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during analysis: {e}")
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/download-resume/{resume_id}")
@@ -714,7 +553,7 @@ async def download_resume(
     Endpoint to download a previously uploaded resume file.
     Requires JWT authentication.
     """
-    if resumes_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     try:
@@ -724,10 +563,7 @@ async def download_resume(
 
         # Find the resume metadata in the database
         # Ensure the resume belongs to the current user for security
-        resume_metadata = resumes_collection.find_one({
-            "_id": ObjectId(resume_id),
-            "uploader_id": str(current_user["_id"])
-        })
+        resume_metadata = await db.resumes.find_owned(resume_id, str(current_user["_id"]))
 
         if not resume_metadata:
             raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to access it.")
@@ -759,7 +595,7 @@ async def delete_resume(
     Endpoint to delete a previously uploaded resume file and its metadata.
     Requires JWT authentication.
     """
-    if resumes_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     try:
@@ -769,10 +605,7 @@ async def delete_resume(
 
         # Find the resume metadata in the database
         # Ensure the resume belongs to the current user for security
-        resume_metadata = resumes_collection.find_one({
-            "_id": ObjectId(resume_id),
-            "uploader_id": str(current_user["_id"])
-        })
+        resume_metadata = await db.resumes.find_owned(resume_id, str(current_user["_id"]))
 
         if not resume_metadata:
             raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to delete it.")
@@ -790,9 +623,9 @@ async def delete_resume(
                 pass # Or raise HTTPException if file deletion is critical
 
         # Delete the resume metadata from the database
-        delete_result = resumes_collection.delete_one({"_id": ObjectId(resume_id)})
+        deleted_count = await db.resumes.delete(resume_id)
 
-        if delete_result.deleted_count == 1:
+        if deleted_count == 1:
             return {"message": "Resume deleted successfully"}
         else:
             # This case should ideally not happen if find_one succeeded, but good for robustness
@@ -806,162 +639,92 @@ async def delete_resume(
         print(f"An unexpected error occurred during resume deletion: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during deletion: {e}")
 
-@app.get("/check-resume-ats/{resume_id}", response_model=ATSCheckResponse)
+@app.get("/check-resume-ats/{resume_id}", response_model=ATSCheckResult)
 async def check_resume_ats(
     resume_id: str,
+    mode: str = "llm", # "fast": free rule-based pre-score of the PDF layout, no Gemini call
+    bypass_cache: bool = False, # Force a fresh Gemini call instead of a stored or cached result
+    combined: bool = False, # Run the analysis in the same Gemini call and store it as the resume's analysis too
     current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
 ):
     """
-    Endpoint to perform an ATS check simulation on a saved resume using Gemini API.
-    Requires JWT authentication and deducts credits.
+    Endpoint to perform an ATS check simulation on a saved resume using Gemini API, grounded in the
+    rule-based pre-score of the PDF. A stored result for the same resume content, prompt version and
+    model is returned without calling Gemini. Requires JWT authentication and deducts credits.
+    With mode=fast only the rule-based pre-score is returned, free of charge.
     """
-    if not GEMINI_API_KEY:
+    if mode not in ("llm", "fast"):
+         raise HTTPException(status_code=400, detail="Invalid mode; expected 'llm' or 'fast'.")
+    if mode == "llm" and not GEMINI_API_KEY:
          raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
-    if resumes_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
-    # --- Credit Check and Deduction ---
-    if current_user.get("credits", 0) < RESUME_CHECKER_COST:
-         raise HTTPException(status_code=400, detail="Insufficient credits to perform ATS check.") # Or 402 Payment Required
-
-    try:
-        # Validate resume_id format
-        if not ObjectId.is_valid(resume_id):
-             raise HTTPException(status_code=400, detail="Invalid resume ID format.")
-
-        # Find the resume metadata in the database
-        # Ensure the resume belongs to the current user for security
-        resume_metadata = resumes_collection.find_one({
-            "_id": ObjectId(resume_id),
-            "uploader_id": str(current_user["_id"])
-        })
-
-        if not resume_metadata:
-            raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to access it.")
-
-        file_path = resume_metadata["filepath"]
-
-        # Check if the file exists on the server
-        if not os.path.exists(file_path):
-             # If file is missing but metadata exists, log a warning
-             print(f"Warning: File not found for resume_id {resume_id} at path {file_path} during ATS check attempt.")
-             raise HTTPException(status_code=500, detail="Resume file not found on the server.")
-
-        # Use PyMuPDF to extract text from the saved file
-        try:
-            doc = fitz.open(file_path)
-            text = ""
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            doc.close()
-        except fitz.FileDataError:
-             raise HTTPException(status_code=400, detail="Invalid PDF file format or corrupted file.")
-        except Exception as e:
-             print(f"Error extracting text from PDF {file_path}: {e}")
-             raise HTTPException(status_code=500, detail="Error extracting text from PDF.")
-
-
-        if not text:
-             raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
-
-        # --- Deduct credits AFTER successful preliminary checks ---
-        await deduct_credits(str(current_user["_id"]), RESUME_CHECKER_COST, "Resume Checker")
-
-        # --- Send text to Gemini API for ATS check ---
-        model_name = 'gemini-1.5-flash' # Or 'gemini-1.5-pro'
+    with request_deadline(ATS_DEADLINE_SECONDS): # One budget for extraction, Gemini and persistence
         try:
-            model = genai.GenerativeModel(model_name)
-        except Exception as e:
-             print(f"Error loading Gemini model {model_name}: {e}")
-             raise HTTPException(status_code=500, detail=f"Error loading Gemini model {model_name}.")
-
-        # Define the prompt for ATS check simulation
-        # Instruct Gemini to provide a score and suggestions in JSON format
-        prompt = f"""
-        Analyze the following resume text from the perspective of an Applicant Tracking System (ATS).
-        Assess its formatting, structure, keyword density (relevant to general job applications),
-        clarity, and overall scannability by automated systems.
-
-        Provide an ATS compatibility score out of 100.
-        Also, list specific, actionable suggestions to improve the resume's ATS score and general effectiveness.
-
-        Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
-        The JSON object should have the following structure:
-        {{
-            "ats_score": 0, // Integer score out of 100
-            "suggestions": [
-                "Suggestion 1",
-                "Suggestion 2",
-                // ... list of suggestions for improvement
-            ]
-        }}
-
-        Resume Text:
-        {text}
-        """
-
-        # Generate content using Gemini
-        try:
-            response = model.generate_content(prompt)
-        except Exception as e:
-             print(f"Error calling Gemini API for ATS check: {e}")
-             # If Gemini fails AFTER deducting credits, you might consider refunding credits.
-             # This adds complexity (e.g., what if refund fails?). For simplicity, we don't refund here.
-             raise HTTPException(status_code=500, detail=f"Error calling Gemini API: {e}")
-
-        # Check if the response contains text and attempt to parse it as JSON
-        if not response.text:
-             print("Gemini API returned an empty response text for ATS check.")
-             raise HTTPException(status_code=500, detail="Gemini API returned an empty response.")
+            resume_metadata = await find_resume(current_user, resume_id)
+
+            # --- Fast mode: deterministic layout rules only, no credits ---
+            if mode == "fast":
+                return await prescore_resume(resume_metadata, purpose="fast ATS check")
+
+            # --- Serve a stored result for unchanged content ---
+            if not bypass_cache:
+                ats_data = await load_stored_ats_result(resume_metadata)
+                if ats_data is not None:
+                    await deduct_credits(
+                        str(current_user["_id"]), RESUME_CHECKER_COST, "Resume Checker",
+                        insufficient_detail="Insufficient credits to perform ATS check."
+                    )
+                    return ats_data
+
+            ensure_gemini_available() # Fail fast (503 + Retry-After) before any work is done or credits are charged
+            # The combined prompt is not grounded in the layout rules, so it skips the pre-score
+            pre_score = None if combined else await prescore_for_ats_check(resume_metadata, purpose="ATS check")
+            _, text = await load_resume_text(current_user, resume_id, purpose="ATS check", resume_metadata=resume_metadata)
+
+            # --- Deduct credits AFTER successful preliminary checks ---
+            # The deduction itself checks the balance, so there is no separate (possibly stale) pre-check
+            charge = await deduct_credits(
+                str(current_user["_id"]), RESUME_CHECKER_COST, "Resume Checker",
+                insufficient_detail="Insufficient credits to perform ATS check." # Or 402 Payment Required
+            )
 
-        # Attempt to parse the response text as JSON directly
-        try:
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                 json_string = response_text[len("```json"):].rstrip("```").strip()
+            # --- Send text to Gemini API for ATS check ---
+            try:
+                if combined:
+                    resume_data, ats_data = await generate_combined_check(text, bypass_cache=bypass_cache)
+                else:
+                    ats_data = await generate_ats_check(text, pre_score, bypass_cache=bypass_cache)
+            except Exception as e:
+                await refund_credits(charge, f"ATS check failed: {getattr(e, 'detail', e)}")
+                raise
+
+            # --- Store the results for later checks (and, when combined, as the resume's analysis) ---
+            if combined:
+                # The charge paid for the analysis as well, so it is refunded if the analysis was not stored
+                if not await save_resume_analysis(resume_id, resume_data):
+                    await refund_credits(charge, "ATS check failed: the resume analysis could not be stored")
+                    raise HTTPException(status_code=500, detail="Database error while storing the resume analysis.")
+                await save_ats_result(resume_metadata, ats_data, COMBINED_PROMPT_VERSION)
             else:
-                 json_string = response_text # Assume the entire response is JSON
-
-            ats_data = json.loads(json_string)
-
-            # Basic validation of the expected JSON structure
-            if not isinstance(ats_data.get("ats_score"), int) or not isinstance(ats_data.get("suggestions"), list):
-                 print(f"Gemini response did not match expected ATS JSON structure: {response.text}")
-                 raise HTTPException(status_code=500, detail="Gemini API returned unexpected format for ATS check.")
-
-            # Optional: Store the ATS analysis data back in the database
-            # You might want a separate field for ATS analysis vs general analysis
-            # resumes_collection.update_one(
-            #     {"_id": ObjectId(resume_id)},
-            #     {"$set": {"ats_analysis_data": ats_data}}
-            # )
-
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from Gemini response for ATS check: {e}")
-            print(f"Gemini raw response text: {response.text}")
-            raise HTTPException(status_code=500, detail=f"Could not parse Gemini response as JSON for ATS check. Raw response: {response.text}")
-        except OperationFailure as e:
-             print(f"Database error while updating ATS analysis data for resume_id {resume_id}: {e}")
-             pass # Continue and return the data even if DB update fails
-        except Exception as e:
-             print(f"Unexpected error processing Gemini response or updating DB for ATS check: {e}")
-             raise HTTPException(status_code=500, detail=f"Unexpected error processing Gemini response for ATS check: {e}")
+                await save_ats_result(resume_metadata, ats_data)
 
-        return ats_data
+            return ats_data
 
-    except HTTPException:
-         # Re-raise HTTPExceptions (like insufficient credits)
-         raise
-    except OperationFailure:
-         raise HTTPException(status_code=500, detail="Database error while retrieving resume metadata for ATS check.")
-    except Exception as e:
-        print(f"An unexpected error occurred during ATS check: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during ATS check: {e}")
+        except HTTPException:
+             # Re-raise HTTPExceptions (like insufficient credits)
+             raise
+        except OperationFailure:
+             raise HTTPException(status_code=500, detail="Database error while retrieving resume metadata for ATS check.")
+        except Exception as e:
+            print(f"An unexpected error occurred during ATS check: {e}")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred during ATS check: {e}")
 
 @app.post("/generate-roadmap/", response_model=RoadmapResponse)
 async def generate_roadmap(
     roadmap_request: RoadmapRequest,
+    bypass_cache: bool = False, # Force a fresh Gemini call instead of a cached response
     current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
 ):
     """
@@ -970,149 +733,112 @@ async def generate_roadmap(
     """
     if not GEMINI_API_KEY:
          raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
-    if roadmaps_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
+    ensure_gemini_available() # Fail fast (503 + Retry-After) before any work is done or credits are charged
 
-    # --- Credit Check and Deduction ---
-    if current_user.get("credits", 0) < ROADMAP_GENERATOR_COST:
-         raise HTTPException(status_code=400, detail="Insufficient credits to generate roadmap.") # Or 402 Payment Required
-
-    try:
-        model_name = 'gemini-1.5-flash' # Or 'gemini-1.5-pro' - Choose based on complexity needs and cost
-        try:
-            model = genai.GenerativeModel(model_name)
-        except Exception as e:
-             print(f"Error loading Gemini model {model_name}: {e}")
-             raise HTTPException(status_code=500, detail=f"Error loading Gemini model {model_name}.")
-
-        # --- Deduct credits BEFORE calling Gemini API ---
-        await deduct_credits(str(current_user["_id"]), ROADMAP_GENERATOR_COST, "Roadmap Generator")
-
-        # Construct a detailed prompt for Gemini
-        prompt = f"""
-        Generate a personalized career roadmap based on the following user information.
-        The roadmap should be structured as a series of steps and milestones to help the user transition
-        from their current role to their target role within the specified timeframe.
-        Include key skills to learn, projects to build, and potential learning resources or activities.
-        Consider the user's current skills, areas of interest, and preferred learning style.
-
-        Format the output strictly as a JSON object containing two arrays: "nodes" and "edges", suitable for visualization with React Flow.
-        Do not include any markdown formatting like ```json.
-
-        The "nodes" array should contain objects with the following structure:
-        {{
-            "id": "unique_node_id_string",
-            "type": "string_representing_node_type", // e.g., "start", "step", "milestone", "skill", "project", "end"
-            "data": {{ "label": "Node Title or Description" }}, # Data to be displayed in the node
-            "position": {{ "x": 0, "y": 0 }} # Placeholder position, frontend will handle layout
-        }}
-
-        The "edges" array should contain objects with the following structure:
-        {{
-            "id": "unique_edge_id_string", # e.g., "edge-start-step1"
-            "source": "source_node_id",
-            "target": "target_node_id",
-            "type": "string_representing_edge_type", # e.g., "smoothstep", "straight" (optional, default to "smoothstep")
-            "animated": boolean, # true or false (optional)
-            "label": "Edge Label" # Optional label for the edge
-        }}
-
-        Ensure the roadmap is logical, progressive, and achievable within the given timeframe.
-        Break down larger goals into smaller, manageable steps.
-        Include a clear start node (representing the current state) and an end node (representing achieving the target role).
-
-        User Information:
-        Current Role: {roadmap_request.current_role}
-        Target Role: {roadmap_request.target_role}
-        Years of Experience: {roadmap_request.years_of_experience}
-        Timeframe: {roadmap_request.timeframe}
-        Current Skills: {roadmap_request.current_skills}
-        Areas of Interest: {roadmap_request.areas_of_interest}
-        Preferred Learning Style: {roadmap_request.preferred_learning_style}
-        """
-
-        # Generate content using Gemini
+    with request_deadline(ROADMAP_DEADLINE_SECONDS): # One budget for extraction, Gemini and persistence
         try:
-            response = model.generate_content(prompt)
+            # --- Deduct credits BEFORE calling Gemini API ---
+            charge = await deduct_credits(
+                str(current_user["_id"]), ROADMAP_GENERATOR_COST, "Roadmap Generator",
+                insufficient_detail="Insufficient credits to generate roadmap." # Or 402 Payment Required
+            )
+
+            try:
+                roadmap_data = await generate_roadmap_data(roadmap_request, bypass_cache=bypass_cache)
+                return await save_roadmap(current_user, roadmap_request, roadmap_data)
+            except Exception as e:
+                await refund_credits(charge, f"Roadmap generation failed: {getattr(e, 'detail', e)}")
+                raise
+
+        except HTTPException:
+             # Re-raise HTTPExceptions (like insufficient credits)
+             raise
         except Exception as e:
-             print(f"Error calling Gemini API for roadmap generation: {e}")
-             # If Gemini fails AFTER deducting credits, you might consider refunding credits.
-             # This adds complexity (e.g., what if refund fails?). For simplicity, we don't refund here.
-             raise HTTPException(status_code=500, detail=f"Error calling Gemini API: {e}")
+            print(f"An unexpected error occurred during roadmap generation: {e}")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred during roadmap generation: {e}")
 
-        # Check if the response contains text and attempt to parse it as JSON
-        if not response.text:
-             print("Gemini API returned an empty response text for roadmap generation.")
-             raise HTTPException(status_code=500, detail="Gemini API returned an empty response.")
+@app.post("/generate-roadmap/stream")
+async def stream_generate_roadmap(
+    roadmap_request: RoadmapRequest,
+    request: Request,
+    bypass_cache: bool = False, # Force a fresh Gemini call instead of a cached response
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Streaming variant of /generate-roadmap: emits "node" and "edge" events as soon as each one
+    is complete (nodes without a position yet; the graph is laid out once it is complete), then a
+    "complete" event with the stored roadmap (same shape as RoadmapResponse).
+    NDJSON by default, SSE for Accept: text/event-stream.
+    Requires JWT authentication and deducts credits.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    ensure_gemini_available() # Fail fast (503 + Retry-After) before any work is done or credits are charged
 
-        # Attempt to parse the response text as JSON directly
-        try:
-            response_text = response.text.strip()
-            # Clean up potential markdown code block wrappers
-            if response_text.startswith("```json"):
-                 json_string = response_text[len("```json"):].rstrip("```").strip()
-            else:
-                 json_string = response_text # Assume the entire response is JSON
-
-            roadmap_data = json.loads(json_string)
-
-            # Basic validation of the expected JSON structure for React Flow
-            if not isinstance(roadmap_data.get("nodes"), list) or not isinstance(roadmap_data.get("edges"), list):
-                 print(f"Gemini response did not match expected roadmap JSON structure: {response.text}")
-                 raise HTTPException(status_code=500, detail="Gemini API returned unexpected format for roadmap.")
-
-            # Add metadata before storing in DB
-            roadmap_doc = {
-                "uploader_id": str(current_user["_id"]),
-                "generated_timestamp": datetime.now(timezone.utc),
-                "request_data": roadmap_request.model_dump(), # Store the original request data
-                "roadmap_data": roadmap_data # Store the generated nodes and edges
-            }
-
-            insert_result = roadmaps_collection.insert_one(roadmap_doc)
-            roadmap_id = str(insert_result.inserted_id)
-
-            # Prepare the response model
-            response_roadmap_data = RoadmapResponse(
-                roadmap_id=roadmap_id,
-                nodes=roadmap_data.get("nodes", []),
-                edges=roadmap_data.get("edges", []),
-                generated_timestamp=roadmap_doc["generated_timestamp"]
-            )
+    # --- Credit Deduction (checks the balance atomically) ---
+    charge = await deduct_credits(
+        str(current_user["_id"]), ROADMAP_GENERATOR_COST, "Roadmap Generator",
+        insufficient_detail="Insufficient credits to generate roadmap." # Or 402 Payment Required
+    )
 
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from Gemini response for roadmap: {e}")
-            print(f"Gemini raw response text: {response.text}")
-            raise HTTPException(status_code=500, detail=f"Could not parse Gemini response as JSON for roadmap. Raw response: {response.text}")
-        except OperationFailure as e:
-             print(f"Database error while storing roadmap for user {current_user['email']}: {e}")
-             # If DB storage fails, you might still want to return the generated data
-             # For now, we raise an error. Adjust based on desired behavior.
-             raise HTTPException(status_code=500, detail="Internal server error during roadmap storage.")
-        except Exception as e:
-             print(f"Unexpected error processing Gemini response or storing roadmap: {e}")
-             raise HTTPException(status_code=500, detail=f"An unexpected error occurred during roadmap generation: {e}")
+    media_type = stream_media_type(request.headers.get("accept"))
+    item_events = {"nodes": "node", "edges": "edge"}
 
-        return response_roadmap_data
+    async def event_stream():
+        saved = False
+        deadline = time.monotonic() + ROADMAP_DEADLINE_SECONDS # One budget for Gemini and persistence
+        stream = stream_roadmap_data(roadmap_request, bypass_cache=bypass_cache)
+        try:
+            while True:
+                # The deadline covers each step rather than the whole loop, so no context is held across
+                # a yield: after a disconnect this generator may be closed from another task
+                with request_deadline(deadline - time.monotonic()):
+                    try:
+                        kind, key, value = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    if kind == "done":
+                        roadmap = await save_roadmap(current_user, roadmap_request, value)
+                        saved = True
+                if kind == "item" and key in item_events:
+                    yield format_stream_event(media_type, item_events[key], value)
+                elif kind == "done":
+                    yield format_stream_event(media_type, "complete", json.loads(roadmap.model_dump_json()))
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away. A roadmap that was already saved stays paid for (it shows up in
+            # /list-roadmaps/); otherwise refund (refund_credits is shielded from the cancellation)
+            if not saved:
+                print("Client disconnected during streamed roadmap generation; refunding.")
+                await refund_credits(charge, "Roadmap generation cancelled: client disconnected")
+            raise
+        except HTTPException as e:
+            await refund_credits(charge, f"Roadmap generation failed: {e.detail}")
+            yield format_stream_event(media_type, "error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"An unexpected error occurred during streamed roadmap generation: {e}")
+            await refund_credits(charge, f"Roadmap generation failed: {e}")
+            yield format_stream_event(media_type, "error", {"status_code": 500, "detail": f"An unexpected error occurred during roadmap generation: {e}"})
+        finally:
+            await stream.aclose() # Releases the Gemini admission slot now, not when the stream is collected
 
-    except HTTPException:
-         # Re-raise HTTPExceptions (like insufficient credits)
-         raise
-    except Exception as e:
-        print(f"An unexpected error occurred during roadmap generation: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during roadmap generation: {e}")
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Optional: Add an endpoint to retrieve a saved roadmap by ID
 @app.get("/get-roadmap/{roadmap_id}", response_model=RoadmapResponse)
 async def get_roadmap(
     roadmap_id: str,
+    fields: Optional[str] = None, # Comma-separated subset of "nodes,edges"; both by default
     current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
 ):
     """
     Endpoint to retrieve a previously generated roadmap by its ID.
     Requires JWT authentication.
     """
-    if roadmaps_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
     try:
@@ -1120,25 +846,36 @@ async def get_roadmap(
         if not ObjectId.is_valid(roadmap_id):
              raise HTTPException(status_code=400, detail="Invalid roadmap ID format.")
 
+        selected_fields = ROADMAP_GRAPH_FIELDS
+        if fields:
+            selected_fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+            unknown_fields = set(selected_fields) - set(ROADMAP_GRAPH_FIELDS)
+            if unknown_fields:
+                raise HTTPException(status_code=400, detail=f"Unknown roadmap fields: {', '.join(sorted(unknown_fields))}.")
+
         # Find the roadmap in the database, ensuring it belongs to the current user
-        roadmap_doc = roadmaps_collection.find_one({
-            "_id": ObjectId(roadmap_id),
-            "uploader_id": str(current_user["_id"])
-        })
+        projection = {"generated_timestamp": 1, "roadmap_blob": 1, **{f"roadmap_data.{field}": 1 for field in selected_fields}}
+        roadmap_doc = await db.roadmaps.find_owned(roadmap_id, str(current_user["_id"]), projection)
 
         if not roadmap_doc:
             raise HTTPException(status_code=404, detail="Roadmap not found or you do not have permission to access it.")
 
-        # Prepare the response model from the stored data
+        # Prepare the response model from the stored data; nodes and edges keep their defaults, and
+        # only the graph fields that were not selected are left out of the response
+        roadmap_data = load_roadmap_graph(roadmap_doc)
         response_roadmap_data = RoadmapResponse(
             roadmap_id=str(roadmap_doc["_id"]),
-            nodes=roadmap_doc.get("roadmap_data", {}).get("nodes", []),
-            edges=roadmap_doc.get("roadmap_data", {}).get("edges", []),
-            generated_timestamp=roadmap_doc["generated_timestamp"]
+            generated_timestamp=roadmap_doc["generated_timestamp"],
+            **{field: roadmap_data.get(field, []) for field in selected_fields}
         )
+        if selected_fields == ROADMAP_GRAPH_FIELDS:
+            return response_roadmap_data
+        included = {"roadmap_id", "generated_timestamp", *selected_fields}
+        return JSONResponse(content=jsonable_encoder(response_roadmap_data.model_dump(include=included)))
 
-        return response_roadmap_data
-
+    except HTTPException:
+         # Re-raise the invalid ID / unknown field / not found errors as they are
+         raise
     except OperationFailure as e:
          print(f"Database error while retrieving roadmap {roadmap_id}: {e}")
          raise HTTPException(status_code=500, detail="Database error while retrieving roadmap.")
@@ -1148,32 +885,59 @@ async def get_roadmap(
 
 
 # Optional: Add an endpoint to list all roadmaps for the current user
-@app.get("/list-roadmaps/", response_model=List[RoadmapResponse])
+def encode_roadmap_cursor(summary_doc: dict) -> str:
+    """Opaque keyset cursor: the (generated_timestamp, _id) of the last roadmap on a page."""
+    timestamp = summary_doc["generated_timestamp"]
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc) # BSON dates come back naive
+    return f"{int(timestamp.timestamp() * 1000)}.{summary_doc['_id']}"
+
+
+def decode_roadmap_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        timestamp_ms, roadmap_id = cursor.split(".", 1)
+        return datetime.fromtimestamp(int(timestamp_ms) / 1000, tz=timezone.utc), ObjectId(roadmap_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+@app.get("/list-roadmaps/", response_model=RoadmapListResponse)
 async def list_roadmaps(
+    limit: int = ROADMAP_PAGE_SIZE,
+    cursor: Optional[str] = None, # next_cursor from the previous page
     current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
 ):
     """
-    Endpoint to list all roadmaps generated by the current user.
+    Endpoint to list the current user's roadmaps, newest first, one page at a time.
+    Returns summaries only; use /get-roadmap/{roadmap_id} for the nodes and edges.
     Requires JWT authentication.
     """
-    if roadmaps_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
+    limit = max(1, min(limit, ROADMAP_MAX_PAGE_SIZE))
+    before = decode_roadmap_cursor(cursor) if cursor else None
+
     try:
-        # Find all roadmaps for the current user
-        roadmap_docs = roadmaps_collection.find({"uploader_id": str(current_user["_id"])})
+        # Fetch one extra summary to learn whether another page follows
+        summary_docs = await db.roadmaps.list_summaries(str(current_user["_id"]), limit + 1, before)
+        has_more = len(summary_docs) > limit
+        summary_docs = summary_docs[:limit]
 
         roadmaps_list = []
-        for doc in roadmap_docs:
-            # Construct the response model for each roadmap
-            roadmaps_list.append(RoadmapResponse(
+        for doc in summary_docs:
+            request_data = doc.get("request_data", {})
+            roadmaps_list.append(RoadmapSummary(
                 roadmap_id=str(doc["_id"]),
-                nodes=doc.get("roadmap_data", {}).get("nodes", []),
-                edges=doc.get("roadmap_data", {}).get("edges", []),
+                title=f"{request_data.get('current_role', '?')} to {request_data.get('target_role', '?')}",
+                current_role=request_data.get("current_role"),
+                target_role=request_data.get("target_role"),
+                node_count=doc.get("node_count", 0),
                 generated_timestamp=doc["generated_timestamp"]
             ))
 
-        return roadmaps_list
+        next_cursor = encode_roadmap_cursor(summary_docs[-1]) if has_more else None
+        return RoadmapListResponse(roadmaps=roadmaps_list, next_cursor=next_cursor)
 
     except OperationFailure as e:
          print(f"Database error while listing roadmaps for user {current_user['email']}: {e}")
@@ -1213,24 +977,159 @@ async def get_credits(
     Endpoint to get the current user's credit balance.
     Requires JWT authentication.
     """
-    if users_collection is None:
+    if not db.is_connected:
          raise HTTPException(status_code=500, detail="Database not connected.")
 
-    try:
-        # Retrieve the user document to get the credit balance
-        user_doc = users_collection.find_one({"_id": ObjectId(current_user["_id"])})
-        if not user_doc:
-             # This case should ideally not happen if get_current_user succeeded
-             raise HTTPException(status_code=404, detail="User not found.")
+    # get_current_user already loaded the user; its cache entry is dropped whenever credits change
+    return CreditBalanceResponse(credits=current_user.get("credits", 0)) # Return 0 if credits field is missing
 
-        return CreditBalanceResponse(credits=user_doc.get("credits", 0)) # Return 0 if credits field is missing
 
-    except OperationFailure as e:
-         print(f"Database error while fetching credits for user {current_user['email']}: {e}")
-         raise HTTPException(status_code=500, detail="Database error while fetching credits.")
-    except Exception as e:
-        print(f"An unexpected error occurred while fetching credits: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while fetching credits: {e}")
+# --- Batch Analysis ---
+@app.post("/batch/analyze-resumes/")
+async def batch_analyze_resumes(
+    request: Request,
+    bypass_cache: bool = False, # Force fresh Gemini calls instead of cached responses
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Uploads and analyzes many resumes at once: the body is a ZIP file (Content-Type: application/zip)
+    or multipart/form-data with one PDF per file field. Every PDF is stored as a resume of the user.
+    Streams a "batch" event, one "result" event per file as it completes (in completion order, with
+    the file's index) and a final "summary" event; NDJSON by default, SSE for Accept: text/event-stream.
+    Credits for every PDF are reserved up front; those of files that could not be analyzed are refunded.
+    Requires JWT authentication.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    ensure_gemini_available() # Fail fast (503 + Retry-After) before the upload is staged or credits are reserved
+
+    # Staging and the credit reservation happen before streaming starts, so they fail with a proper HTTP status
+    batch = await batch_processor.start(request, current_user, UPLOAD_DIRECTORY, bypass_cache=bypass_cache)
+    media_type = stream_media_type(request.headers.get("accept"))
+    return StreamingResponse(
+        batch_processor.run(batch, media_type), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --- Asynchronous Jobs ---
+# The job endpoints return immediately with a job ID; a worker runs the Gemini pipeline in the
+# background and credits are only charged once the job completes.
+
+def job_submit_response(job_id: str) -> JobSubmitResponse:
+    return JobSubmitResponse(
+        job_id=job_id,
+        status="queued",
+        status_url=f"/jobs/{job_id}",
+        events_url=f"/jobs/{job_id}/events",
+    )
+
+async def ensure_resume_exists(resume_id: str, current_user: dict):
+    """Validates resume ownership at submit time so bad IDs fail fast instead of as a failed job."""
+    if not ObjectId.is_valid(resume_id):
+         raise HTTPException(status_code=400, detail="Invalid resume ID format.")
+    if not await db.resumes.find_owned(resume_id, str(current_user["_id"])):
+        raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to access it.")
+
+@app.post("/jobs/analyze-resume/{resume_id}", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_analyze_resume_job(
+    resume_id: str,
+    bypass_cache: bool = False,
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Endpoint to queue a resume analysis job.
+    Requires JWT authentication.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+
+    await ensure_resume_exists(resume_id, current_user)
+    job_id = await job_manager.submit(current_user, "analyze-resume", {"resume_id": resume_id, "bypass_cache": bypass_cache})
+    return job_submit_response(job_id)
+
+@app.post("/jobs/check-resume-ats/{resume_id}", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_check_resume_ats_job(
+    resume_id: str,
+    bypass_cache: bool = False,
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Endpoint to queue an ATS check job. Credits are deducted when the job completes.
+    Requires JWT authentication.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    if current_user.get("credits", 0) < RESUME_CHECKER_COST:
+         raise HTTPException(status_code=400, detail="Insufficient credits to perform ATS check.")
+
+    await ensure_resume_exists(resume_id, current_user)
+    job_id = await job_manager.submit(current_user, "check-resume-ats", {"resume_id": resume_id, "bypass_cache": bypass_cache})
+    return job_submit_response(job_id)
+
+@app.post("/jobs/generate-roadmap/", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_generate_roadmap_job(
+    roadmap_request: RoadmapRequest,
+    bypass_cache: bool = False,
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Endpoint to queue a roadmap generation job. Credits are deducted when the job completes.
+    Requires JWT authentication.
+    """
+    if not GEMINI_API_KEY:
+         raise HTTPException(status_code=500, detail="Gemini API key not configured on the server.")
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    if current_user.get("credits", 0) < ROADMAP_GENERATOR_COST:
+         raise HTTPException(status_code=400, detail="Insufficient credits to generate roadmap.")
+
+    job_id = await job_manager.submit(
+        current_user, "generate-roadmap", {"request": roadmap_request.model_dump(), "bypass_cache": bypass_cache}
+    )
+    return job_submit_response(job_id)
+
+async def get_owned_job(job_id: str, current_user: dict) -> dict:
+    if not db.is_connected:
+         raise HTTPException(status_code=500, detail="Database not connected.")
+    if not ObjectId.is_valid(job_id):
+         raise HTTPException(status_code=400, detail="Invalid job ID format.")
+    job = await db.jobs.find_owned(job_id, str(current_user["_id"]))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or you do not have permission to access it.")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Endpoint to poll a job's status; the result (or error) is included once it has finished.
+    Requires JWT authentication.
+    """
+    return job_to_response(await get_owned_job(job_id, current_user))
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(
+    job_id: str,
+    current_user: dict = Depends(get_current_user) # Protect this endpoint with JWT
+):
+    """
+    Endpoint streaming a job's status changes as Server-Sent Events, ending with a "result" event.
+    Requires JWT authentication.
+    """
+    job = await get_owned_job(job_id, current_user)
+    return StreamingResponse(
+        job_manager.events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # To run this application, save the code as main.py and run:
@@ -0,0 +1,188 @@
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Imported by main.py before it loads .env, so load it here as well. prometheus_client reads
+# PROMETHEUS_MULTIPROC_DIR when it is imported, so .env has to be loaded before the import below.
+load_dotenv()
+
+from prometheus_client import ( # noqa: E402
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess,
+)
+from pymongo import monitoring # noqa: E402
+
+# --- Metrics Configuration ---
+# Prometheus metrics served on /metrics. With a single process they live in memory. With several
+# uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory (wiped before every start, and
+# never shared between deployments): each worker then writes its samples to memory-mapped files
+# there and /metrics, whichever worker answers it, aggregates all of them. Gauges are summed over
+# the live workers.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_PREFIX = "zumeo"
+
+# Request latencies span cached reads (milliseconds) to streamed Gemini responses (a minute or more)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+_GAUGE_MODE = {"multiprocess_mode": "livesum"} if PROMETHEUS_MULTIPROC_DIR else {}
+
+
+def _name(name: str) -> str:
+    return f"{METRICS_PREFIX}_{name}"
+
+
+# --- Metrics ---
+HTTP_REQUEST_DURATION = Histogram(
+    _name("http_request_duration_seconds"), "Time to answer an HTTP request (streamed responses: until the last byte).",
+    ("method", "route", "status"), buckets=LATENCY_BUCKETS,
+)
+PDF_EXTRACTION_DURATION = Histogram(
+    _name("pdf_extraction_duration_seconds"), "PDF text or layout extraction, including the wait for an executor worker.",
+    ("kind", "outcome"), buckets=FAST_BUCKETS,
+)
+MONGO_COMMAND_DURATION = Histogram(
+    _name("mongo_command_duration_seconds"), "MongoDB command round trips as reported by the driver.",
+    ("command", "outcome"), buckets=FAST_BUCKETS,
+)
+GEMINI_PROMPT_TOKENS = Histogram(
+    _name("gemini_prompt_tokens"), "Estimated prompt size of the Gemini calls made (cache hits excluded).",
+    ("template",), buckets=TOKEN_BUCKETS,
+)
+GEMINI_REQUEST_DURATION = Histogram(
+    _name("gemini_request_duration_seconds"), "Gemini requests, per attempt (streamed requests: until the first chunk).",
+    ("stream", "outcome"), buckets=LATENCY_BUCKETS,
+)
+GEMINI_JSON_PARSE = Counter(
+    _name("gemini_json_parse"), "Outcomes of parsing Gemini output as JSON (failed, retries, clean, extracted, repaired).",
+    ("template", "outcome"),
+)
+GEMINI_QUEUE_WAIT = Histogram(
+    _name("gemini_queue_wait_seconds"), "Time Gemini calls waited for the rate buckets and a concurrency slot before being admitted.",
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_IN_FLIGHT = Gauge(_name("gemini_in_flight_calls"), "Gemini calls holding an admission slot.", **_GAUGE_MODE)
+GEMINI_WAITING = Gauge(_name("gemini_waiting_calls"), "Gemini calls waiting for quota or a slot.", **_GAUGE_MODE)
+EXTRACTION_QUEUE_DEPTH = Gauge(
+    _name("extraction_queue_depth"), "PDF extraction jobs waiting for an executor worker.", **_GAUGE_MODE
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    _name("mongo_pool_checked_out_connections"), "MongoDB connections currently checked out of the pool.", **_GAUGE_MODE
+)
+MONGO_POOL_MAX_SIZE = Gauge(
+    _name("mongo_pool_max_connections"), "maxPoolSize of the MongoDB connection pools.", **_GAUGE_MODE
+)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def render_metrics() -> bytes:
+    """The /metrics payload in the Prometheus text format, aggregated over every worker when multiprocess."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead():
+    """Drops this worker's live gauges from the aggregate. Call on shutdown."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# --- Request Latency ---
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request, labelled with the route's path template (not the
+    raw path, so resume and roadmap IDs do not explode the label set). Histogram children are cached
+    per label set, which keeps the cost per request to a few microseconds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._children = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500 # Stays 500 if the app fails before it starts the response
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route") # Set by the router once a route matches
+            key = (scope["method"], route.path if route is not None else "unmatched", status_code)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = HTTP_REQUEST_DURATION.labels(*key)
+            child.observe(time.perf_counter() - started)
+
+
+# --- MongoDB Driver Events ---
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends (runs on the driver's thread, so it must stay cheap)."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks how many pooled connections are in use."""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+
+    def pool_created(self, event):
+        MONGO_POOL_MAX_SIZE.inc(self.max_pool_size)
+
+    def pool_closed(self, event):
+        MONGO_POOL_MAX_SIZE.dec(self.max_pool_size)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+
+def mongo_event_listeners(max_pool_size: int) -> list:
+    """event_listeners for the MongoDB client."""
+    return [MongoCommandMetrics(), MongoPoolMetrics(max_pool_size)]
@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import List, Optional # For Pydantic models
+
+from pydantic import BaseModel, EmailStr
+
+# --- Pydantic Models ---
+class UserCreate(BaseModel):
+    """Model for user registration requests."""
+    username: str
+    email: EmailStr
+    password: str
+    # Credits will be added by the backend with a default value
+
+class UserLogin(BaseModel):
+    """Model for user login requests (using email)."""
+    email: str
+    password: str
+
+class Token(BaseModel):
+    """Model for the JWT token response."""
+    access_token: str
+    token_type: str
+    expires_at: datetime # Include expiration time in the response
+
+class ResumeUploadResponse(BaseModel):
+    """Model for the resume upload response."""
+    message: str
+    resume_id: str
+    filename: str
+
+class ATSCheckResponse(BaseModel):
+    """Model for the ATS check response."""
+    ats_score: int # Assuming a score out of 100
+    suggestions: list[str]
+    # You could add more fields here based on Gemini's output structure
+
+class ATSRuleCheck(BaseModel):
+    """One rule of the deterministic ATS pre-score (see ats_rules)."""
+    id: str
+    passed: bool
+    penalty: int # Points deducted from 100; 0 when the rule passed
+    detail: str
+
+class ATSCheckResult(ATSCheckResponse):
+    """Model for /check-resume-ats/ responses: Gemini's check, or the rule-based pre-score in fast mode."""
+    mode: str = "llm" # "llm" or "fast"
+    rules_version: Optional[str] = None # Only set in fast mode
+    checks: Optional[List[ATSRuleCheck]] = None
+
+class RoadmapRequest(BaseModel):
+    """Model for the roadmap generation request."""
+    current_role: str
+    target_role: str
+    years_of_experience: str # e.g., "0-1 years", "1-3 years"
+    timeframe: str # e.g., "6 months", "1 year", "2 years"
+    current_skills: str # comma separated string
+    areas_of_interest: str # comma separated string
+    preferred_learning_style: str # e.g., "visual", "auditory", "kinesthetic", "reading/writing"
+
+class RoadmapNode(BaseModel):
+    """Model for a node in the React Flow roadmap."""
+    id: str
+    type: str # e.g., "start", "step", "milestone", "skill", "project", "end"
+    data: dict # Custom data for the node, e.g., {"label": "Learn Python"}
+    position: dict # {"x": 0, "y": 0} - Initial position, might need frontend layout
+
+class RoadmapEdge(BaseModel):
+    """Model for an edge in the React Flow roadmap."""
+    id: str
+    source: str # Source node ID
+    target: str # Target node ID
+    type: Optional[str] = "smoothstep" # e.g., "smoothstep", "straight"
+    animated: Optional[bool] = False
+    label: Optional[str] = None
+
+class RoadmapGraph(BaseModel):
+    """Model for the roadmap graph Gemini generates; its response schema is derived from this."""
+    nodes: List[RoadmapNode]
+    edges: List[RoadmapEdge]
+
+class RoadmapResponse(BaseModel):
+    """Model for the roadmap generation response, formatted for React Flow."""
+    roadmap_id: str
+    nodes: List[RoadmapNode] = [] # Omitted from /get-roadmap responses when not selected with fields=
+    edges: List[RoadmapEdge] = []
+    generated_timestamp: datetime
+
+class RoadmapSummary(BaseModel):
+    """Model for one entry of the roadmap listing (no graph; fetch it with /get-roadmap)."""
+    roadmap_id: str
+    title: str
+    current_role: Optional[str] = None
+    target_role: Optional[str] = None
+    node_count: int
+    generated_timestamp: datetime
+
+class RoadmapListResponse(BaseModel):
+    """Model for a page of roadmap summaries, newest first."""
+    roadmaps: List[RoadmapSummary]
+    next_cursor: Optional[str] = None # Pass as ?cursor= to get the next page; None on the last page
+
+class CreditPurchaseRequest(BaseModel):
+    """Model for a credit purchase request."""
+    amount: int
+    transaction_details: str # e.g., "Stripe transaction ID xyz"
+
+class CreditBalanceResponse(BaseModel):
+    """Model for returning the user's credit balance."""
+    credits: int
+
+class JobSubmitResponse(BaseModel):
+    """Model returned when an asynchronous job is accepted."""
+    job_id: str
+    status: str
+    status_url: str # Poll this for the job status and result
+    events_url: str # Or subscribe here for Server-Sent Events
+
+class JobStatusResponse(BaseModel):
+    """Model for the status (and, once finished, the result) of an asynchronous job."""
+    job_id: str
+    kind: str # "analyze-resume", "check-resume-ats" or "generate-roadmap"
+    status: str # "queued", "running", "completed" or "failed"
+    result: Optional[dict] = None
+    error: Optional[dict] = None # {"status_code": ..., "detail": ...} when failed
+    created_at: datetime
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,542 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure, PyMongoError
+from google.api_core import exceptions as google_exceptions
+from bson import ObjectId # To work with MongoDB ObjectIds
+
+from database import db
+from extraction import ExtractionError, extraction_executor
+from ats_rules import score_layout
+from text_cache import get_resume_text
+from text_normalize import normalize_resume_text, normalization_stats, estimate_tokens, TEXT_NORMALIZATION_ENABLED
+from llm_cache import response_cache
+from models import RoadmapRequest, RoadmapResponse
+from streaming import IncrementalJSONParser
+from storage_codec import roadmap_storage_fields, analysis_storage_fields, load_analysis
+from layout import layout_roadmap, LAYOUT_VERSION, LAYOUT_THREAD_THRESHOLD
+from singleflight import gemini_flights
+from gemini_models import model_registry, GEMINI_MODEL_NAME
+from admission import gemini_admission, OVERLOAD_ERRORS
+from circuit_breaker import gemini_breaker
+from deadlines import gemini_call_timeout
+from metrics import GEMINI_REQUEST_DURATION, GEMINI_PROMPT_TOKENS
+from llm_output import extract_json, generation_config_for, parse_stats, GEMINI_PARSE_RETRIES
+from prompts import (
+    build_prompt, token_usage, RESPONSE_SCHEMAS,
+    ANALYSIS_PROMPT_VERSION, ATS_PROMPT_VERSION, ROADMAP_PROMPT_VERSION, COMBINED_PROMPT_VERSION,
+)
+
+# The extraction -> prompt -> Gemini -> parse -> persist stages shared by the synchronous
+# endpoints in main.py and the background job workers in jobs.py. Stages raise HTTPException,
+# which the endpoints propagate as-is and the job workers record on the job document.
+
+# --- Extraction ---
+def new_resume_record(current_user: dict, filename: str, unique_filename: str, file_path: str, content_hash: str) -> dict:
+    """Metadata document for a resume file just stored in the user's upload directory."""
+    return {
+        "filename": filename, # Original filename
+        "saved_filename": unique_filename, # Unique filename on server
+        "filepath": file_path, # Store the full path including user ID
+        "uploader_id": str(current_user["_id"]), # Store the uploader's user ID (as string)
+        "content_hash": content_hash, # SHA-256 of the file, keys the extracted-text cache
+        "upload_timestamp": datetime.now(timezone.utc),
+        "analysis_data": None # Field to store analysis results later
+    }
+
+
+async def find_resume(current_user: dict, resume_id: str) -> dict:
+    """Finds a resume owned by the current user and returns its metadata."""
+    # Validate resume_id format
+    if not ObjectId.is_valid(resume_id):
+         raise HTTPException(status_code=400, detail="Invalid resume ID format.")
+
+    # Find the resume metadata in the database
+    # Ensure the resume belongs to the current user for security
+    resume_metadata = await db.resumes.find_owned(resume_id, str(current_user["_id"]))
+
+    if not resume_metadata:
+        raise HTTPException(status_code=404, detail="Resume not found or you do not have permission to access it.")
+
+    # Analyses are stored as compressed blobs; decode here so callers keep reading analysis_data
+    if resume_metadata.get("analysis_blob") is not None:
+        resume_metadata["analysis_data"] = load_analysis(resume_metadata)
+        del resume_metadata["analysis_blob"]
+    return resume_metadata
+
+
+def resume_file_path(resume_metadata: dict, purpose: str) -> str:
+    """The path of the resume's PDF; raises 500 if the file is missing from the server."""
+    file_path = resume_metadata["filepath"]
+
+    # Check if the file exists on the server
+    if not os.path.exists(file_path):
+         # If file is missing but metadata exists, log a warning
+         print(f"Warning: File not found for resume_id {resume_metadata['_id']} at path {file_path} during {purpose} attempt.")
+         raise HTTPException(status_code=500, detail="Resume file not found on the server.")
+    return file_path
+
+
+async def load_resume_text(current_user: dict, resume_id: str, purpose: str = "analysis", resume_metadata: dict | None = None) -> tuple[dict, str]:
+    """
+    Finds a resume owned by the current user (unless its metadata is passed in) and returns its
+    metadata and extracted text.
+    """
+    if resume_metadata is None:
+        resume_metadata = await find_resume(current_user, resume_id)
+    resume_file_path(resume_metadata, purpose)
+
+    # Get the text from the content-addressed cache (PyMuPDF only runs on a miss, off the event loop)
+    try:
+        text = await get_resume_text(resume_metadata)
+    except ExtractionError as e:
+         raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Strip repeated headers/footers, glyph noise and excess whitespace (and fit the token budget) before prompting
+    if TEXT_NORMALIZATION_ENABLED:
+        text, report = normalize_resume_text(text)
+        normalization_stats.record(report)
+        print(
+            f"Normalized resume {resume_id} text for {purpose}: {report['chars_before']} -> {report['chars_after']} chars, "
+            f"~{report['tokens_before']} -> ~{report['tokens_after']} tokens"
+            + (f", trimmed {', '.join(report['sections_trimmed'])}" if report["sections_trimmed"] else "")
+        )
+
+    if not text:
+         raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
+
+    return resume_metadata, text
+
+
+# --- Gemini ---
+def load_gemini_model(model_name: str, template_version: str):
+    """The shared model for a template, configured for its JSON output (see gemini_models.ModelRegistry)."""
+    try:
+        return model_registry.get(model_name, generation_config_for(RESPONSE_SCHEMAS.get(template_version)))
+    except Exception as e:
+         print(f"Error loading Gemini model {model_name}: {e}")
+         raise HTTPException(status_code=500, detail=f"Error loading Gemini model {model_name}.")
+
+
+async def request_gemini(model, prompt: str, stream: bool = False):
+    """
+    Makes one Gemini request, bounded by the per-call timeout and the request's deadline, and
+    reports its outcome to the circuit breaker. Timeouts become 504; 429/503 errors propagate to
+    the admission controller's backoff.
+    """
+    timeout = gemini_call_timeout()
+    probe = gemini_breaker.acquire() # Last, so nothing can fail between taking a probe slot and reporting back
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        # request_options sets the server-side deadline (which also bounds reading a stream);
+        # wait_for cancels the call on our side if the upstream hangs anyway
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, stream=stream, request_options={"timeout": timeout}), timeout
+        )
+        outcome = "ok"
+    except (asyncio.TimeoutError, google_exceptions.DeadlineExceeded):
+        outcome = "timeout"
+        gemini_breaker.record_failure()
+        print(f"Gemini request timed out after {timeout:.1f} seconds.")
+        raise HTTPException(status_code=504, detail="The AI service did not respond in time.")
+    except google_exceptions.ClientError as e:
+        # 4xx responses are about the request, not an outage; 429 (quota) is the exception
+        if isinstance(e, OVERLOAD_ERRORS):
+            outcome = "overloaded"
+            gemini_breaker.record_failure()
+        else:
+            gemini_breaker.release(probe)
+        raise
+    except OVERLOAD_ERRORS: # 503 from the server side
+        outcome = "overloaded"
+        gemini_breaker.record_failure()
+        raise
+    except asyncio.CancelledError:
+        gemini_breaker.release(probe) # The caller went away, which says nothing about the upstream
+        raise
+    except Exception:
+        gemini_breaker.record_failure()
+        raise
+    finally:
+        GEMINI_REQUEST_DURATION.labels("true" if stream else "false", outcome).observe(time.perf_counter() - started)
+    gemini_breaker.record_success()
+    return response
+
+
+def ensure_gemini_available():
+    """Fails fast with 503 + Retry-After while the breaker is open or the admission queue is too deep. Call before charging credits."""
+    gemini_breaker.allow()
+    gemini_admission.check_capacity()
+
+
+def parse_and_validate(raw_response_text: str, template_version: str, validate=None, context: str = ""):
+    """
+    Parses a complete Gemini response (tolerating fences, surrounding prose and truncation) and applies
+    the optional shape check. Returns (data, how) with how as in extract_json; raises HTTPException.
+    """
+    try:
+        data, how = extract_json(raw_response_text)
+    except json.JSONDecodeError as e:
+        parse_stats.record(template_version, "failed")
+        print(f"Error decoding JSON from Gemini response{context}: {e}")
+        print(f"Gemini raw response text: {raw_response_text}")
+        raise HTTPException(status_code=500, detail=f"Could not parse Gemini response as JSON{context}. Raw response: {raw_response_text}")
+
+    if validate is not None:
+        try:
+            validate(data, raw_response_text)
+        except HTTPException:
+            parse_stats.record(template_version, "failed")
+            raise
+    parse_stats.record(template_version, how)
+    return data, how
+
+
+async def generate_json(
+    template_version: str,
+    cache_input,
+    prompt: str,
+    validate=None,
+    bypass_cache: bool = False,
+    context: str = "",
+):
+    """
+    Runs a prompt through Gemini (or the response cache) and returns the parsed JSON.
+    validate, if given, raises HTTPException when the parsed data has the wrong shape.
+    context is appended to log and error messages, e.g. " for ATS check".
+    """
+    model_name = GEMINI_MODEL_NAME
+    cache_key = response_cache.make_key(model_name, template_version, cache_input)
+    cached_text = await response_cache.get(cache_key, bypass=bypass_cache)
+    if cached_text is not None:
+        return parse_and_validate(cached_text, template_version, validate, context)[0]
+
+    # The cache key identifies the endpoint (template) and the content, so concurrent
+    # duplicate requests (double-fired or refreshed) share a single Gemini call
+    return await gemini_flights.do(
+        cache_key, lambda: _generate_and_cache(model_name, template_version, cache_key, prompt, validate, context)
+    )
+
+
+async def _generate_and_cache(model_name: str, template_version: str, cache_key: str, prompt: str, validate, context: str,
+                              retries: int = GEMINI_PARSE_RETRIES):
+    model = load_gemini_model(model_name, template_version)
+    prompt_tokens = estimate_tokens(prompt)
+
+    # Output that cannot be parsed or validated is regenerated, within the retry budget
+    for attempt in range(retries + 1):
+        # Generate content using Gemini (async API, so the event loop keeps serving other requests)
+        # Admission waits for the concurrency cap and RPM/TPM buckets and retries 429/503 with backoff
+        GEMINI_PROMPT_TOKENS.labels(template_version).observe(prompt_tokens)
+        try:
+            response = await gemini_admission.call(lambda: request_gemini(model, prompt), prompt_tokens)
+        except HTTPException:
+            raise
+        except Exception as e:
+             print(f"Error calling Gemini API{context}: {e}")
+             raise HTTPException(status_code=500, detail=f"Error calling Gemini API: {e}")
+        token_usage.record(template_version, response.usage_metadata)
+
+        # Check if the response contains text and attempt to parse it as JSON
+        try:
+            if not response.text:
+                 print(f"Gemini API returned an empty response text{context}.")
+                 raise HTTPException(status_code=500, detail="Gemini API returned an empty response.")
+            raw_response_text = response.text
+            data, how = parse_and_validate(raw_response_text, template_version, validate, context)
+            break
+        except HTTPException:
+            if attempt == retries:
+                raise
+            parse_stats.record(template_version, "retries")
+            print(f"Retrying Gemini call{context} after unusable output (retry {attempt + 1} of {retries}).")
+
+    # Only responses that parsed and validated are worth caching; repaired (truncated) ones are regenerated next time
+    if how != "repaired":
+        await response_cache.set(cache_key, raw_response_text)
+    return data
+
+
+async def stream_json(
+    template_version: str,
+    cache_input,
+    prompt: str,
+    item_keys=(),
+    validate=None,
+    bypass_cache: bool = False,
+    context: str = "",
+):
+    """
+    Streaming variant of generate_json. Yields ("item", key, value) for each element of the arrays
+    named in item_keys and ("field", key, value) for each completed top-level field while Gemini is
+    still generating, then ("done", None, data) with the fully parsed and validated document.
+    If the streamed output turns out unusable, the document in "done" comes from a regular
+    (non-streamed) retry and supersedes the events already sent.
+    """
+    model_name = GEMINI_MODEL_NAME
+    cache_key = response_cache.make_key(model_name, template_version, cache_input)
+    cached_text = await response_cache.get(cache_key, bypass=bypass_cache)
+    parser = IncrementalJSONParser(item_keys=item_keys)
+
+    if cached_text is not None:
+        # Replay the cached response through the parser so clients see the same events
+        for event in parser.feed(cached_text):
+            yield event
+        raw_response_text = cached_text
+    else:
+        model = load_gemini_model(model_name, template_version)
+        prompt_tokens = estimate_tokens(prompt)
+        GEMINI_PROMPT_TOKENS.labels(template_version).observe(prompt_tokens)
+        chunks = []
+        try:
+            # The admission slot is held until the stream has been read to the end
+            async with gemini_admission.slot(prompt_tokens) as ticket:
+                response = await gemini_admission.with_backoff(lambda: request_gemini(model, prompt, stream=True))
+                async for chunk in response:
+                    chunks.append(chunk.text)
+                    for event in parser.feed(chunk.text):
+                        yield event
+                ticket.settle(response.usage_metadata)
+        except HTTPException:
+            raise
+        except Exception as e:
+             print(f"Error streaming from Gemini API{context}: {e}")
+             raise HTTPException(status_code=500, detail=f"Error calling Gemini API: {e}")
+
+        token_usage.record(template_version, response.usage_metadata) # Totals arrive with the final chunk
+        raw_response_text = "".join(chunks)
+
+    try:
+        if not raw_response_text:
+             print(f"Gemini API returned an empty response text{context}.")
+             raise HTTPException(status_code=500, detail="Gemini API returned an empty response.")
+        data, how = parse_and_validate(raw_response_text, template_version, validate, context)
+    except HTTPException:
+        if cached_text is not None or GEMINI_PARSE_RETRIES == 0:
+            raise
+        parse_stats.record(template_version, "retries")
+        print(f"Retrying Gemini call{context} after unusable streamed output.")
+        data = await _generate_and_cache(
+            model_name, template_version, cache_key, prompt, validate, context, retries=GEMINI_PARSE_RETRIES - 1
+        )
+        yield ("done", None, data)
+        return
+
+    if cached_text is None and how != "repaired":
+        await response_cache.set(cache_key, raw_response_text)
+    yield ("done", None, data)
+
+
+# --- Resume Analysis ---
+async def generate_resume_analysis(text: str, bypass_cache: bool = False) -> dict:
+    """Asks Gemini to extract structured details and suggestions from resume text."""
+    resume_data = await generate_json(
+        ANALYSIS_PROMPT_VERSION, text, build_prompt(ANALYSIS_PROMPT_VERSION, text), bypass_cache=bypass_cache
+    )
+    # The prompt no longer has Gemini echo the text back; attach it here instead
+    resume_data["raw_text"] = text
+    return resume_data
+
+
+async def stream_resume_analysis(text: str, bypass_cache: bool = False):
+    """Streaming variant of generate_resume_analysis (see stream_json for the events)."""
+    async for kind, key, value in stream_json(
+        ANALYSIS_PROMPT_VERSION, text, build_prompt(ANALYSIS_PROMPT_VERSION, text), bypass_cache=bypass_cache
+    ):
+        if kind == "done":
+            value["raw_text"] = text
+        yield kind, key, value
+
+
+async def save_resume_analysis(resume_id: str, resume_data: dict) -> bool:
+    """Stores the analysis data back in the database. Failures are logged, not raised; returns whether it was stored."""
+    try:
+        await db.resumes.set_fields(resume_id, analysis_storage_fields(resume_data))
+    except PyMongoError as e:
+         print(f"Database error while updating analysis data for resume_id {resume_id}: {e}")
+         # Continue and return the data even if DB update fails
+         return False
+    return True
+
+
+# --- ATS Check ---
+def _validate_ats_data(ats_data, raw_response_text: str):
+    # Basic validation of the expected JSON structure
+    if not isinstance(ats_data, dict) or not isinstance(ats_data.get("ats_score"), int) or not isinstance(ats_data.get("suggestions"), list):
+         print(f"Gemini response did not match expected ATS JSON structure: {raw_response_text}")
+         raise HTTPException(status_code=500, detail="Gemini API returned unexpected format for ATS check.")
+
+
+async def prescore_resume(resume_metadata: dict, purpose: str = "ATS pre-score") -> dict:
+    """Scores the resume PDF with the deterministic ATS rule set (see ats_rules); no Gemini call."""
+    file_path = resume_file_path(resume_metadata, purpose)
+    try:
+        features = await extraction_executor.extract_layout(file_path)
+    except ExtractionError as e:
+         raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return score_layout(features)
+
+
+async def prescore_for_ats_check(resume_metadata: dict, purpose: str = "ATS check") -> dict | None:
+    """
+    The pre-score that grounds a Gemini ATS check, or None if it could not be computed. It only
+    refines the prompt, so a failure is logged and the (paid) check goes ahead without it.
+    """
+    try:
+        return await prescore_resume(resume_metadata, purpose=purpose)
+    except Exception as e:
+         print(f"ATS pre-score failed for resume_id {resume_metadata.get('_id')}; checking without it: {getattr(e, 'detail', e)}")
+         return None
+
+
+async def generate_ats_check(text: str, pre_score: dict | None = None, bypass_cache: bool = False) -> dict:
+    """
+    Asks Gemini for an ATS compatibility score and suggestions for resume text, grounded in the
+    rule-based pre-score of the PDF when one is given.
+    """
+    # The findings are part of the prompt, so they are part of the cache input (score and details follow from the failed rules)
+    cache_input = text if pre_score is None else {
+        "text": text,
+        "rules_version": pre_score["rules_version"],
+        "failed_checks": [check["id"] for check in pre_score["checks"] if not check["passed"]],
+    }
+    return await generate_json(
+        ATS_PROMPT_VERSION, cache_input, build_prompt(ATS_PROMPT_VERSION, text, pre_score),
+        validate=_validate_ats_data, bypass_cache=bypass_cache, context=" for ATS check"
+    )
+
+
+def _validate_combined_data(combined_data, raw_response_text: str):
+    if not isinstance(combined_data, dict) or not isinstance(combined_data.get("analysis"), dict):
+         print(f"Gemini response did not match expected combined analysis JSON structure: {raw_response_text}")
+         raise HTTPException(status_code=500, detail="Gemini API returned unexpected format for combined analysis and ATS check.")
+    _validate_ats_data(combined_data.get("ats"), raw_response_text)
+
+
+async def generate_combined_check(text: str, bypass_cache: bool = False) -> tuple[dict, dict]:
+    """Asks Gemini for the resume analysis and the ATS check in one call; returns (analysis, ats_data)."""
+    combined_data = await generate_json(
+        COMBINED_PROMPT_VERSION, text, build_prompt(COMBINED_PROMPT_VERSION, text),
+        validate=_validate_combined_data, bypass_cache=bypass_cache, context=" for combined analysis and ATS check"
+    )
+    resume_data = combined_data["analysis"]
+    resume_data["raw_text"] = text
+    return resume_data, combined_data["ats"]
+
+
+# --- Stored ATS Results ---
+# ATS results are stored per (resume content hash, prompt version, model), so re-checking an
+# unchanged resume (even one uploaded again) is served from MongoDB without extraction or Gemini.
+# Bumping the prompt version or switching models makes the old results unreachable.
+def ats_result_key(content_hash: str, prompt_version: str) -> str:
+    return f"{content_hash}:{prompt_version}:{GEMINI_MODEL_NAME}"
+
+
+async def load_stored_ats_result(resume_metadata: dict) -> dict | None:
+    """The stored ATS result for this resume's content, from either the ATS or the combined prompt, or None."""
+    content_hash = resume_metadata.get("content_hash")
+    if not content_hash: # Resumes uploaded before content hashing
+        return None
+    try:
+        result_doc = await db.ats_results.find([
+            ats_result_key(content_hash, ATS_PROMPT_VERSION), ats_result_key(content_hash, COMBINED_PROMPT_VERSION)
+        ])
+    except PyMongoError as e:
+         print(f"Error reading stored ATS result for {content_hash}: {e}")
+         return None
+    return result_doc["result"] if result_doc else None
+
+
+async def save_ats_result(resume_metadata: dict, ats_data: dict, prompt_version: str = ATS_PROMPT_VERSION):
+    """Stores an ATS result for this resume's content; failures are logged, not raised."""
+    content_hash = resume_metadata.get("content_hash")
+    if not content_hash:
+        return
+    result_doc = {
+        "content_hash": content_hash,
+        "prompt_version": prompt_version,
+        "model": GEMINI_MODEL_NAME,
+        "result": ats_data,
+        "created_at": datetime.now(timezone.utc),
+    }
+    try:
+        await db.ats_results.save(ats_result_key(content_hash, prompt_version), result_doc)
+    except PyMongoError as e:
+         print(f"Error storing ATS result for {content_hash}: {e}")
+
+
+# --- Roadmap Generation ---
+def roadmap_cache_input(roadmap_request: RoadmapRequest) -> dict:
+    """Case- and order-insensitive view of a roadmap request, so equivalent requests share a cached response."""
+    def normalize_list(value: str) -> str:
+        return ", ".join(sorted({item.strip().lower() for item in value.split(",") if item.strip()}))
+
+    return {
+        "current_role": roadmap_request.current_role.lower(),
+        "target_role": roadmap_request.target_role.lower(),
+        "years_of_experience": roadmap_request.years_of_experience.lower(),
+        "timeframe": roadmap_request.timeframe.lower(),
+        "current_skills": normalize_list(roadmap_request.current_skills),
+        "areas_of_interest": normalize_list(roadmap_request.areas_of_interest),
+        "preferred_learning_style": roadmap_request.preferred_learning_style.lower(),
+    }
+
+
+def _validate_roadmap_data(roadmap_data, raw_response_text: str):
+    # Basic validation of the expected JSON structure for React Flow
+    if not isinstance(roadmap_data, dict) or not isinstance(roadmap_data.get("nodes"), list) or not isinstance(roadmap_data.get("edges"), list):
+         print(f"Gemini response did not match expected roadmap JSON structure: {raw_response_text}")
+         raise HTTPException(status_code=500, detail="Gemini API returned unexpected format for roadmap.")
+
+
+async def generate_roadmap_data(roadmap_request: RoadmapRequest, bypass_cache: bool = False) -> dict:
+    """Asks Gemini for a React Flow roadmap (nodes and edges) for the user's career transition."""
+    return await generate_json(
+        ROADMAP_PROMPT_VERSION, roadmap_cache_input(roadmap_request), build_prompt(ROADMAP_PROMPT_VERSION, roadmap_request),
+        validate=_validate_roadmap_data, bypass_cache=bypass_cache, context=" for roadmap"
+    )
+
+
+def stream_roadmap_data(roadmap_request: RoadmapRequest, bypass_cache: bool = False):
+    """Streaming variant of generate_roadmap_data, emitting each node and edge as an "item" event."""
+    return stream_json(
+        ROADMAP_PROMPT_VERSION, roadmap_cache_input(roadmap_request), build_prompt(ROADMAP_PROMPT_VERSION, roadmap_request),
+        item_keys=("nodes", "edges"), validate=_validate_roadmap_data, bypass_cache=bypass_cache, context=" for roadmap"
+    )
+
+
+async def save_roadmap(current_user: dict, roadmap_request: RoadmapRequest, roadmap_data: dict) -> RoadmapResponse:
+    """Stores a generated roadmap for the user and returns it in React Flow response form."""
+    # Replace Gemini's placeholder positions with a layered layout, computed once and stored
+    if len(roadmap_data.get("nodes", [])) > LAYOUT_THREAD_THRESHOLD:
+        roadmap_data = await asyncio.to_thread(layout_roadmap, roadmap_data)
+    else:
+        roadmap_data = layout_roadmap(roadmap_data)
+
+    # Add metadata before storing in DB
+    roadmap_doc = {
+        "uploader_id": str(current_user["_id"]),
+        "generated_timestamp": datetime.now(timezone.utc),
+        "request_data": roadmap_request.model_dump(), # Store the original request data
+        **roadmap_storage_fields(roadmap_data), # The generated nodes and edges (compressed) and their counts
+        "layout_version": LAYOUT_VERSION,
+    }
+
+    try:
+        roadmap_id = await db.roadmaps.create(roadmap_doc)
+    except OperationFailure as e:
+         print(f"Database error while storing roadmap for user {current_user['email']}: {e}")
+         raise HTTPException(status_code=500, detail="Internal server error during roadmap storage.")
+
+    # Prepare the response model
+    return RoadmapResponse(
+        roadmap_id=roadmap_id,
+        nodes=roadmap_data.get("nodes", []),
+        edges=roadmap_data.get("edges", []),
+        generated_timestamp=roadmap_doc["generated_timestamp"]
+    )
@@ -0,0 +1,471 @@
+import json
+
+from dotenv import load_dotenv
+
+from models import RoadmapRequest, ATSCheckResponse, RoadmapGraph
+from llm_output import response_schema_for
+from gemini_models import model_registry
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Prompt Templates ---
+# Every prompt sent to Gemini is built here from a versioned template. The version is part of the
+# response cache key, so bump it (and add a new template) whenever a prompt changes. Older
+# templates stay registered so their token cost can still be compared (see benchmarks/prompt_tokens.py).
+ANALYSIS_PROMPT_VERSION = "analysis-v2"
+ATS_PROMPT_VERSION = "ats-v2"
+ROADMAP_PROMPT_VERSION = "roadmap-v2"
+COMBINED_PROMPT_VERSION = "combined-v1" # Analysis and ATS check in one call
+
+
+def _analysis_v1(text: str) -> str:
+    """Original analysis prompt. Superseded: it makes Gemini echo the whole resume back as raw_text."""
+    # Define the prompt for Gemini
+    # Added instructions to ensure JSON format
+    prompt = f"""
+    Analyze the following resume text and extract key details.
+    Also, provide constructive suggestions for improvement.
+    Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
+    The JSON object should have the following structure:
+    {{
+        "name": "Extracted Name",
+        "contact": {{
+            "email": "Extracted Email",
+            "phone": "Extracted Phone",
+            "linkedin": "Extracted LinkedIn URL (if available)",
+            "github": "Extracted GitHub URL (if available)",
+            "website": "Extracted Personal Website URL (if available)"
+        }},
+        "summary": "Extracted Summary/Objective (if available)",
+        "experience": [
+            {{
+                "title": "Job Title",
+                "company": "Company Name",
+                "dates": "Start Date - End Date",
+                "description": "Job Description/Responsibilities"
+            }}
+            // ... more experience entries
+        ],
+        "education": [
+            {{
+                "degree": "Degree Name",
+                "institution": "Institution Name",
+                "dates": "Start Date - End Date or Graduation Year"
+            }}
+            // ... more education entries
+        ],
+        "skills": [
+            "Skill 1", "Skill 2", // ... list of skills
+        ],
+        "projects": [
+             {{
+                "name": "Project Name",
+                "description": "Project Description",
+                "link": "Project Link (if available)"
+             }}
+             // ... more project entries
+        ],
+        "certifications": [
+             "Certification 1", "Certification 2", // ... list of certifications
+        ],
+        "awards": [
+             "Award 1", "Award 2", // ... list of awards
+        ],
+        "suggestions_for_improvement": [
+            "Suggestion 1",
+            "Suggestion 2",
+            // ... list of suggestions
+        ],
+        "raw_text": {json.dumps(text)} # Include raw text for debugging/reference, properly escaped
+    }}
+
+    Resume Text:
+    {text}
+    """
+    return prompt
+
+
+def _analysis_v2(text: str) -> str:
+    """Analysis prompt without the raw_text echo; pipelines attach raw_text after parsing."""
+    prompt = f"""
+    Analyze the following resume text and extract key details.
+    Also, provide constructive suggestions for improvement.
+    Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
+    The JSON object should have the following structure:
+    {{
+        "name": "Extracted Name",
+        "contact": {{
+            "email": "Extracted Email",
+            "phone": "Extracted Phone",
+            "linkedin": "Extracted LinkedIn URL (if available)",
+            "github": "Extracted GitHub URL (if available)",
+            "website": "Extracted Personal Website URL (if available)"
+        }},
+        "summary": "Extracted Summary/Objective (if available)",
+        "experience": [
+            {{
+                "title": "Job Title",
+                "company": "Company Name",
+                "dates": "Start Date - End Date",
+                "description": "Job Description/Responsibilities"
+            }}
+            // ... more experience entries
+        ],
+        "education": [
+            {{
+                "degree": "Degree Name",
+                "institution": "Institution Name",
+                "dates": "Start Date - End Date or Graduation Year"
+            }}
+            // ... more education entries
+        ],
+        "skills": [
+            "Skill 1", "Skill 2", // ... list of skills
+        ],
+        "projects": [
+             {{
+                "name": "Project Name",
+                "description": "Project Description",
+                "link": "Project Link (if available)"
+             }}
+             // ... more project entries
+        ],
+        "certifications": [
+             "Certification 1", "Certification 2", // ... list of certifications
+        ],
+        "awards": [
+             "Award 1", "Award 2", // ... list of awards
+        ],
+        "suggestions_for_improvement": [
+            "Suggestion 1",
+            "Suggestion 2",
+            // ... list of suggestions
+        ]
+    }}
+    Do not repeat the resume text itself in the output.
+
+    Resume Text:
+    {text}
+    """
+    return prompt
+
+
+def _ats_v1(text: str) -> str:
+    prompt = f"""
+    Analyze the following resume text from the perspective of an Applicant Tracking System (ATS).
+    Assess its formatting, structure, keyword density (relevant to general job applications),
+    clarity, and overall scannability by automated systems.
+
+    Provide an ATS compatibility score out of 100.
+    Also, list specific, actionable suggestions to improve the resume's ATS score and general effectiveness.
+
+    Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
+    The JSON object should have the following structure:
+    {{
+        "ats_score": 0, // Integer score out of 100
+        "suggestions": [
+            "Suggestion 1",
+            "Suggestion 2",
+            // ... list of suggestions for improvement
+        ]
+    }}
+
+    Resume Text:
+    {text}
+    """
+    return prompt
+
+
+def _layout_findings(pre_score: dict | None) -> str:
+    if not pre_score:
+        return "No automated layout check is available for this resume."
+    findings = "\n".join(
+        f"    - {'passed' if check['passed'] else 'FAILED'} {check['id']}"
+        + (f" (-{check['penalty']}): {check['detail']}" if not check["passed"] else "")
+        for check in pre_score["checks"]
+    )
+    return (
+        f"An automated layout check (rule set {pre_score['rules_version']}) has already inspected the PDF file itself,\n"
+        f"    which you cannot see, and scored it {pre_score['ats_score']}/100 with these findings:\n{findings}"
+    )
+
+
+def _ats_v2(text: str, pre_score: dict | None = None) -> str:
+    """ats-v1 grounded in the rule-based pre-score (ats_rules), so layout issues come from the file, not guesses."""
+    prompt = f"""
+    Analyze the following resume text from the perspective of an Applicant Tracking System (ATS).
+    Assess its formatting, structure, keyword density (relevant to general job applications),
+    clarity, and overall scannability by automated systems.
+
+    {_layout_findings(pre_score)}
+    Treat these findings as facts about the file's layout and formatting, and do not contradict them.
+    Base your own assessment mainly on the content: keywords, clarity, structure and impact.
+
+    Provide an ATS compatibility score out of 100.
+    Also, list specific, actionable suggestions to improve the resume's ATS score and general effectiveness.
+
+    Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
+    The JSON object should have the following structure:
+    {{
+        "ats_score": 0, // Integer score out of 100
+        "suggestions": [
+            "Suggestion 1",
+            "Suggestion 2",
+            // ... list of suggestions for improvement
+        ]
+    }}
+
+    Resume Text:
+    {text}
+    """
+    return prompt
+
+
+def _combined_v1(text: str) -> str:
+    """Analysis (as in analysis-v2) and ATS check (as in ats-v1) in one response."""
+    prompt = f"""
+    Analyze the following resume text in two ways and return both results in a single JSON object.
+    Under "analysis", extract key details and provide constructive suggestions for improvement.
+    Under "ats", assess the resume from the perspective of an Applicant Tracking System (ATS): its formatting,
+    structure, keyword density (relevant to general job applications), clarity, and overall scannability
+    by automated systems. Provide an ATS compatibility score out of 100 and specific, actionable
+    suggestions to improve the resume's ATS score and general effectiveness.
+
+    Format the output strictly as a JSON object. Do not include any markdown formatting like ```json.
+    The JSON object should have the following structure:
+    {{
+        "analysis": {{
+            "name": "Extracted Name",
+            "contact": {{
+                "email": "Extracted Email",
+                "phone": "Extracted Phone",
+                "linkedin": "Extracted LinkedIn URL (if available)",
+                "github": "Extracted GitHub URL (if available)",
+                "website": "Extracted Personal Website URL (if available)"
+            }},
+            "summary": "Extracted Summary/Objective (if available)",
+            "experience": [
+                {{
+                    "title": "Job Title",
+                    "company": "Company Name",
+                    "dates": "Start Date - End Date",
+                    "description": "Job Description/Responsibilities"
+                }}
+                // ... more experience entries
+            ],
+            "education": [
+                {{
+                    "degree": "Degree Name",
+                    "institution": "Institution Name",
+                    "dates": "Start Date - End Date or Graduation Year"
+                }}
+                // ... more education entries
+            ],
+            "skills": [
+                "Skill 1", "Skill 2", // ... list of skills
+            ],
+            "projects": [
+                 {{
+                    "name": "Project Name",
+                    "description": "Project Description",
+                    "link": "Project Link (if available)"
+                 }}
+                 // ... more project entries
+            ],
+            "certifications": [
+                 "Certification 1", "Certification 2", // ... list of certifications
+            ],
+            "awards": [
+                 "Award 1", "Award 2", // ... list of awards
+            ],
+            "suggestions_for_improvement": [
+                "Suggestion 1",
+                "Suggestion 2",
+                // ... list of suggestions
+            ]
+        }},
+        "ats": {{
+            "ats_score": 0, // Integer score out of 100
+            "suggestions": [
+                "Suggestion 1",
+                "Suggestion 2",
+                // ... list of suggestions for improvement
+            ]
+        }}
+    }}
+    Do not repeat the resume text itself in the output.
+
+    Resume Text:
+    {text}
+    """
+    return prompt
+
+
+def _roadmap_v1(roadmap_request: RoadmapRequest) -> str:
+    """Original roadmap prompt. Superseded: it has Gemini generate placeholder node positions the server replaces."""
+    # Construct a detailed prompt for Gemini
+    prompt = f"""
+    Generate a personalized career roadmap based on the following user information.
+    The roadmap should be structured as a series of steps and milestones to help the user transition
+    from their current role to their target role within the specified timeframe.
+    Include key skills to learn, projects to build, and potential learning resources or activities.
+    Consider the user's current skills, areas of interest, and preferred learning style.
+
+    Format the output strictly as a JSON object containing two arrays: "nodes" and "edges", suitable for visualization with React Flow.
+    Do not include any markdown formatting like ```json.
+
+    The "nodes" array should contain objects with the following structure:
+    {{
+        "id": "unique_node_id_string",
+        "type": "string_representing_node_type", // e.g., "start", "step", "milestone", "skill", "project", "end"
+        "data": {{ "label": "Node Title or Description" }}, # Data to be displayed in the node
+        "position": {{ "x": 0, "y": 0 }} # Placeholder position, frontend will handle layout
+    }}
+
+    The "edges" array should contain objects with the following structure:
+    {{
+        "id": "unique_edge_id_string", # e.g., "edge-start-step1"
+        "source": "source_node_id",
+        "target": "target_node_id",
+        "type": "string_representing_edge_type", # e.g., "smoothstep", "straight" (optional, default to "smoothstep")
+        "animated": boolean, # true or false (optional)
+        "label": "Edge Label" # Optional label for the edge
+    }}
+
+    Ensure the roadmap is logical, progressive, and achievable within the given timeframe.
+    Break down larger goals into smaller, manageable steps.
+    Include a clear start node (representing the current state) and an end node (representing achieving the target role).
+
+    User Information:
+    Current Role: {roadmap_request.current_role}
+    Target Role: {roadmap_request.target_role}
+    Years of Experience: {roadmap_request.years_of_experience}
+    Timeframe: {roadmap_request.timeframe}
+    Current Skills: {roadmap_request.current_skills}
+    Areas of Interest: {roadmap_request.areas_of_interest}
+    Preferred Learning Style: {roadmap_request.preferred_learning_style}
+    """
+    return prompt
+
+
+def _roadmap_v2(roadmap_request: RoadmapRequest) -> str:
+    """roadmap-v1 without node positions; the server lays the graph out itself (see layout.py)."""
+    # Construct a detailed prompt for Gemini
+    prompt = f"""
+    Generate a personalized career roadmap based on the following user information.
+    The roadmap should be structured as a series of steps and milestones to help the user transition
+    from their current role to their target role within the specified timeframe.
+    Include key skills to learn, projects to build, and potential learning resources or activities.
+    Consider the user's current skills, areas of interest, and preferred learning style.
+
+    Format the output strictly as a JSON object containing two arrays: "nodes" and "edges", suitable for visualization with React Flow.
+    Do not include any markdown formatting like ```json.
+
+    The "nodes" array should contain objects with the following structure:
+    {{
+        "id": "unique_node_id_string",
+        "type": "string_representing_node_type", // e.g., "start", "step", "milestone", "skill", "project", "end"
+        "data": {{ "label": "Node Title or Description" }} # Data to be displayed in the node
+    }}
+
+    The "edges" array should contain objects with the following structure:
+    {{
+        "id": "unique_edge_id_string", # e.g., "edge-start-step1"
+        "source": "source_node_id",
+        "target": "target_node_id",
+        "type": "string_representing_edge_type", # e.g., "smoothstep", "straight" (optional, default to "smoothstep")
+        "animated": boolean, # true or false (optional)
+        "label": "Edge Label" # Optional label for the edge
+    }}
+
+    Ensure the roadmap is logical, progressive, and achievable within the given timeframe.
+    Break down larger goals into smaller, manageable steps.
+    Include a clear start node (representing the current state) and an end node (representing achieving the target role).
+
+    User Information:
+    Current Role: {roadmap_request.current_role}
+    Target Role: {roadmap_request.target_role}
+    Years of Experience: {roadmap_request.years_of_experience}
+    Timeframe: {roadmap_request.timeframe}
+    Current Skills: {roadmap_request.current_skills}
+    Areas of Interest: {roadmap_request.areas_of_interest}
+    Preferred Learning Style: {roadmap_request.preferred_learning_style}
+    """
+    return prompt
+
+
+PROMPT_TEMPLATES = {
+    "analysis-v1": _analysis_v1,
+    "analysis-v2": _analysis_v2,
+    "ats-v1": _ats_v1,
+    "ats-v2": _ats_v2,
+    "roadmap-v1": _roadmap_v1,
+    "roadmap-v2": _roadmap_v2,
+    "combined-v1": _combined_v1,
+}
+
+
+def _roadmap_schema(node_positions: bool = True) -> dict:
+    schema = response_schema_for(RoadmapGraph, overrides={
+        "RoadmapNode": {
+            "data": {"type": "object", "properties": {"label": {"type": "string"}}, "required": ["label"]},
+            "position": {"type": "object", "properties": {"x": {"type": "number"}, "y": {"type": "number"}}, "required": ["x", "y"]},
+        },
+    })
+    if not node_positions:
+        node_schema = schema["properties"]["nodes"]["items"]
+        del node_schema["properties"]["position"]
+        node_schema["required"].remove("position")
+    return schema
+
+
+# Gemini response schemas (JSON mode) per template; templates without one only get JSON mode
+RESPONSE_SCHEMAS = {
+    "ats-v1": response_schema_for(ATSCheckResponse),
+    "ats-v2": response_schema_for(ATSCheckResponse),
+    "roadmap-v1": _roadmap_schema(),
+    "roadmap-v2": _roadmap_schema(node_positions=False),
+}
+
+
+def build_prompt(template_version: str, *args) -> str:
+    """Renders the template registered under template_version."""
+    return PROMPT_TEMPLATES[template_version](*args)
+
+
+# --- Token Accounting ---
+async def count_prompt_tokens(model_name: str, prompt: str) -> int:
+    """Input token count for a prompt, as reported by the Gemini count_tokens API."""
+    model = model_registry.get(model_name)
+    result = await model.count_tokens_async(prompt)
+    return result.total_tokens
+
+
+class TokenUsage:
+    """Per-template totals of the token counts Gemini reports for each generation."""
+
+    def __init__(self):
+        self._totals: dict[str, dict] = {}
+
+    def record(self, template_version: str, usage_metadata):
+        if usage_metadata is None:
+            return
+        totals = self._totals.setdefault(template_version, {"calls": 0, "prompt_tokens": 0, "output_tokens": 0})
+        totals["calls"] += 1
+        totals["prompt_tokens"] += getattr(usage_metadata, "prompt_token_count", 0) or 0
+        totals["output_tokens"] += getattr(usage_metadata, "candidates_token_count", 0) or 0
+
+    def stats(self) -> dict:
+        return {
+            version: {
+                **totals,
+                "avg_prompt_tokens": round(totals["prompt_tokens"] / totals["calls"], 1),
+                "avg_output_tokens": round(totals["output_tokens"] / totals["calls"], 1),
+            }
+            for version, totals in self._totals.items()
+        }
+
+
+# Shared token counters, reported on /stats/
+token_usage = TokenUsage()
@@ -0,0 +1,98 @@
+import os
+import copy
+import uuid
+import socket
+import asyncio
+
+from dotenv import load_dotenv
+from pymongo.errors import PyMongoError
+
+from database import db
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Single-flight Configuration ---
+# With several uvicorn workers, a Mongo lease lets one worker run a call while the others wait
+# for it and then pick the result up from the caches instead of repeating the work.
+SINGLEFLIGHT_DISTRIBUTED = os.getenv("SINGLEFLIGHT_DISTRIBUTED", "false").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_LEASE_SECONDS = float(os.getenv("SINGLEFLIGHT_LEASE_SECONDS", "90")) # Longer than the slowest Gemini call
+SINGLEFLIGHT_POLL_SECONDS = float(os.getenv("SINGLEFLIGHT_POLL_SECONDS", "0.25"))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution whose result they all share."""
+
+    def __init__(self, name: str, distributed: bool = SINGLEFLIGHT_DISTRIBUTED):
+        self.name = name
+        self.distributed = distributed
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.counters = {"executions": 0, "coalesced": 0, "remote_waits": 0}
+
+    async def do(self, key: str, fn):
+        """Runs fn() (a coroutine function) unless an identical call is already in flight, then shares its result."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            # Followers get their own copy, so one caller mutating the result cannot affect another
+            return copy.deepcopy(await asyncio.shield(task))
+
+        # Run as a separate task so the shared call survives the leader's client disconnecting
+        task = asyncio.create_task(self._run(key, fn))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception() # Mark the exception as retrieved even if every caller went away
+
+    async def _run(self, key: str, fn):
+        if not (self.distributed and db.is_connected):
+            self.counters["executions"] += 1
+            return await fn()
+
+        lease_key = f"{self.name}:{key}"
+        acquired = await self._acquire_or_wait(lease_key)
+        self.counters["executions"] += 1
+        try:
+            return await fn()
+        finally:
+            if acquired:
+                try:
+                    await db.leases.release(lease_key, self._owner)
+                except PyMongoError as e:
+                    print(f"Error releasing single-flight lease {lease_key}: {e}")
+
+    async def _acquire_or_wait(self, lease_key: str) -> bool:
+        """Takes the cross-worker lease, or waits for its holder to finish. Returns whether we hold it."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SINGLEFLIGHT_LEASE_SECONDS
+        waited = False
+        try:
+            while True:
+                if await db.leases.acquire(lease_key, self._owner, SINGLEFLIGHT_LEASE_SECONDS):
+                    return True
+                if not waited:
+                    waited = True
+                    self.counters["remote_waits"] += 1
+                # Another worker is running this call; once it is done our own call hits the caches
+                while loop.time() < deadline and await db.leases.is_held(lease_key):
+                    await asyncio.sleep(SINGLEFLIGHT_POLL_SECONDS)
+                if loop.time() >= deadline:
+                    return False
+        except PyMongoError as e:
+            # Coalescing is an optimization only; never fail the request because of it
+            print(f"Error using single-flight lease {lease_key}: {e}")
+            return False
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "distributed": self.distributed, **self.counters}
+
+
+# Shared registries: one for PDF extraction, one for the Gemini calls keyed by endpoint and content hash
+extraction_flights = SingleFlight("extract")
+gemini_flights = SingleFlight("gemini")
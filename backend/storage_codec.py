@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import zlib
+import asyncio
+
+from bson import Binary
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from database import db
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Storage Codec Configuration ---
+# Roadmap graphs and resume analyses are stored as versioned, zlib-compressed blobs
+# ("roadmap_blob" / "analysis_blob"). Readers accept both these and the plain legacy fields.
+STORAGE_CODEC_ENABLED = os.getenv("STORAGE_CODEC_ENABLED", "true").lower() in ("1", "true", "yes")
+STORAGE_COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "6"))
+CODEC_VERSION = 1
+MIGRATION_BATCH_SIZE = 200
+
+_NODE_FIELDS = ("id", "type", "data", "position")
+_EDGE_FIELDS = ("id", "source", "target", "type", "animated", "label")
+
+
+def _pack(payload) -> dict:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    return {"v": CODEC_VERSION, "codec": "zlib", "data": Binary(zlib.compress(raw, STORAGE_COMPRESSION_LEVEL))}
+
+
+def _unpack(blob: dict):
+    if blob.get("v") != CODEC_VERSION or blob.get("codec") != "zlib":
+        raise ValueError(f"Unsupported storage blob version {blob.get('v')} / codec {blob.get('codec')}")
+    return json.loads(zlib.decompress(blob["data"]))
+
+
+# --- Roadmap Graphs ---
+# Version 1 layout (before compression):
+#   {"types": [...interned node/edge type strings...],
+#    "nodes": [[id, type_index, data, [x, y] or position dict, extra fields or omitted], ...],
+#    "edges": [[source, target, id, type_index, animated, label, extra fields or omitted], ...]}
+# An edge endpoint that names a node is stored as {"i": index into "nodes"}; any other endpoint keeps
+# its original value, so numeric node IDs are never mistaken for indexes.
+
+def encode_roadmap(roadmap_data: dict) -> dict:
+    types: list[str] = []
+    type_index: dict = {}
+
+    def intern(value):
+        if value is None:
+            return None
+        if value not in type_index:
+            type_index[value] = len(types)
+            types.append(value)
+        return type_index[value]
+
+    nodes = []
+    node_index = {}
+    for node in roadmap_data.get("nodes", []):
+        position = node.get("position")
+        if isinstance(position, dict) and set(position) == {"x", "y"}:
+            position = [position["x"], position["y"]]
+        packed = [node.get("id"), intern(node.get("type")), node.get("data"), position]
+        extras = {k: v for k, v in node.items() if k not in _NODE_FIELDS}
+        if extras:
+            packed.append(extras)
+        node_index.setdefault(node.get("id"), len(nodes))
+        nodes.append(packed)
+
+    edges = []
+    for edge in roadmap_data.get("edges", []):
+        source, target = edge.get("source"), edge.get("target")
+        packed = [
+            {"i": node_index[source]} if source in node_index else source,
+            {"i": node_index[target]} if target in node_index else target,
+            edge.get("id"), intern(edge.get("type")), edge.get("animated"), edge.get("label"),
+        ]
+        extras = {k: v for k, v in edge.items() if k not in _EDGE_FIELDS}
+        if extras:
+            packed.append(extras)
+        edges.append(packed)
+
+    # Anything besides the graph (rare) is carried along untouched
+    rest = {k: v for k, v in roadmap_data.items() if k not in ("nodes", "edges")}
+    return _pack({"types": types, "nodes": nodes, "edges": edges, "rest": rest})
+
+
+def decode_roadmap(blob: dict) -> dict:
+    payload = _unpack(blob)
+    types = payload["types"]
+    nodes = []
+    for packed in payload["nodes"]:
+        node_id, type_idx, data, position = packed[:4]
+        if isinstance(position, list):
+            position = {"x": position[0], "y": position[1]}
+        node = {"id": node_id, "type": None if type_idx is None else types[type_idx], "data": data, "position": position}
+        if len(packed) > 4:
+            node.update(packed[4])
+        nodes.append(node)
+
+    def endpoint(value):
+        return nodes[value["i"]]["id"] if isinstance(value, dict) else value
+
+    edges = []
+    for packed in payload["edges"]:
+        source, target, edge_id, type_idx, animated, label = packed[:6]
+        edge = {
+            "id": edge_id, "source": endpoint(source), "target": endpoint(target),
+            "type": None if type_idx is None else types[type_idx], "animated": animated, "label": label,
+        }
+        # Fields the model never set were absent originally; don't invent them
+        edge = {k: v for k, v in edge.items() if v is not None}
+        if len(packed) > 6:
+            edge.update(packed[6])
+        edges.append(edge)
+    return {**payload.get("rest", {}), "nodes": nodes, "edges": edges}
+
+
+def roadmap_storage_fields(roadmap_data: dict) -> dict:
+    """The fields a roadmap document stores for its graph."""
+    counts = {"node_count": len(roadmap_data.get("nodes", [])), "edge_count": len(roadmap_data.get("edges", []))}
+    if not STORAGE_CODEC_ENABLED:
+        return {"roadmap_data": roadmap_data, **counts}
+    return {"roadmap_blob": encode_roadmap(roadmap_data), **counts}
+
+
+def load_roadmap_graph(roadmap_doc: dict) -> dict:
+    """Returns the nodes/edges of a stored roadmap, decoding the blob only now that they are needed."""
+    if roadmap_doc.get("roadmap_blob") is not None:
+        return decode_roadmap(roadmap_doc["roadmap_blob"])
+    return roadmap_doc.get("roadmap_data") or {}
+
+
+# --- Resume Analyses ---
+# The whole analysis is stored, raw_text included: it is the normalized text the analysis was made
+# from, which cannot be rebuilt from extracted_texts (that holds the text as extracted).
+
+def encode_analysis(analysis_data: dict) -> dict:
+    return _pack(analysis_data)
+
+
+def decode_analysis(blob: dict) -> dict:
+    return _unpack(blob)
+
+
+def analysis_storage_fields(analysis_data: dict) -> dict:
+    """The fields a resume document stores for its analysis."""
+    if not STORAGE_CODEC_ENABLED:
+        return {"analysis_data": analysis_data}
+    return {"analysis_blob": encode_analysis(analysis_data), "analysis_data": None}
+
+
+def load_analysis(resume_doc: dict) -> dict | None:
+    """Returns the stored analysis of a resume document, from the blob or the legacy field."""
+    if resume_doc.get("analysis_blob") is not None:
+        return decode_analysis(resume_doc["analysis_blob"])
+    return resume_doc.get("analysis_data")
+
+
+# --- Migration ---
+async def _migrate_collection(collection, legacy_field: str, blob_field: str, build_update, dry_run: bool) -> tuple[int, int]:
+    """Re-encodes documents that still carry legacy_field. Returns (documents, bytes saved)."""
+    migrated = saved = 0
+    batch = []
+    cursor = collection.find({legacy_field: {"$type": "object"}}, {legacy_field: 1})
+    async for doc in cursor:
+        update = build_update(doc[legacy_field])
+        saved += len(json.dumps(doc[legacy_field], default=str)) - len(update[blob_field]["data"])
+        batch.append(UpdateOne({"_id": doc["_id"], legacy_field: {"$exists": True}}, {"$set": update, "$unset": {legacy_field: ""}}))
+        migrated += 1
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            if not dry_run:
+                await collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch and not dry_run:
+        await collection.bulk_write(batch, ordered=False)
+    return migrated, saved
+
+
+async def migrate(dry_run: bool = False):
+    """Encodes every roadmap graph and resume analysis still stored in the plain legacy format."""
+    roadmaps, roadmap_saved = await _migrate_collection(
+        db.roadmaps.collection, "roadmap_data", "roadmap_blob",
+        lambda roadmap_data: {
+            "roadmap_blob": encode_roadmap(roadmap_data),
+            "node_count": len(roadmap_data.get("nodes", [])),
+            "edge_count": len(roadmap_data.get("edges", [])),
+        },
+        dry_run
+    )
+    resumes, resume_saved = await _migrate_collection(
+        db.resumes.collection, "analysis_data", "analysis_blob", lambda analysis_data: {"analysis_blob": encode_analysis(analysis_data)}, dry_run
+    )
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"{verb} {roadmaps} roadmaps (~{roadmap_saved // 1024} KB saved) and {resumes} resume analyses (~{resume_saved // 1024} KB saved).")
+
+
+async def _main(argv: list[str]) -> int:
+    if not argv or argv[0] != "migrate":
+        print("Usage: python storage_codec.py migrate [--dry-run]")
+        return 2
+    await db.connect()
+    if not db.is_connected:
+        return 1
+    try:
+        await migrate(dry_run="--dry-run" in argv)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,170 @@
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a streamed top-level JSON object (e.g. Gemini output arriving in chunks).
+
+    feed() returns events as soon as they are complete:
+      ("field", key, value) when a top-level field's value is complete, and
+      ("item", key, value) for each element of a top-level array listed in item_keys.
+    Anything before the first "{" (such as a ```json fence or prose) and after the closing "}" is ignored.
+    """
+
+    def __init__(self, item_keys=()):
+        self.item_keys = set(item_keys)
+        self.done = False # True once the top-level object has closed
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        # Top-level (depth 1) state
+        self._expect = "key" # "key", "colon", "value" or "comma"
+        self._key = None
+        self._token_start = None
+        self._value_kind = None # "string", "container" or "scalar"
+        # Array item (depth 2) state, only for keys in item_keys
+        self._streaming_items = False
+        self._item_start = None
+        self._item_kind = None
+
+    def feed(self, chunk: str) -> list:
+        self._buf += chunk
+        events = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_closed(i, events)
+                continue
+            if self.done:
+                break
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_opened(i)
+            elif c in "{[":
+                self._opened(i, c)
+                self._depth += 1
+            elif c in "}]":
+                self._before_close(i, events)
+                self._depth -= 1
+                self._closed(i, events)
+            elif c == ",":
+                self._comma(i, events)
+            elif c == ":":
+                if self._depth == 1 and self._expect == "colon":
+                    self._expect = "value"
+                    self._value_kind = None
+            elif not c.isspace():
+                self._scalar_char(i)
+        self._pos = len(buf)
+        return events
+
+    # --- Helpers ---
+    def _emit(self, events: list, kind: str, key, raw: str):
+        try:
+            events.append((kind, key, json.loads(raw)))
+        except json.JSONDecodeError:
+            pass # Malformed fragment: the final full parse decides what to do about it
+
+    def _in_items(self) -> bool:
+        return self._depth == 2 and self._streaming_items
+
+    def _string_opened(self, i: int):
+        if self._depth == 1 and self._expect in ("key", "value"):
+            self._token_start = i
+            if self._expect == "value":
+                self._value_kind = "string"
+        elif self._in_items() and self._item_start is None:
+            self._item_start, self._item_kind = i, "string"
+
+    def _string_closed(self, i: int, events: list):
+        if self._depth == 1 and self._expect == "key":
+            try:
+                self._key = json.loads(self._buf[self._token_start:i + 1])
+            except json.JSONDecodeError:
+                self._key = None
+            self._expect = "colon"
+        elif self._depth == 1 and self._expect == "value" and self._value_kind == "string":
+            self._emit(events, "field", self._key, self._buf[self._token_start:i + 1])
+            self._expect = "comma"
+        elif self._in_items() and self._item_kind == "string" and self._item_start is not None:
+            self._emit(events, "item", self._key, self._buf[self._item_start:i + 1])
+            self._item_start = None
+
+    def _opened(self, i: int, c: str):
+        if self._depth == 1 and self._expect == "value" and self._value_kind is None:
+            self._token_start = i
+            self._value_kind = "container"
+            self._streaming_items = c == "[" and self._key in self.item_keys
+        elif self._in_items() and self._item_start is None:
+            self._item_start, self._item_kind = i, "container"
+
+    def _before_close(self, i: int, events: list):
+        # A scalar is terminated by the bracket that closes its parent
+        if self._in_items() and self._item_kind == "scalar" and self._item_start is not None:
+            self._emit(events, "item", self._key, self._buf[self._item_start:i].strip())
+            self._item_start = None
+        elif self._depth == 1 and self._expect == "value" and self._value_kind == "scalar":
+            self._emit(events, "field", self._key, self._buf[self._token_start:i].strip())
+            self._expect = "comma"
+
+    def _closed(self, i: int, events: list):
+        if self._depth == 0:
+            self.done = True
+        elif self._depth == 1 and self._expect == "value" and self._value_kind == "container":
+            self._emit(events, "field", self._key, self._buf[self._token_start:i + 1])
+            self._streaming_items = False
+            self._expect = "comma"
+        elif self._in_items() and self._item_kind == "container" and self._item_start is not None:
+            self._emit(events, "item", self._key, self._buf[self._item_start:i + 1])
+            self._item_start = None
+
+    def _comma(self, i: int, events: list):
+        if self._depth == 1:
+            if self._expect == "value" and self._value_kind == "scalar":
+                self._emit(events, "field", self._key, self._buf[self._token_start:i].strip())
+            if self._expect in ("value", "comma"):
+                self._expect = "key"
+        elif self._in_items() and self._item_kind == "scalar" and self._item_start is not None:
+            self._emit(events, "item", self._key, self._buf[self._item_start:i].strip())
+            self._item_start = None
+
+    def _scalar_char(self, i: int):
+        if self._depth == 1 and self._expect == "value" and self._value_kind is None:
+            self._token_start = i
+            self._value_kind = "scalar"
+        elif self._in_items() and self._item_start is None:
+            self._item_start, self._item_kind = i, "scalar"
+
+
+# --- Wire formats ---
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def stream_media_type(accept_header: str | None) -> str:
+    """Streams as Server-Sent Events when the client asks for them, NDJSON otherwise."""
+    if accept_header and SSE_MEDIA_TYPE in accept_header:
+        return SSE_MEDIA_TYPE
+    return NDJSON_MEDIA_TYPE
+
+
+def format_stream_event(media_type: str, event: str, data) -> str:
+    """Serializes one stream event as an NDJSON line or an SSE message."""
+    if media_type == SSE_MEDIA_TYPE:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
@@ -0,0 +1,189 @@
+import os
+import asyncio
+
+import fitz # PyMuPDF
+import pytest
+
+from ats_rules import score_layout, ATS_RULES_VERSION
+from extraction import ExtractionExecutor, _extract_layout_worker, EXTRACTION_MAX_PAGES
+
+SAMPLE_UPLOAD = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "uploads", "682c2e9eaadb09785c3eee0b", "1d81bc4c-dd0e-4aad-a90c-4cbe0c0014da.pdf",
+)
+
+RESUME = """Jordan Example
+jordan@example.com | +1 555 010 0199
+
+SUMMARY
+Backend engineer with seven years of experience building payment services.
+
+EXPERIENCE
+Senior Engineer, Acme Corp, 2019 - 2024
+- Led the migration of billing to an event-driven design
+- Reduced checkout latency by 35% through caching
+- Built a reconciliation service processing $2M per day
+- Mentored four engineers and improved onboarding
+- Designed the public API used by partners
+
+EDUCATION
+BSc Computer Science, Example University, 2013 - 2017
+
+SKILLS
+Python, Go, PostgreSQL, Kafka, Kubernetes"""
+
+SCANNED_FAILURES = [
+    "text_layer", "no_images", "experience_heading", "education_heading", "skills_heading",
+    "email", "phone", "action_verbs", "quantified_results",
+]
+
+# Expected (score, failed rules) per fixture, per rule set version. Bumping ATS_RULES_VERSION means
+# reviewing these against the new rules and adding the new version's expectations.
+EXPECTED = {
+    "ats-rules-v1": {
+        "clean": (100, []),
+        "three_pages": (96, ["length"]),
+        "nonstandard_font": (92, ["standard_fonts"]),
+        "image": (95, ["no_images"]),
+        "two_columns": (85, ["single_column"]),
+        "table": (90, ["no_tables"]),
+        "right_aligned_dates": (100, []),
+        "scanned": (0, SCANNED_FAILURES),
+        "sample_upload": (95, ["action_verbs"]),
+    },
+}
+
+
+# --- Fixture PDFs ---
+def _write_text(page, text: str, rect=fitz.Rect(50, 50, 560, 800), fontname: str = "helv"):
+    page.insert_textbox(rect, text, fontsize=10, fontname=fontname)
+
+
+def _pixmap():
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(200)
+    return pixmap
+
+
+def _clean(doc):
+    _write_text(doc.new_page(), RESUME)
+
+
+def _three_pages(doc):
+    for _ in range(3):
+        _write_text(doc.new_page(), RESUME)
+
+
+def _nonstandard_font(doc):
+    page = doc.new_page()
+    page.insert_font(fontname="F0", fontbuffer=fitz.Font("cjk").buffer)
+    _write_text(page, RESUME, fontname="F0")
+
+
+def _image(doc):
+    page = doc.new_page()
+    _write_text(page, RESUME)
+    page.insert_image(fitz.Rect(480, 40, 540, 100), pixmap=_pixmap())
+
+
+def _two_columns(doc):
+    page = doc.new_page()
+    sidebar = "Jordan Example\njordan@example.com\n+1 555 010 0199\n\nSKILLS\nPython\nGo\nPostgreSQL\nKafka\nKubernetes\n\nEDUCATION\nBSc Computer Science\nExample University"
+    main = RESUME.split("\n\nEDUCATION")[0].split("\n", 2)[2].strip()
+    _write_text(page, sidebar, fitz.Rect(40, 50, 250, 800))
+    _write_text(page, main, fitz.Rect(300, 50, 560, 800))
+
+
+def _table(doc):
+    page = doc.new_page()
+    _write_text(page, RESUME.rsplit("\n", 1)[0])
+    top = 420
+    for row in (("Python", "Go", "SQL"), ("Kafka", "Redis", "AWS"), ("Docker", "Linux", "Git")):
+        for column, cell in enumerate(row):
+            rect = fitz.Rect(50 + column * 120, top, 170 + column * 120, top + 20)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+            page.insert_text((rect.x0 + 4, rect.y0 + 14), cell, fontsize=10, fontname="helv")
+        top += 20
+
+
+def _right_aligned_dates(doc):
+    # Dates tabbed to the right margin share rows with the left text but are not a second column
+    page = doc.new_page()
+    _write_text(page, RESUME)
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", ()):
+            if line["spans"][0]["text"].startswith(("Senior Engineer", "BSc", "- ")):
+                page.insert_text((480, line["spans"][0]["origin"][1]), "2019 - 2024", fontsize=10, fontname="helv")
+
+
+def _scanned(doc):
+    doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=_pixmap())
+
+
+BUILDERS = {
+    "clean": _clean,
+    "three_pages": _three_pages,
+    "nonstandard_font": _nonstandard_font,
+    "image": _image,
+    "two_columns": _two_columns,
+    "table": _table,
+    "right_aligned_dates": _right_aligned_dates,
+    "scanned": _scanned,
+}
+
+
+@pytest.fixture(scope="module")
+def fixture_pdfs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("ats_fixtures")
+    paths = {"sample_upload": SAMPLE_UPLOAD}
+    for name, build in BUILDERS.items():
+        doc = fitz.open()
+        build(doc)
+        paths[name] = str(directory / f"{name}.pdf")
+        doc.save(paths[name])
+        doc.close()
+    return paths
+
+
+def _failed(result: dict) -> list[str]:
+    return [check["id"] for check in result["checks"] if not check["passed"]]
+
+
+# --- Tests ---
+def test_current_rules_version_has_expectations():
+    assert ATS_RULES_VERSION in EXPECTED, f"Add fixture expectations for {ATS_RULES_VERSION}"
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED[ATS_RULES_VERSION]))
+def test_fixture_scores(fixture_pdfs, name):
+    expected_score, expected_failed = EXPECTED[ATS_RULES_VERSION][name]
+    result = score_layout(_extract_layout_worker(fixture_pdfs[name], EXTRACTION_MAX_PAGES))
+
+    assert result["rules_version"] == ATS_RULES_VERSION
+    assert result["mode"] == "fast"
+    assert _failed(result) == expected_failed
+    assert result["ats_score"] == expected_score
+    # One suggestion per failed rule, and the score is 100 minus their penalties
+    assert len(result["suggestions"]) == len(expected_failed)
+    assert result["ats_score"] == max(0, 100 - sum(check["penalty"] for check in result["checks"]))
+
+
+def test_extraction_executor_collects_layout(fixture_pdfs):
+    executor = ExtractionExecutor(kind="thread", workers=1)
+    try:
+        features = asyncio.run(executor.extract_layout(fixture_pdfs["image"]))
+    finally:
+        executor.shutdown()
+
+    assert features["page_count"] == 1
+    assert features["image_count"] == 1
+    assert "jordan@example.com" in features["text"]
+    assert score_layout(features)["ats_score"] == EXPECTED[ATS_RULES_VERSION]["image"][0]
+
+
+def test_penalties_are_clamped_at_zero():
+    features = {"page_count": 9, "text": "", "font_chars": {"wingdings": 10}, "image_count": 3, "table_count": 2, "multi_column_pages": 1}
+    result = score_layout(features)
+
+    assert result["ats_score"] == 0
+    assert all(not check["passed"] for check in result["checks"])
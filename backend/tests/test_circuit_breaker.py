@@ -0,0 +1,69 @@
+import time
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+
+import pipelines
+from circuit_breaker import CircuitBreaker
+
+
+class _Model:
+    def __init__(self):
+        self.error = None
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return "response"
+
+
+def _charged_request(model):
+    """What a synchronous endpoint does: the pre-charge check, then its own Gemini call."""
+    pipelines.ensure_gemini_available()
+    return asyncio.run(pipelines.request_gemini(model, "prompt"))
+
+
+def test_half_open_probe_closes_the_breaker_through_one_request(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=0.05)
+    monkeypatch.setattr(pipelines, "gemini_breaker", breaker)
+    model = _Model()
+
+    model.error = google_exceptions.ServiceUnavailable("down")
+    for _ in range(2):
+        with pytest.raises(google_exceptions.ServiceUnavailable):
+            _charged_request(model)
+    assert breaker.state == "open"
+
+    # Open: rejected before the charge, without calling Gemini
+    with pytest.raises(HTTPException) as rejected:
+        _charged_request(model)
+    assert rejected.value.status_code == 503 and model.calls == 2
+
+    # After the cool-down the pre-charge check leaves the probe slot to the request's own call
+    time.sleep(0.06)
+    model.error = None
+    assert _charged_request(model) == "response"
+    assert breaker.state == "closed" and model.calls == 3
+
+
+def test_failed_probe_reopens_and_unrelated_outcomes_release_it():
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    probe = breaker.acquire()
+    assert breaker.state == "half_open"
+    with pytest.raises(HTTPException):
+        breaker.acquire() # One probe at a time
+
+    breaker.release(probe) # E.g. a 400 for this request, or the client went away
+    breaker.allow()
+    probe = breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(HTTPException):
+        breaker.allow()
@@ -0,0 +1,61 @@
+import asyncio
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect
+
+import credits
+from credits import refund_credits
+from database import UserRepository, CreditTransactionRepository
+from indexes import INDEX_MANIFEST
+
+
+class _Database:
+    """A standalone server: no transactions."""
+    is_connected = True
+    supports_transactions = False
+
+    def __init__(self):
+        client = AsyncMongoMockClient()["test"]
+        self.users = UserRepository(client["users"])
+        self.credit_transactions = CreditTransactionRepository(client["credit_transactions"])
+
+
+def test_refund_survives_a_failed_balance_update_on_a_standalone_server(monkeypatch):
+    database = _Database()
+    monkeypatch.setattr(credits, "db", database)
+    increment_credits = database.users.increment_credits
+    failures = [AutoReconnect("connection reset")]
+
+    async def flaky_increment(user_id, amount, session=None):
+        if failures:
+            raise failures.pop()
+        return await increment_credits(user_id, amount, session=session)
+
+    monkeypatch.setattr(database.users, "increment_credits", flaky_increment)
+
+    async def scenario():
+        await database.credit_transactions.collection.create_indexes(INDEX_MANIFEST["credit_transactions"])
+        user_id = await database.users.create({"email": "u@example.com", "credits": 5})
+        charge = {"_id": ObjectId(), "user_id": user_id, "type": "deduction", "feature": "Roadmap Generator", "amount": -3}
+
+        async def balance():
+            return (await database.users.find_by_id(user_id))["credits"]
+
+        # The balance update fails: the claimed refund stays pending instead of counting as done
+        await refund_credits(charge, "failed")
+        assert await balance() == 5 and not charge.get("refunded")
+        assert (await database.credit_transactions.find_refund(charge["_id"]))["status"] == "pending"
+
+        # The next attempt for the charge finishes it
+        await refund_credits(charge, "failed")
+        entry = await database.credit_transactions.find_refund(charge["_id"])
+        assert await balance() == 8 and charge["refunded"]
+        assert entry["status"] == "applied" and entry["balance_after"] == 8
+
+        # Another attempt (e.g. from another worker, without the in-memory flag) refunds nothing more
+        await refund_credits({**charge, "refunded": False}, "failed again")
+        assert await balance() == 8
+        assert await database.credit_transactions.collection.count_documents({"refund_of": charge["_id"]}) == 1
+
+    asyncio.run(scenario())
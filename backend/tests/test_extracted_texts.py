@@ -0,0 +1,34 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from database import ExtractedTextRepository
+from indexes import INDEX_MANIFEST, EXTRACTED_TEXT_RETENTION_DAYS
+
+
+def test_extracted_texts_expire_by_last_use():
+    (index,) = INDEX_MANIFEST["extracted_texts"]
+    assert index.document["key"] == {"last_used": 1}
+    assert index.document["expireAfterSeconds"] == int(EXTRACTED_TEXT_RETENTION_DAYS * 86400)
+
+
+def test_hits_refresh_last_used():
+    collection = AsyncMongoMockClient()["test"]["extracted_texts"]
+    repository = ExtractedTextRepository(collection)
+
+    async def scenario():
+        await repository.save("hash", "text")
+        stored = await collection.find_one({"_id": "hash"})
+        assert stored["last_used"] == stored["created_at"]
+
+        await asyncio.sleep(0.01)
+        hit = await repository.find("hash")
+        assert hit["text"] == "text"
+        refreshed = await collection.find_one({"_id": "hash"})
+        assert refreshed["last_used"] > stored["last_used"]
+        assert refreshed["created_at"] == stored["created_at"]
+
+        assert await repository.find("missing") is None
+        assert await collection.count_documents({}) == 1
+
+    asyncio.run(scenario())
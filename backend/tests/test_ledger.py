@@ -0,0 +1,97 @@
+import asyncio
+
+import ledger
+from ledger import LedgerWriter
+
+
+class _Transactions:
+    def __init__(self):
+        self.docs = []
+        self.failing = True
+
+    async def insert_batch(self, docs):
+        if self.failing:
+            raise RuntimeError("write failed")
+        self.docs.extend(docs)
+
+
+class _Database:
+    is_connected = True
+
+    def __init__(self):
+        self.credit_transactions = _Transactions()
+
+
+def test_batches_survive_failed_writes_and_spills(monkeypatch, tmp_path):
+    database = _Database()
+    monkeypatch.setattr(ledger, "db", database)
+    # A spill path inside a missing directory makes every spill fail
+    writer = LedgerWriter(enabled=True, batch_size=2, flush_interval=0.02, spill_path=str(tmp_path / "missing" / "spill.jsonl"))
+
+    async def scenario():
+        await writer.start()
+        for n in range(5):
+            writer.enqueue({"_id": n})
+        await asyncio.sleep(0.2)
+        stats = writer.stats()
+        assert stats["queue_depth"] == 5 and stats["flusher_alive"]
+        assert stats["spill_errors"] >= 1 and stats["last_error"].startswith("spill:")
+
+        database.credit_transactions.failing = False
+        await asyncio.sleep(0.2)
+        assert writer.stats()["queue_depth"] == 0
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert sorted(doc["_id"] for doc in database.credit_transactions.docs) == [0, 1, 2, 3, 4]
+
+
+def test_enqueue_restarts_a_dead_flusher(monkeypatch, tmp_path):
+    database = _Database()
+    database.credit_transactions.failing = False
+    monkeypatch.setattr(ledger, "db", database)
+    writer = LedgerWriter(enabled=True, batch_size=10, flush_interval=0.02, spill_path=str(tmp_path / "spill.jsonl"))
+
+    async def scenario():
+        await writer.start()
+        writer._task.cancel()
+        await asyncio.sleep(0.01)
+        assert not writer.stats()["flusher_alive"]
+
+        writer.enqueue({"_id": 1})
+        await asyncio.sleep(0.1)
+        stats = writer.stats()
+        assert stats["flusher_alive"] and stats["flusher_restarts"] == 1 and stats["queue_depth"] == 0
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert database.credit_transactions.docs == [{"_id": 1}]
+
+
+def test_replay_keeps_valid_entries_of_a_truncated_spill(monkeypatch, tmp_path):
+    database = _Database()
+    monkeypatch.setattr(ledger, "db", database)
+    spill_path = tmp_path / "spill.jsonl"
+    # A crash while spilling leaves the last line cut short
+    spill_path.write_text('{"_id": 1}\n{"_id": 2}\n{"_id": 3, "amou', encoding="utf-8")
+    writer = LedgerWriter(enabled=True, batch_size=10, flush_interval=0.02, spill_path=str(spill_path))
+
+    def spill_fails(batch):
+        raise OSError("disk full")
+
+    # Mongo is still down and the entries cannot be spilled again either: the replay file must
+    # survive for the next start
+    monkeypatch.setattr(writer, "_spill", spill_fails)
+    asyncio.run(writer.replay_spill())
+    assert writer.stats()["queue_depth"] == 2 and writer.counters["rejected"] == 1
+    assert len(list(tmp_path.glob("spill.jsonl.replay-*"))) == 1
+    assert (tmp_path / "spill.jsonl.rejected").read_text(encoding="utf-8") == '{"_id": 3, "amou\n'
+
+    # The next start picks the replay file up again, without rejecting the bad line twice
+    database.credit_transactions.failing = False
+    restarted = LedgerWriter(enabled=True, batch_size=10, flush_interval=0.02, spill_path=str(spill_path))
+
+    asyncio.run(restarted.replay_spill())
+    assert sorted(doc["_id"] for doc in database.credit_transactions.docs) == [1, 2]
+    assert restarted.counters["rejected"] == 0 and restarted.stats()["queue_depth"] == 0
+    assert not list(tmp_path.glob("spill.jsonl*replay*"))
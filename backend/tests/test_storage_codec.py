@@ -0,0 +1,40 @@
+from storage_codec import (
+    encode_analysis, decode_analysis, load_analysis, analysis_storage_fields, encode_roadmap, decode_roadmap,
+)
+
+ANALYSIS = {
+    "name": "Jordan Example",
+    "contact": {"email": "jordan@example.com", "phone": "+1 555 0100"},
+    "skills": ["Python", "Go"],
+    "raw_text": "Jordan Example\njordan@example.com\n\nEXPERIENCE\nBuilt things",
+}
+
+
+def test_analysis_round_trip_keeps_raw_text():
+    assert decode_analysis(encode_analysis(ANALYSIS)) == ANALYSIS
+
+
+def test_load_analysis_reads_blob_and_legacy_documents():
+    stored = analysis_storage_fields(ANALYSIS)
+    assert load_analysis(stored) == ANALYSIS
+    assert load_analysis({"analysis_data": ANALYSIS}) == ANALYSIS
+    assert load_analysis({"analysis_data": None}) is None
+
+
+def _roadmap(node_ids: list, edges: list[tuple]) -> dict:
+    return {
+        "nodes": [{"id": node_id, "type": "step", "data": {"label": str(node_id)}, "position": {"x": 0, "y": 0}} for node_id in node_ids],
+        "edges": [{"id": f"e{n}", "source": source, "target": target, "type": "smoothstep"} for n, (source, target) in enumerate(edges)],
+    }
+
+
+def test_roadmap_round_trip_with_numeric_node_ids():
+    # Integer IDs that are also valid (but different) node indexes, plus a dangling numeric endpoint
+    roadmap = _roadmap([3, 2, 1, 0], [(3, 2), (2, 1), (1, 0), (0, 7)])
+    assert decode_roadmap(encode_roadmap(roadmap)) == roadmap
+
+
+def test_roadmap_round_trip_with_string_ids_and_dangling_endpoints():
+    roadmap = _roadmap(["start", "a", "end"], [("start", "a"), ("a", "end"), ("a", "missing"), ("end", 0)])
+    assert decode_roadmap(encode_roadmap(roadmap)) == roadmap
+
@@ -0,0 +1,35 @@
+from text_normalize import normalize_resume_text, PAGE_BREAK
+
+HEADER = ["Jane Doe", "jane@x.com | 555-123-4567"]
+
+
+def _resume(pages: list[list[str]]) -> str:
+    return PAGE_BREAK.join("\n".join(HEADER + body + ["Page {} of {}".format(n + 1, len(pages))]) for n, body in enumerate(pages))
+
+
+def test_header_repeated_on_every_page_is_kept_once():
+    text, report = normalize_resume_text(_resume([
+        ["EXPERIENCE", "Engineer, Acme, 2019 - 2023", "Built the billing service"],
+        ["EDUCATION", "BSc Computer Science, 2015 - 2019"],
+    ]), budget_tokens=0)
+
+    assert text.count("Jane Doe") == 1
+    assert text.count("jane@x.com | 555-123-4567") == 1
+    assert text.startswith("Jane Doe\njane@x.com | 555-123-4567")
+    assert "Page 1 of 2" not in text and "Page 2 of 2" not in text
+    assert report["repeated_lines_removed"] == 4 # The second copy of both header lines and both footers
+
+
+def test_header_repeated_on_most_pages_keeps_body_text():
+    text, _ = normalize_resume_text(_resume([["EXPERIENCE", "Engineer"], ["Led a team"], ["SKILLS", "Python"]]), budget_tokens=0)
+
+    assert text.count("Jane Doe") == 1
+    for line in ("EXPERIENCE", "Engineer", "Led a team", "SKILLS", "Python"):
+        assert line in text
+
+
+def test_single_page_resume_is_untouched_apart_from_page_numbers():
+    text, report = normalize_resume_text("\n".join(HEADER + ["SUMMARY", "Backend engineer", "1"]), budget_tokens=0)
+
+    assert text == "\n".join(HEADER + ["SUMMARY", "Backend engineer"])
+    assert report["repeated_lines_removed"] == 1
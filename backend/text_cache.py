@@ -0,0 +1,91 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from pymongo.errors import PyMongoError
+
+from database import db
+from extraction import extraction_executor
+from singleflight import extraction_flights
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Extracted Text Cache Configuration ---
+TEXT_CACHE_MAX_ENTRIES = int(os.getenv("TEXT_CACHE_MAX_ENTRIES", "256")) # In-process LRU tier in front of Mongo
+HASH_CHUNK_SIZE = 1024 * 1024 # 1 MB
+
+
+def sha256_file(file_path: str) -> str:
+    """Computes the SHA-256 hex digest of a file, reading it in chunks."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ExtractedTextCache:
+    """Content-addressed cache of extracted PDF text: in-process LRU in front of the extracted_texts collection."""
+
+    def __init__(self, max_entries: int = TEXT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def _remember(self, content_hash: str, text: str):
+        self._entries[content_hash] = text
+        self._entries.move_to_end(content_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False) # Evict the least recently used entry
+
+    async def get_text(self, content_hash: str, file_path: str) -> str:
+        """Returns the text for a content hash, extracting it from file_path only on a full miss."""
+        if content_hash in self._entries:
+            self._entries.move_to_end(content_hash)
+            return self._entries[content_hash]
+
+        # Concurrent requests for the same content share one lookup/extraction
+        return await extraction_flights.do(content_hash, lambda: self._load(content_hash, file_path))
+
+    async def _load(self, content_hash: str, file_path: str) -> str:
+        try:
+            cached_doc = await db.extracted_texts.find(content_hash)
+        except PyMongoError as e:
+            print(f"Error reading extracted text cache for {content_hash}: {e}")
+            cached_doc = None
+        if cached_doc is not None:
+            self._remember(content_hash, cached_doc["text"])
+            return cached_doc["text"]
+
+        # Full miss: run PyMuPDF (raises ExtractionError on failure)
+        text = await extraction_executor.extract_text(file_path)
+        self._remember(content_hash, text)
+        try:
+            await db.extracted_texts.save(content_hash, text)
+        except PyMongoError as e:
+            # The text is still returned; the next miss will simply extract again
+            print(f"Error storing extracted text for {content_hash}: {e}")
+        return text
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Shared cache used by every endpoint that needs resume text
+text_cache = ExtractedTextCache()
+
+
+async def get_resume_text(resume_metadata: dict) -> str:
+    """Returns the extracted text of a resume, going through the content-addressed cache."""
+    content_hash = resume_metadata.get("content_hash")
+    if not content_hash:
+        # Resumes uploaded before content hashing: hash the file once and backfill the metadata
+        content_hash = await asyncio.to_thread(sha256_file, resume_metadata["filepath"])
+        resume_metadata["content_hash"] = content_hash
+        try:
+            await db.resumes.set_fields(str(resume_metadata["_id"]), {"content_hash": content_hash})
+        except PyMongoError as e:
+            print(f"Error backfilling content hash for resume {resume_metadata['_id']}: {e}")
+    return await text_cache.get_text(content_hash, resume_metadata["filepath"])
@@ -0,0 +1,195 @@
+import os
+import re
+import math
+import unicodedata
+from collections import Counter
+
+from dotenv import load_dotenv
+
+# Imported by main.py before it loads .env, so load it here as well
+load_dotenv()
+
+# --- Resume Text Normalization Configuration ---
+# Extracted resume text is cleaned up before it is put into a prompt: every character left in it
+# is a paid input token. Extraction separates pages with a form feed so repeated headers and
+# footers can be recognised (texts cached before that have no page breaks and skip that step).
+TEXT_NORMALIZATION_ENABLED = os.getenv("TEXT_NORMALIZATION_ENABLED", "true").lower() in ("1", "true", "yes")
+PROMPT_TEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_TEXT_TOKEN_BUDGET", "6000")) # 0 disables truncation
+TEXT_CHARS_PER_TOKEN = float(os.getenv("TEXT_CHARS_PER_TOKEN", "4")) # Local estimate; no API call per request
+PAGE_BREAK = "\f"
+REPEATED_LINE_EDGE = 3 # Only the first/last few lines of a page are header/footer candidates
+REPEATED_LINE_PAGE_SHARE = 0.6 # ...and only if they appear on at least this share of the pages
+
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d{1,3}(\s*(/|of)\s*\d{1,3})?$", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+_HYPHEN_BREAK = re.compile(r"(?<=[A-Za-z])-\n(?=[a-z])")
+_INLINE_SPACE = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_BULLETS = str.maketrans({c: "-" for c in "•◦▪▫●○■□♦◆►▶➢➤✓✔∙⁃"})
+
+# Section headings in the order they are given up when the text is over budget (first = dropped first).
+# Sections not listed here (and text before the first heading) are never truncated before these.
+_SECTION_PRIORITY = (
+    ("references", ("references", "referees")),
+    ("interests", ("interests", "hobbies", "hobbies and interests", "personal interests", "extracurricular activities")),
+    ("personal", ("personal details", "personal information", "declaration")),
+    ("languages", ("languages",)),
+    ("volunteering", ("volunteering", "volunteer experience", "volunteer work")),
+    ("publications", ("publications",)),
+    ("awards", ("awards", "honors", "honours", "achievements", "awards and achievements")),
+    ("certifications", ("certifications", "certificates", "licenses and certifications", "courses")),
+    ("projects", ("projects", "personal projects", "academic projects")),
+    ("education", ("education", "academic background")),
+)
+_HEADING_RANK = {heading: rank for rank, (_, headings) in enumerate(_SECTION_PRIORITY) for heading in headings}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / TEXT_CHARS_PER_TOKEN)
+
+
+def _clean_glyphs(text: str) -> str:
+    """NFKC-folds ligatures and full-width forms, unifies bullets and drops invisible or icon-font glyphs."""
+    text = unicodedata.normalize("NFKC", text).translate(_BULLETS)
+    return "".join(
+        ch for ch in text
+        if ch in "\n\f\t" or unicodedata.category(ch) not in ("Cc", "Cf", "Co", "Cs", "Cn")
+    )
+
+
+def _strip_repeated_lines(pages: list[list[str]]) -> tuple[list[list[str]], int]:
+    """
+    Drops page numbers, and the repeats of lines found at the top or bottom of most pages. The first
+    copy of a repeated line is kept, since a running header usually carries the name and contact
+    details. Returns (pages, lines removed).
+    """
+    def key(line: str) -> str:
+        return _DIGITS.sub("#", line.strip().lower()) # "Page 2 of 3" and "Page 3 of 3" are the same footer
+
+    def edges(lines: list[str]) -> set[int]:
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        return set(content[:REPEATED_LINE_EDGE] + content[-REPEATED_LINE_EDGE:])
+
+    repeated = set()
+    if len(pages) > 1:
+        seen = Counter(k for lines in pages for k in {key(lines[i]) for i in edges(lines)})
+        threshold = max(2, math.ceil(len(pages) * REPEATED_LINE_PAGE_SHARE))
+        repeated = {k for k, count in seen.items() if count >= threshold}
+
+    removed = 0
+    kept_pages = []
+    kept_once = set()
+    for lines in pages:
+        drop = set()
+        for i in sorted(edges(lines)):
+            line_key = key(lines[i])
+            if _PAGE_NUMBER.match(lines[i].strip()):
+                drop.add(i)
+            elif line_key in repeated:
+                if line_key in kept_once:
+                    drop.add(i)
+                else:
+                    kept_once.add(line_key)
+        removed += len(drop)
+        kept_pages.append([line for i, line in enumerate(lines) if i not in drop])
+    return kept_pages, removed
+
+
+def _heading_rank(line: str):
+    heading = line.strip().strip(":").strip().lower()
+    return _HEADING_RANK.get(heading) if len(heading) <= 40 else None
+
+
+def _fit_budget(text: str, budget_tokens: int) -> tuple[str, list[str]]:
+    """Trims the lowest-value sections (from their end) until the text fits. Returns (text, sections trimmed)."""
+    max_chars = int(budget_tokens * TEXT_CHARS_PER_TOKEN)
+    if budget_tokens <= 0 or len(text) <= max_chars:
+        return text, []
+
+    # Split into sections: [rank, lines]; rank None = not a known low-value section
+    sections = [[None, []]]
+    for line in text.split("\n"):
+        rank = _heading_rank(line)
+        if rank is not None:
+            sections.append([rank, []])
+        sections[-1][1].append(line)
+
+    length = len(text)
+    trimmed = []
+    ranked = sorted((s for s in sections if s[0] is not None), key=lambda s: s[0])
+    for section in ranked:
+        name = _SECTION_PRIORITY[section[0]][0]
+        while section[1] and length > max_chars:
+            length -= len(section[1].pop()) + 1
+            if name not in trimmed:
+                trimmed.append(name)
+        if length <= max_chars:
+            break
+
+    text = "\n".join(line for _, lines in sections for line in lines).strip()
+    if len(text) > max_chars:
+        # Only core sections left: keep the start, which is where contact, summary and recent roles are
+        text = text[:max_chars].rsplit("\n", 1)[0]
+        trimmed.append("tail")
+    return text, trimmed
+
+
+def normalize_resume_text(text: str, budget_tokens: int = PROMPT_TEXT_TOKEN_BUDGET) -> tuple[str, dict]:
+    """
+    Returns the prompt-ready version of extracted resume text and a report of what changed:
+    character and estimated token counts before and after, repeated lines removed and the
+    sections trimmed to fit budget_tokens.
+    """
+    report = {"chars_before": len(text), "tokens_before": estimate_tokens(text)}
+    text = _clean_glyphs(text)
+    pages = [page.split("\n") for page in text.split(PAGE_BREAK)]
+    pages, report["repeated_lines_removed"] = _strip_repeated_lines(pages)
+    text = "\n\n".join("\n".join(lines) for lines in pages)
+
+    text = _INLINE_SPACE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _HYPHEN_BREAK.sub("", text) # "manage-\nment" -> "management"
+    text = _BLANK_LINES.sub("\n\n", text).strip()
+
+    text, report["sections_trimmed"] = _fit_budget(text, budget_tokens)
+    report["chars_after"] = len(text)
+    report["tokens_after"] = estimate_tokens(text)
+    return text, report
+
+
+class NormalizationStats:
+    """Running totals of what normalization saved, reported on /stats/."""
+
+    def __init__(self):
+        self.requests = 0
+        self.chars_before = 0
+        self.chars_after = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.truncated = 0
+
+    def record(self, report: dict):
+        self.requests += 1
+        self.chars_before += report["chars_before"]
+        self.chars_after += report["chars_after"]
+        self.tokens_before += report["tokens_before"]
+        self.tokens_after += report["tokens_after"]
+        if report["sections_trimmed"]:
+            self.truncated += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": TEXT_NORMALIZATION_ENABLED,
+            "token_budget": PROMPT_TEXT_TOKEN_BUDGET,
+            "requests": self.requests,
+            "truncated": self.truncated,
+            "chars_before": self.chars_before,
+            "chars_after": self.chars_after,
+            "estimated_tokens_before": self.tokens_before,
+            "estimated_tokens_after": self.tokens_after,
+            "estimated_tokens_saved_pct": round(100 * (1 - self.tokens_after / self.tokens_before), 1) if self.tokens_before else 0.0,
+        }
+
+
+# Shared counters, reported on /stats/
+normalization_stats = NormalizationStats()
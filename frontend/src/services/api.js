@@ -78,8 +78,9 @@ export const roadmapService = {
     return api.get(`/get-roadmap/${roadmapId}`)
   },
 
-  listRoadmaps: () => {
-    return api.get("/list-roadmaps") // Removed trailing slash
+  // Returns { roadmaps: [summary], next_cursor }; pass next_cursor back to load the following page
+  listRoadmaps: (cursor = null, limit = 20) => {
+    return api.get("/list-roadmaps", { params: cursor ? { cursor, limit } : { limit } }) // Removed trailing slash
   },
 }
 